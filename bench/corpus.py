@@ -0,0 +1,311 @@
+"""ベンチマーク用のPDF生成
+
+ネットワークを使わずに，再現可能な本のPDFを生成する．
+ページ数，解像度，バーコードの位置と回転，テキストレイヤーの有無，
+スキャンしたようなノイズの有無を変えたPDFと，正解のISBNコードを記録したマニフェストを出力する．
+
+    $ python3 bench/corpus.py output_dir [--count 40] [--seed 0]
+
+"""
+
+
+import io
+import os
+import sys
+import json
+import random
+import argparse
+from PIL import Image, ImageDraw, ImageFilter, ImageFont
+
+
+# A5判のページサイズ（ポイント）
+PAGE_WIDTH_PT = 420
+PAGE_HEIGHT_PT = 595
+
+# EAN-13の符号化表
+_EAN_L = ['0001101', '0011001', '0010011', '0111101', '0100011',
+          '0110001', '0101111', '0111011', '0110111', '0001011']
+_EAN_G = ['0100111', '0110011', '0011011', '0100001', '0011101',
+          '0111001', '0000101', '0010001', '0001001', '0010111']
+_EAN_R = ['1110010', '1100110', '1101100', '1000010', '1011100',
+          '1001110', '1010000', '1000100', '1001000', '1110100']
+_EAN_PARITY = ['LLLLLL', 'LLGLGG', 'LLGGLG', 'LLGGGL', 'LGLLGG',
+               'LGGLLG', 'LGGGLL', 'LGLGLG', 'LGLGGL', 'LGGLGL']
+
+# バーコードの位置（ページに対する割合で，バーコードの左上の位置）
+BARCODE_PLACEMENTS = {
+    'top_right': (0.55, 0.06),
+    'bottom_left': (0.08, 0.78),
+    'bottom_center': (0.32, 0.8),
+    'none': None,
+}
+
+
+def isbn13_check_digit(digits12: str) -> str:
+    """ISBN-13のチェックディジットを計算
+
+    Args:
+        digits12 (str): チェックディジットを除いた12桁
+
+    Returns:
+        str: チェックディジット
+    """
+    total = sum(int(d) * (1 if i % 2 == 0 else 3) for i, d in enumerate(digits12))
+    return str((10 - total % 10) % 10)
+
+
+def random_isbn(rng: random.Random) -> str:
+    """日本の出版社のISBN-13を生成
+
+    Args:
+        rng (:obj:`random.Random`): 乱数生成器
+
+    Returns:
+        str: ISBN-13
+    """
+    digits12 = '9784' + ''.join(str(rng.randint(0, 9)) for _ in range(8))
+    return digits12 + isbn13_check_digit(digits12)
+
+
+def hyphenate(isbn: str) -> str:
+    """ISBN-13を本に印刷される形式にする
+
+    Args:
+        isbn (str): ISBN-13
+
+    Returns:
+        str: ハイフン区切りのISBNコード
+    """
+    return f'{isbn[:3]}-{isbn[3]}-{isbn[4:8]}-{isbn[8:12]}-{isbn[12]}'
+
+
+def ean13_modules(code: str) -> str:
+    """EAN-13のモジュール列を取得
+
+    Args:
+        code (str): 13桁のコード
+
+    Returns:
+        str: 1を黒，0を白とするモジュール列
+    """
+    parity = _EAN_PARITY[int(code[0])]
+    modules = '101'
+    for digit, table in zip(code[1:7], parity):
+        modules += (_EAN_L if table == 'L' else _EAN_G)[int(digit)]
+    modules += '01010'
+    for digit in code[7:]:
+        modules += _EAN_R[int(digit)]
+    modules += '101'
+    return modules
+
+
+def draw_barcode(code: str, module_px: int) -> Image.Image:
+    """EAN-13のバーコード画像を描画
+
+    Args:
+        code (str): 13桁のコード
+        module_px (int): 1モジュールのピクセル数
+
+    Returns:
+        :obj:`PIL.Image.Image`: バーコード画像
+    """
+    modules = ean13_modules(code)
+    quiet = 11 * module_px
+    width = len(modules) * module_px + quiet * 2
+    height = 60 * module_px
+    image = Image.new('L', (width, height + 12 * module_px), 255)
+    draw = ImageDraw.Draw(image)
+    for i, module in enumerate(modules):
+        if module == '1':
+            x = quiet + i * module_px
+            draw.rectangle([x, 0, x + module_px - 1, height], fill=0)
+    draw.text((quiet, height + 2 * module_px), code, fill=0, font=_font(10 * module_px))
+    return image
+
+
+def _font(size: int):
+    try:
+        return ImageFont.truetype('DejaVuSans.ttf', size)
+    except OSError:
+        return ImageFont.load_default()
+
+
+def render_page(spec: dict, page_number: int, rng: random.Random) -> Image.Image:
+    """ページの画像を描画
+
+    Args:
+        spec (dict): PDFの仕様
+        page_number (int): ページ番号（1始まり）
+        rng (:obj:`random.Random`): 乱数生成器
+
+    Returns:
+        :obj:`PIL.Image.Image`: ページの画像
+    """
+    dpi = spec['dpi']
+    width = PAGE_WIDTH_PT * dpi // 72
+    height = PAGE_HEIGHT_PT * dpi // 72
+    page = Image.new('L', (width, height), 250)
+    draw = ImageDraw.Draw(page)
+
+    # 本文らしい線
+    for y in range(int(height * 0.1), int(height * 0.7), max(4, dpi // 6)):
+        if rng.random() < 0.8:
+            draw.line([(width * 0.1, y), (width * rng.uniform(0.5, 0.9), y)], fill=rng.randint(60, 140), width=max(1, dpi // 100))
+
+    is_last_page = page_number == spec['pages']
+    is_colophon = page_number == spec['pages'] - 1 or (spec['pages'] == 1)
+    if is_last_page and spec['barcode'] != 'none':
+        left, top = BARCODE_PLACEMENTS[spec['barcode']]
+        barcode = draw_barcode(spec['isbn'], module_px=max(1, dpi // 100))
+        page.paste(barcode, (int(width * left), int(height * top)))
+    if is_colophon and spec['printed_isbn']:
+        # 奥付のISBNコード
+        draw.text(
+            (width * 0.1, height * 0.85),
+            f'ISBN{hyphenate(spec["isbn"])}',
+            fill=0,
+            font=_font(max(10, dpi // 7))
+        )
+
+    if spec['rotation']:
+        page = page.rotate(spec['rotation'], expand=spec['rotation'] % 90 == 0, fillcolor=250)
+    if spec['noisy']:
+        page = page.rotate(rng.uniform(-1.5, 1.5), fillcolor=245)
+        page = page.filter(ImageFilter.GaussianBlur(radius=0.6))
+        noise = Image.effect_noise(page.size, 18)
+        page = Image.blend(page, noise, 0.12)
+    return page
+
+
+def _pdf_string(text: str) -> bytes:
+    escaped = text.replace('\\', '\\\\').replace('(', '\\(').replace(')', '\\)')
+    return f'({escaped})'.encode('latin-1')
+
+
+def write_pdf(path: str, page_images: list, page_texts: list, jpeg_quality: int) -> None:
+    """ページの画像とテキストレイヤーからPDFを書き出す
+
+    ページごとに画像を一枚のJPEGとして埋め込み，テキストは不可視のテキストレイヤーとして重ねる．
+
+    Args:
+        path (str): 出力ファイルパス
+        page_images (list[PIL.Image.Image]): ページの画像
+        page_texts (list[str]): ページのテキストレイヤー．Noneのときはテキストレイヤーを持たない
+        jpeg_quality (int): JPEGの画質
+    """
+    objects = {}
+    page_count = len(page_images)
+    font_num = 3 + page_count * 3
+    kids = []
+    for i, (image, text) in enumerate(zip(page_images, page_texts)):
+        page_num, image_num, content_num = 3 + i * 3, 4 + i * 3, 5 + i * 3
+        kids.append(f'{page_num} 0 R')
+
+        buffer = io.BytesIO()
+        image.convert('L').save(buffer, format='JPEG', quality=jpeg_quality)
+        jpeg = buffer.getvalue()
+        objects[image_num] = (
+            f'<< /Type /XObject /Subtype /Image /Width {image.width} /Height {image.height} '
+            f'/ColorSpace /DeviceGray /BitsPerComponent 8 /Filter /DCTDecode /Length {len(jpeg)} >>\n'
+            'stream\n'
+        ).encode() + jpeg + b'\nendstream'
+
+        content = f'q {PAGE_WIDTH_PT} 0 0 {PAGE_HEIGHT_PT} 0 0 cm /Im0 Do Q\n'.encode()
+        if text:
+            content += b'BT 3 Tr /F1 9 Tf 40 60 Td ' + _pdf_string(text) + b' Tj ET\n'
+        objects[content_num] = b'<< /Length %d >>\nstream\n' % len(content) + content + b'\nendstream'
+        objects[page_num] = (
+            f'<< /Type /Page /Parent 2 0 R /MediaBox [0 0 {PAGE_WIDTH_PT} {PAGE_HEIGHT_PT}] '
+            f'/Resources << /XObject << /Im0 {image_num} 0 R >> /Font << /F1 {font_num} 0 R >> >> '
+            f'/Contents {content_num} 0 R >>'
+        ).encode()
+
+    objects[1] = b'<< /Type /Catalog /Pages 2 0 R >>'
+    objects[2] = f'<< /Type /Pages /Kids [{" ".join(kids)}] /Count {page_count} >>'.encode()
+    objects[font_num] = b'<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>'
+
+    out = bytearray(b'%PDF-1.4\n%\xe2\xe3\xcf\xd3\n')
+    offsets = {}
+    for num in sorted(objects):
+        offsets[num] = len(out)
+        out += b'%d 0 obj\n' % num + objects[num] + b'\nendobj\n'
+    xref_offset = len(out)
+    size = max(objects) + 1
+    out += b'xref\n0 %d\n0000000000 65535 f \n' % size
+    for num in range(1, size):
+        out += b'%010d 00000 n \n' % offsets[num]
+    out += b'trailer\n<< /Size %d /Root 1 0 R >>\nstartxref\n%d\n%%%%EOF\n' % (size, xref_offset)
+    with open(path, 'wb') as f:
+        f.write(out)
+
+
+def random_spec(rng: random.Random, index: int) -> dict:
+    """PDFの仕様をランダムに決める
+
+    Args:
+        rng (:obj:`random.Random`): 乱数生成器
+        index (int): 通し番号
+
+    Returns:
+        dict: PDFの仕様
+    """
+    return {
+        'name': f'book_{index:04d}.pdf',
+        'isbn': random_isbn(rng),
+        'pages': rng.choice([1, 2, 3, 8, 24]),
+        'dpi': rng.choice([150, 200, 300]),
+        'barcode': rng.choice(list(BARCODE_PLACEMENTS)),
+        'rotation': rng.choice([0, 0, 0, 90, 180]),
+        'text_layer': rng.random() < 0.3,
+        'printed_isbn': rng.random() < 0.7,
+        'noisy': rng.random() < 0.4,
+    }
+
+
+def generate(output_dir: str, count: int, seed: int) -> list:
+    """ベンチマーク用のPDFを生成
+
+    Args:
+        output_dir (str): 出力ディレクトリ
+        count (int): 生成するPDFの数
+        seed (int): 乱数のシード
+
+    Returns:
+        list[dict]: PDFの仕様のリスト
+    """
+    os.makedirs(output_dir, exist_ok=True)
+    rng = random.Random(seed)
+    specs = []
+    for index in range(count):
+        spec = random_spec(rng, index)
+        page_rng = random.Random(f'{seed}:{index}')
+        page_images = [render_page(spec, page_number, page_rng) for page_number in range(1, spec['pages'] + 1)]
+        page_texts = [
+            f'ISBN{hyphenate(spec["isbn"])}' if spec['text_layer'] and page_number == spec['pages'] else None
+            for page_number in range(1, spec['pages'] + 1)
+        ]
+        write_pdf(
+            os.path.join(output_dir, spec['name']),
+            page_images,
+            page_texts,
+            jpeg_quality=40 if spec['noisy'] else 85
+        )
+        specs.append(spec)
+
+    with open(os.path.join(output_dir, 'manifest.json'), 'w', encoding='utf-8') as f:
+        json.dump({'seed': seed, 'count': count, 'files': specs}, f, indent=4)
+    return specs
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Generate a synthetic book PDF corpus.')
+    parser.add_argument('output_dir')
+    parser.add_argument('--count', type=int, default=40)
+    parser.add_argument('--seed', type=int, default=0)
+    args = parser.parse_args(argv)
+    specs = generate(args.output_dir, args.count, args.seed)
+    print(f'Generated {len(specs)} PDFs in {args.output_dir}.')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
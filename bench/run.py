@@ -0,0 +1,282 @@
+"""ISBNコード取得のベンチマーク
+
+`bench/corpus.py`で生成したPDFに対して，監視時と同じワーカープールでISBNコードを取得し，
+段階ごとの実行時間，一分あたりの処理ファイル数，最大メモリ使用量，段階ごとの条件付きヒット率を計測する．
+結果はJSONファイルに保存し，以前の結果と比較できる．
+
+    $ python3 bench/corpus.py bench/corpus
+    $ python3 bench/run.py bench/corpus [--workers 4] [--compare bench/results/previous.json]
+
+Note:
+    本の情報の取得はネットワークを使うため計測しない．
+    ISBNコードの取得は最初に見つかった段階で終わるため，後の段階は前の段階で見つからなかったファイルだけを試す．
+    そのため段階ごとの`fallthrough_hit_rate`は，前の段階で見つからなかったときに見つかる割合であり，
+    その段階だけで全てのファイルを試したときのヒット率ではない．
+
+"""
+
+
+import os
+import sys
+import json
+import time
+import platform
+import argparse
+import resource
+import subprocess
+from datetime import datetime, timezone
+from statistics import mean, median
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), os.pardir, 'src'))
+
+from worker_pool import WorkerPool  # noqa: E402
+from app_constants import PROCESS_WORKERS  # noqa: E402
+
+
+RESULTS_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'results')
+
+# 正解率を内訳で集計する，PDFの仕様の項目
+BREAKDOWN_KEYS = ['text_layer', 'noisy', 'barcode', 'rotation', 'dpi']
+
+
+def _percentile(values: list, ratio: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(ratio * len(ordered)))]
+
+
+def _peak_rss_mb(who: int) -> float:
+    """最大メモリ使用量を取得
+
+    Args:
+        who (int): `resource.RUSAGE_SELF`または`resource.RUSAGE_CHILDREN`
+
+    Returns:
+        float: 最大メモリ使用量（MB）
+    """
+    peak = resource.getrusage(who).ru_maxrss
+    # macOSはバイト，Linuxはキロバイト単位
+    return peak / (1024 * 1024) if sys.platform == 'darwin' else peak / 1024
+
+
+def _git_revision() -> str:
+    try:
+        return subprocess.run(
+            ['git', 'rev-parse', '--short', 'HEAD'],
+            cwd=os.path.dirname(os.path.abspath(__file__)),
+            capture_output=True,
+            text=True,
+            check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def run(corpus_dir: str, process_workers: int, io_workers: int) -> dict:
+    """ベンチマークを実行
+
+    Args:
+        corpus_dir (str): `bench/corpus.py`で生成したディレクトリ
+        process_workers (int): プロセスワーカー数
+        io_workers (int): I/Oスレッド数
+
+    Returns:
+        dict: 計測結果
+    """
+    with open(os.path.join(corpus_dir, 'manifest.json'), encoding='utf-8') as f:
+        manifest = json.load(f)
+    specs = manifest['files']
+
+    pool = WorkerPool(process_workers=process_workers, io_workers=io_workers)
+    started_at = time.perf_counter()
+
+    def timed_extract(spec):
+        start = time.perf_counter()
+        result = pool.extract_isbn(os.path.join(corpus_dir, spec['name']))
+        return spec, result, time.perf_counter() - start
+
+    try:
+        futures = [pool.submit(timed_extract, spec) for spec in specs]
+        outcomes = [future.result() for future in futures]
+    finally:
+        pool.shutdown(wait=True)
+    wall_seconds = time.perf_counter() - started_at
+
+    stages = {}
+    strategies = {}
+    breakdown = {key: {} for key in BREAKDOWN_KEYS}
+    files = []
+    correct = wrong = missed = 0
+    for spec, result, seconds in outcomes:
+        if result.isbn is None:
+            outcome = 'missed'
+            missed += 1
+        elif result.isbn == spec['isbn']:
+            outcome = 'correct'
+            correct += 1
+        else:
+            outcome = 'wrong'
+            wrong += 1
+
+        for record in result.stages:
+            stage = stages.setdefault(record.stage, {'attempts': 0, 'hits': 0, 'seconds': []})
+            stage['attempts'] += 1
+            stage['hits'] += int(record.hit)
+            stage['seconds'].append(record.seconds)
+        if result.strategy:
+            strategy = strategies.setdefault(result.strategy, {'files': 0, 'correct': 0})
+            strategy['files'] += 1
+            strategy['correct'] += int(outcome == 'correct')
+        for key in BREAKDOWN_KEYS:
+            values = breakdown[key].setdefault(str(spec[key]), {'files': 0, 'correct': 0})
+            values['files'] += 1
+            values['correct'] += int(outcome == 'correct')
+
+        files.append({
+            'name': spec['name'],
+            'expected': spec['isbn'],
+            'isbn': result.isbn,
+            'strategy': result.strategy,
+            'outcome': outcome,
+            'seconds': seconds,
+        })
+
+    total = len(outcomes)
+    latencies = [file['seconds'] for file in files]
+    return {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'revision': _git_revision(),
+        'environment': {
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'cpu_count': os.cpu_count(),
+        },
+        'config': {
+            'corpus_seed': manifest['seed'],
+            'files': total,
+            'process_workers': process_workers,
+            'io_workers': io_workers,
+        },
+        'wall_seconds': wall_seconds,
+        'files_per_minute': total / wall_seconds * 60 if wall_seconds else 0.0,
+        'latency': {
+            'mean': mean(latencies) if latencies else 0.0,
+            'p50': median(latencies) if latencies else 0.0,
+            'p95': _percentile(latencies, 0.95) if latencies else 0.0,
+        },
+        'peak_rss_mb': {
+            'main': _peak_rss_mb(resource.RUSAGE_SELF),
+            'workers': _peak_rss_mb(resource.RUSAGE_CHILDREN),
+        },
+        'accuracy': {
+            'correct': correct,
+            'wrong': wrong,
+            'missed': missed,
+            'hit_rate': correct / total if total else 0.0,
+        },
+        'stages': {
+            name: {
+                'attempts': values['attempts'],
+                'hits': values['hits'],
+                # 前の段階で見つからなかったファイルのうち，この段階で見つかった割合
+                'fallthrough_hit_rate': values['hits'] / values['attempts'],
+                'mean_seconds': mean(values['seconds']),
+                'p50_seconds': median(values['seconds']),
+                'p95_seconds': _percentile(values['seconds'], 0.95),
+            }
+            for name, values in stages.items()
+        },
+        'strategies': {
+            name: {
+                **values,
+                'share': values['files'] / total,
+                'precision': values['correct'] / values['files'],
+            }
+            for name, values in strategies.items()
+        },
+        'breakdown': {
+            key: {
+                value: {**counts, 'hit_rate': counts['correct'] / counts['files']}
+                for value, counts in values.items()
+            }
+            for key, values in breakdown.items()
+        },
+        'files': files,
+    }
+
+
+def summary(result: dict, baseline=None) -> str:
+    """計測結果を表示用の文字列で取得
+
+    Args:
+        result (dict): 計測結果
+        baseline (dict): 比較する以前の計測結果
+
+    Returns:
+        str: 計測結果
+    """
+    def delta(value, path, fmt):
+        if baseline is None:
+            return ''
+        previous = baseline
+        for key in path:
+            previous = previous.get(key) if isinstance(previous, dict) else None
+        if previous is None:
+            return ' (new)'
+        return f' ({value - previous:+{fmt}})'
+
+    lines = [
+        f'Files: {result["config"]["files"]}, workers: {result["config"]["process_workers"]}',
+        f'Throughput: {result["files_per_minute"]:.1f} files/min'
+        + delta(result['files_per_minute'], ['files_per_minute'], '.1f'),
+        f'Latency: p50 {result["latency"]["p50"]:.2f}s, p95 {result["latency"]["p95"]:.2f}s'
+        + delta(result['latency']['p95'], ['latency', 'p95'], '.2f'),
+        f'Peak RSS: main {result["peak_rss_mb"]["main"]:.0f}MB, workers {result["peak_rss_mb"]["workers"]:.0f}MB'
+        + delta(result['peak_rss_mb']['workers'], ['peak_rss_mb', 'workers'], '.0f'),
+        f'Hit rate: {result["accuracy"]["hit_rate"]:.1%} '
+        f'(wrong {result["accuracy"]["wrong"]}, missed {result["accuracy"]["missed"]})'
+        + delta(result['accuracy']['hit_rate'], ['accuracy', 'hit_rate'], '.1%'),
+        'Stages:',
+    ]
+    for name, values in sorted(result['stages'].items()):
+        lines.append(
+            f'    {name}: {values["hits"]}/{values["attempts"]} hits after earlier stages missed, '
+            f'mean {values["mean_seconds"]:.2f}s, p95 {values["p95_seconds"]:.2f}s'
+            + delta(values['mean_seconds'], ['stages', name, 'mean_seconds'], '.2f')
+        )
+    lines.append('Strategies:')
+    for name, values in sorted(result['strategies'].items()):
+        lines.append(f'    {name}: {values["files"]} files ({values["share"]:.0%}), precision {values["precision"]:.0%}')
+    return '\n'.join(lines)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description='Benchmark ISBN extraction on a generated corpus.')
+    parser.add_argument('corpus_dir')
+    parser.add_argument('--workers', type=int, default=PROCESS_WORKERS)
+    parser.add_argument('--io-workers', type=int, default=None)
+    parser.add_argument('--output', default=None, help='result JSON path (default: bench/results/<timestamp>.json)')
+    parser.add_argument('--compare', default=None, help='previous result JSON to compare with')
+    args = parser.parse_args(argv)
+
+    # プロセスワーカーを使い切れるだけのI/Oスレッドを用意する
+    io_workers = args.io_workers or args.workers * 2
+    result = run(args.corpus_dir, args.workers, io_workers)
+
+    output = args.output or os.path.join(
+        RESULTS_DIR,
+        datetime.now().strftime('%Y%m%d-%H%M%S') + '.json'
+    )
+    os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+    with open(output, 'w', encoding='utf-8') as f:
+        json.dump(result, f, indent=4)
+
+    baseline = None
+    if args.compare:
+        with open(args.compare, encoding='utf-8') as f:
+            baseline = json.load(f)
+    print(summary(result, baseline))
+    print(f'Saved to {output}')
+
+
+if __name__ == '__main__':
+    sys.exit(main())
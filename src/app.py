@@ -1,4 +1,5 @@
-from queue import Queue
+import threading
+from queue import Queue, Empty
 from datetime import datetime
 from functools import partial
 from tkinter import (
@@ -23,7 +24,15 @@ from tkinter import (
 from tkinter.ttk import Combobox
 from watch import Watcher
 from log_constants import LogStatus
-from app_constants import FILE_TYPES
+from log_history import LogHistory
+from app_constants import (
+    FILE_TYPES,
+    LOG_POLL_INTERVAL,
+    LOG_DRAIN_BUDGET,
+    LOG_MAX_LINES,
+    LOG_HISTORY_DIR,
+    LOG_HISTORY_KEEP
+)
 from app_service import watcher_thread_is_alive, validate_dir, validate_file_type, ValidateError
 
 
@@ -39,6 +48,8 @@ class BookMakerView(Frame):
         log_box (:obj: `Text`): ログのテキストウィジェット
         queue (:obj: `queue`): ログに出力する内容が格納されるキュー
         watcher_thread (:obj: `threading.Thread`): 監視スレッド
+        stop_thread (:obj: `threading.Thread`): 監視スレッドを停止するスレッド．停止していないときはNone
+        log_history (:obj: `LogHistory`): ログの履歴
     """
 
     def __init__(self, *args, **kwargs):
@@ -52,6 +63,10 @@ class BookMakerView(Frame):
         self.log_box = None
         self.queue = Queue()
         self.watcher_thread = None
+        self.stop_thread = None
+        # 停止し終えたときに呼び出す関数
+        self._on_stopped = []
+        self.log_history = LogHistory(LOG_HISTORY_DIR, keep=LOG_HISTORY_KEEP)
 
         self._create_widgets()
 
@@ -114,7 +129,7 @@ class BookMakerView(Frame):
         file_type_combobox.current(0)
 
         # Execute
-        execute_button = Button(
+        execute_button = self.execute_button = Button(
             main_frame,
             text='実行',
             relief='solid',
@@ -123,7 +138,7 @@ class BookMakerView(Frame):
         )
 
         # Stop
-        stop_button = Button(
+        stop_button = self.stop_button = Button(
             main_frame,
             text='停止',
             relief='solid',
@@ -260,8 +275,10 @@ class BookMakerView(Frame):
             # If the user select no or cancel, return
             if not switching_watcher:
                 return
-            # If the user select yes, stop the watcher thread which exists
-            self._stop()
+            # If the user select yes, stop the watcher thread which exists,
+            # and start a new one after it has stopped
+            self._stop(on_stopped=self._start_watcher)
+            return
         else:
             # If the watcher thread is not running, show the message
             start_observing = messagebox.askyesnocancel(
@@ -271,6 +288,10 @@ class BookMakerView(Frame):
             if not start_observing:
                 return
 
+        self._start_watcher()
+
+    def _start_watcher(self):
+        """監視スレッドを開始"""
         self.watcher_thread = Watcher(
             queue=self.queue,
             input_path=self.watch_dir_path.get(),
@@ -278,20 +299,39 @@ class BookMakerView(Frame):
             extensions=[self.file_type.get()],
         )
         self.watcher_thread.start()
-        self.after(100, self._insert_to_log_box)
+        self.after(LOG_POLL_INTERVAL, self._insert_to_log_box)
 
-    def _stop(self):
+    def _stop(self, on_stopped=None):
         """停止
 
         停止を押下したときの動作内容
+        処理中のファイルを待つ間も画面が止まらないように，別のスレッドで停止し，
+        停止し終えるまでは実行と停止のボタンを押せないようにする．
         監視スレッドが死んでいる場合は，メッセージを表示する
 
+        Args:
+            on_stopped (callable): 停止し終えたときに呼び出す関数
         """
+        # If the watcher thread is already stopping, wait for it
+        if self.stop_thread is not None:
+            if on_stopped is not None:
+                self._on_stopped.append(on_stopped)
+            return
+
         # If the watcher thread exists, stop the thread
         if watcher_thread_is_alive(self.watcher_thread):
-            self.watcher_thread.stop_event()
-            self.watcher_thread.join()
-            self.after(100, self._insert_to_log_box)
+            self._on_stopped = [on_stopped] if on_stopped is not None else []
+            self.execute_button.configure(state='disabled')
+            self.stop_button.configure(state='disabled')
+            watcher_thread = self.watcher_thread
+
+            def _stop_watcher():
+                watcher_thread.stop_event()
+                watcher_thread.join()
+
+            self.stop_thread = threading.Thread(target=_stop_watcher, name='book_maker_stop', daemon=True)
+            self.stop_thread.start()
+            self.after(LOG_POLL_INTERVAL, self._wait_for_stop)
         else:
             # Show a message box, when watcher thread does not exist
             messagebox.showwarning(
@@ -299,52 +339,81 @@ class BookMakerView(Frame):
                 '実行されていないため停止することができません\n実行を行ったうえで停止することができます'
             )
 
+    def _wait_for_stop(self):
+        """停止し終えるのを待つ
+
+        停止し終えたときは，ボタンを押せるように戻し，`_stop`に渡された関数を呼び出す．
+
+        """
+        if self.stop_thread.is_alive():
+            self.after(LOG_POLL_INTERVAL, self._wait_for_stop)
+            return
+
+        self.stop_thread = None
+        self.execute_button.configure(state='normal')
+        self.stop_button.configure(state='normal')
+        self.after(LOG_POLL_INTERVAL, self._insert_to_log_box)
+        on_stopped, self._on_stopped = self._on_stopped, []
+        for callback in on_stopped:
+            callback()
+
     def _insert_to_log_box(self):
         """ログにメッセージを追加
 
-        ログにメッセージを色付きで追加する
+        キューにあるメッセージを`LOG_DRAIN_BUDGET`件まで取り出し，
+        ログにまとめて色付きで追加する．
+        追加したメッセージはログの履歴にも書き出し，
+        ログが`LOG_MAX_LINES`行を超えたときは古い行から削除する．
 
         """
-        # If queue is not empty, insert message to log box
-        if not self.queue.empty():
-            # Time
+        insert_args = []
+        history_lines = []
+        completed = False
+        for _ in range(LOG_DRAIN_BUDGET):
+            try:
+                message_queue = self.queue.get_nowait()
+            except Empty:
+                break
+
+            # Time, status and message
             log_time = '[' + datetime.now().strftime('%Y/%m/%d_%H:%M:%S') + '] '
-            self.log_box.insert(
-                'end',
-                log_time,
-                'log_time'
-            )
-
-            message_queue = self.queue.get()
-            # Status
             log_status_message = f'<{message_queue.status.name}> '
-            self.log_box.insert(
-                'end',
-                log_status_message,
-                f'{message_queue.status.name}'
-            )
-
-            # Message
             log_message = message_queue.message + '\n'
-            self.log_box.insert(
-                'end',
-                log_message
-            )
-
-            # If the log status was completed, return
+            insert_args += [
+                log_time, 'log_time',
+                log_status_message, f'{message_queue.status.name}',
+                log_message, ()
+            ]
+            history_lines.append(log_time + log_status_message + log_message)
+
+            # If the log status was completed, stop draining
             if message_queue.status is LogStatus.COMPLETED:
-                return
+                completed = True
+                break
+
+        if insert_args:
+            # Insert all messages at once, and trim the oldest lines
+            self.log_box.insert('end', *insert_args)
+            line_count = int(self.log_box.index('end-1c').split('.')[0])
+            if line_count > LOG_MAX_LINES:
+                self.log_box.delete('1.0', f'{line_count - LOG_MAX_LINES + 1}.0')
+            self.log_history.write(history_lines)
+
+        if completed:
+            return
 
         # Recursively call function
-        # for always checking the queue is empty or not
-        if watcher_thread_is_alive(self.watcher_thread):
-            self.after(100, self._insert_to_log_box)
+        # for always checking the queue is empty or not.
+        # If messages are left over, drain them without waiting
+        if watcher_thread_is_alive(self.watcher_thread) or not self.queue.empty():
+            self.after(1 if not self.queue.empty() else LOG_POLL_INTERVAL, self._insert_to_log_box)
 
     def _clear_log(self):
         """ログクリア
 
         ログをクリアを押下することで，
         ログに表示されているものを全て削除する
+        ログの履歴は削除しない
 
         """
         self.log_box.delete('1.0', 'end')
@@ -353,7 +422,8 @@ class BookMakerView(Frame):
         """ログ出力
 
         ログを出力を押下することで，
-        ユーザが選択したディレクトリに保存する
+        ログの履歴をユーザが選択したディレクトリに保存する
+        ログから削除された古い行も含めて保存する
 
         """
         dir_name = filedialog.Directory().show()
@@ -368,10 +438,8 @@ class BookMakerView(Frame):
         if not will_save:
             return
 
-        # Get all text in the log box
-        log_text = self.log_box.get(1.0, 'end-1c')
-        with open(file=f'{dir_name}/{filename}', mode='w', encoding='utf-8') as f:
-            f.write(log_text)
+        # Copy the log history instead of the text in the log box
+        self.log_history.export(f'{dir_name}/{filename}')
 
     def _exit_app(self):
         """アプリ終了
@@ -388,8 +456,14 @@ class BookMakerView(Frame):
         if not _exit:
             return
 
-        if watcher_thread_is_alive(self.watcher_thread):
-            self._stop()
+        if watcher_thread_is_alive(self.watcher_thread) or self.stop_thread is not None:
+            self._stop(on_stopped=self._close_app)
+            return
+        self._close_app()
+
+    def _close_app(self):
+        """ログの履歴を閉じて，アプリを閉じる"""
+        self.log_history.close()
         self.master.destroy()
 
 
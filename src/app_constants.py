@@ -5,6 +5,8 @@
 """
 
 
+import os
+
 # 監視するファイルタイプ
 FILE_TYPES = [
     'pdf'
@@ -16,3 +18,135 @@ SELECT_DIR_MESSAGE = '{0}ディレクトリを選択してください'
 IS_NOT_DIR_MESSAGE = '{0}ディレクトリに入力された値はディレクトリではありません'
 FILE_TYPE_IS_NOT_CHOSEN_MESSAGE = f'ファイルの種類が選択されていません\n{", ".join(FILE_TYPES)}の中から選択してください'
 FILE_TYPE_IS_NOT_IN_THE_LIST_MESSAGE = f'ファイルの種類が特定できません\n{", ".join(FILE_TYPES)}の中から選択してください'
+
+# ワーカー数
+# PDFのラスタライズやバーコード解析，OCRなどCPUを使う処理を行うプロセス数
+PROCESS_WORKERS = os.cpu_count() or 1
+# API呼び出しやファイル移動などI/O待ちの処理を行うスレッド数
+IO_WORKERS = 8
+# シェルを使ったISBNコードの取得を打ち切るまでの秒数
+SHELL_TIMEOUT = 60.0
+
+# キャッシュなどのデータを保存するディレクトリ
+DATA_DIR = os.path.join(os.path.expanduser('~'), '.book_maker')
+
+# 本の情報のキャッシュ
+BOOK_INFO_CACHE_PATH = os.path.join(DATA_DIR, 'book_info_cache.sqlite3')
+# 本の情報が見つかったときのキャッシュ保持秒数
+BOOK_INFO_CACHE_TTL = 60 * 60 * 24 * 30
+# どのAPIでも本の情報が見つからなかったときのキャッシュ保持秒数
+BOOK_INFO_CACHE_NEGATIVE_TTL = 60 * 60 * 24
+# キャッシュの最大件数
+BOOK_INFO_CACHE_MAX_ENTRIES = 100000
+
+# 書誌データのダンプから作成した本の情報の索引．ファイルがないときは使わない
+LOCAL_INDEX_PATH = os.path.join(DATA_DIR, 'local_index.sqlite3')
+
+# HTTPクライアント
+# 接続タイムアウト秒数
+HTTP_CONNECT_TIMEOUT = 3.05
+# 読み込みタイムアウト秒数
+HTTP_READ_TIMEOUT = 10.0
+# 5xxや接続エラーのときの最大リトライ回数
+HTTP_MAX_RETRIES = 3
+# リトライ間隔の基準秒数と最大秒数
+HTTP_BACKOFF = 0.5
+HTTP_MAX_BACKOFF = 8.0
+# ホストごとのコネクションプール数と最大接続数
+HTTP_POOL_CONNECTIONS = 4
+HTTP_POOL_MAXSIZE = 16
+
+# OPENBDへまとめて問い合わせるときに依頼を溜める秒数
+OPENBD_BATCH_WINDOW = 0.05
+# OPENBDへ一回のリクエストで問い合わせる最大件数
+OPENBD_BATCH_MAX_SIZE = 100
+
+# 本の情報を同時に問い合わせるときに優先するAPI
+BOOK_INFO_PREFERRED_SOURCE = 'Google'
+# 優先するAPIの結果を待つ秒数．過ぎたときは最初に見つかった結果を使う
+BOOK_INFO_PREFERRED_GRACE = 0.3
+# 本の情報を問い合わせるときのタイムアウト秒数
+BOOK_INFO_RESOLVE_TIMEOUT = 60.0
+
+# ISBNコードの取得結果のキャッシュ
+ISBN_RESULT_CACHE_PATH = os.path.join(DATA_DIR, 'isbn_result_cache.sqlite3')
+# キャッシュの最大件数
+ISBN_RESULT_CACHE_MAX_ENTRIES = 50000
+
+# 本の情報を問い合わせるISBNコードの候補の最大数
+ISBN_CANDIDATE_LIMIT = 3
+# フィンガープリントにファイル全体のハッシュを使うか
+PDF_FINGERPRINT_FULL_HASH = False
+
+# ISBNコードを取得する段階ごとの実行時間とヒット率の集計結果
+EXTRACTION_STATS_PATH = os.path.join(DATA_DIR, 'extraction_stats.json')
+
+# ISBNコードを取得する手法の計画
+# 入力ディレクトリと文書の特徴ごとの，手法ごとのヒット率と実行時間の記録
+STRATEGY_STATS_PATH = os.path.join(DATA_DIR, 'strategy_stats.sqlite3')
+# 入力ディレクトリごとに固定する手法の順番
+# 例: {'/path/to/scans': ['ocr']} (embedded, shell, text_layer, barcode, ocrのいずれか)
+STRATEGY_PINS = {}
+# 手法を省くかを判断するまでの試行回数
+STRATEGY_SKIP_AFTER = 20
+# このヒット率を下回る手法は省く
+STRATEGY_SKIP_RATE = 0.02
+# 省いた手法も試す割合
+STRATEGY_EXPLORE_RATE = 0.05
+
+# 起動時に監視ディレクトリにすでにあるファイルを同時に処理する数
+BACKLOG_CONCURRENCY = 4
+
+# 処理の記録
+JOB_JOURNAL_PATH = os.path.join(DATA_DIR, 'job_journal.sqlite3')
+# 終わった処理の記録を残す秒数
+JOB_JOURNAL_RETENTION = 60 * 60 * 24 * 30
+
+# ファイルの書き込みが終わったとみなすまでに，ファイルサイズと更新日時が変わらない必要がある秒数
+STABILITY_QUIET_PERIOD = 2.0
+# 書き込み中のファイルの状態を確認する間隔
+STABILITY_POLL_INTERVAL = 0.5
+# inotifyの監視数の上限などで監視を始められないときに，代わりにディレクトリを走査する間隔
+WATCH_POLL_INTERVAL = 5.0
+
+# 処理の計測結果を公開するHTTPエンドポイントのポート．Noneのときは公開しない
+METRICS_PORT = None
+# 処理の計測結果を公開するHTTPエンドポイントのホスト
+METRICS_HOST = '127.0.0.1'
+# 処理の計測結果のスナップショット
+METRICS_SNAPSHOT_PATH = os.path.join(DATA_DIR, 'metrics.json')
+# 処理の計測結果のスナップショットを保存する間隔の秒数
+METRICS_SNAPSHOT_INTERVAL = 60.0
+
+# GUIのログ
+# キューからログを取り出す間隔のミリ秒数
+LOG_POLL_INTERVAL = 100
+# 一回に取り出してログに追加する最大件数
+LOG_DRAIN_BUDGET = 500
+# ログに表示する最大行数．超えたときは古い行から削除する
+LOG_MAX_LINES = 5000
+# ログの履歴を保存するディレクトリ
+LOG_HISTORY_DIR = os.path.join(DATA_DIR, 'logs')
+# 残すログの履歴のファイル数
+LOG_HISTORY_KEEP = 30
+
+# 監視を終了するときに，処理中のファイルが終わるのを待つ秒数
+STOP_DRAIN_TIMEOUT = 30.0
+
+# Google Books APIの流量制限
+# 一秒あたりのリクエスト数
+GOOGLE_RATE_LIMIT = 1.0
+# 連続してリクエストできる数
+GOOGLE_RATE_BURST = 5
+# 429が返されたときに下げるリクエスト数の下限
+GOOGLE_MIN_RATE = 0.05
+# 一日あたりのリクエスト数の上限．Noneのときは制限しない
+GOOGLE_DAILY_QUOTA = 1000
+# リクエストしてよくなるまで待つ最大秒数．過ぎたときは処理を後回しにする
+GOOGLE_RATE_LIMIT_MAX_WAIT = 10.0
+# 流量制限を複数のプロセスで共有するためのSQLite．Noneのときはプロセス内だけで共有する
+RATE_LIMIT_DB_PATH = os.path.join(DATA_DIR, 'rate_limit.sqlite3')
+# 流量制限で後回しにした処理を，同じ実行中に再び投入する最大秒数．超えたときは次の起動時に再開する
+RATE_LIMIT_MAX_DEFER = 60 * 15
+# 後回しにした処理を再び投入するまでの最短の秒数．前の処理がまだ終わっていないときも，この間隔で投入し直す
+DEFERRED_RESUBMIT_INTERVAL = 1.0
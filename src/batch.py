@@ -0,0 +1,244 @@
+"""バッチ処理
+
+GUIを使わずに，入力ディレクトリにあるファイルを一度ずつ処理して終了する．
+`--watch`を指定したときは，終了の合図を受けるまで監視を続ける．
+`--root`で入力ディレクトリと出力ディレクトリの組を加えると，一つのワーカープールで全て処理する．
+ファイルごとの最後の処理結果は，JSON Lines形式のレポートに一行ずつ書き出す．
+
+    $ python3 src/batch.py input_path output_path [--ext pdf] [--workers 4] [--report report.jsonl] [--watch]
+        [--strategy barcode --strategy ocr] [--root input_path2 output_path2] [--recursive]
+
+"""
+
+
+import os
+import sys
+import json
+import signal
+import argparse
+import threading
+from queue import Queue
+from datetime import datetime
+from watch import Watcher, WatchRoot, StopMode, CANCELLED, DEFERRED
+from app_service import validate_dir, validate_file_type, ValidateError
+from app_constants import PROCESS_WORKERS, IO_WORKERS, FILE_TYPES
+from logic.strategy_planner import STRATEGIES
+
+
+class JsonlReport:
+    """処理結果のレポートクラス
+
+    処理結果を受け取るたびに一行ずつ書き出す．
+    後回しにした処理は再び処理されるため，最後まで後回しのままだったものだけを閉じるときに書き出し，
+    一つのファイルの結果が一行になるようにする．
+
+    Attributes:
+        path (str): レポートのファイルパス．Noneのときは標準出力に書き出す
+        counts (dict): 処理の状態ごとの件数
+    """
+
+    def __init__(self, path=None):
+        self.path = path
+        self.counts = {}
+        # 後回しにした処理のファイルパスごとの，最後の処理結果
+        self._deferred = {}
+        # 閉じた後に止まった処理の結果は書き出さない．標準出力は閉じないため別に持つ
+        self._closed = False
+        self._lock = threading.Lock()
+        self._file = open(path, mode='a', encoding='utf-8') if path else sys.stdout
+
+    def write(self, job_outcome) -> None:
+        """処理結果を書き出す
+
+        Args:
+            job_outcome (:obj:`JobOutcome`): 処理結果
+        """
+        with self._lock:
+            # 終了後に止まった処理の結果は書き出さない
+            if self._closed:
+                return
+            if job_outcome.outcome == DEFERRED:
+                self._deferred[job_outcome.path] = job_outcome
+                return
+            self._deferred.pop(job_outcome.path, None)
+            self._write(job_outcome)
+
+    def _write(self, job_outcome):
+        self.counts[job_outcome.outcome] = self.counts.get(job_outcome.outcome, 0) + 1
+        self._file.write(json.dumps(job_outcome._asdict(), ensure_ascii=False) + '\n')
+        self._file.flush()
+
+    def close(self) -> None:
+        """後回しのままの処理結果を書き出し，レポートのファイルを閉じる"""
+        with self._lock:
+            if self._closed:
+                return
+            self._closed = True
+            for job_outcome in self._deferred.values():
+                self._write(job_outcome)
+            self._deferred.clear()
+            if self._file is not sys.stdout:
+                self._file.close()
+
+
+def _print_logs(queue):
+    """ログを標準エラー出力に書き出す
+
+    Noneを受け取ったときに終わる．
+
+    Args:
+        queue (:obj:`queue.Queue`): ログのキュー
+    """
+    while True:
+        message = queue.get()
+        if message is None:
+            return
+        log_time = datetime.now().strftime('%Y/%m/%d_%H:%M:%S')
+        print(f'[{log_time}] <{message.status.name}> {message.message}', file=sys.stderr, flush=True)
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Rename book PDFs in a directory by their ISBN without the GUI.'
+    )
+    parser.add_argument('input_path', help='directory containing the files to process')
+    parser.add_argument('output_path', help='directory to move the renamed files to')
+    parser.add_argument(
+        '--ext',
+        action='append',
+        default=None,
+        choices=FILE_TYPES,
+        help=f'extension to process; repeatable (default: {FILE_TYPES[0]})'
+    )
+    parser.add_argument('--workers', type=int, default=PROCESS_WORKERS, help='number of process workers')
+    parser.add_argument('--io-workers', type=int, default=IO_WORKERS, help='number of I/O threads')
+    parser.add_argument('--report', default=None, help='JSON Lines report path (default: stdout)')
+    parser.add_argument(
+        '--watch',
+        action='store_true',
+        help='keep watching the input directory until SIGINT or SIGTERM'
+    )
+    parser.add_argument(
+        '--strategy',
+        action='append',
+        default=None,
+        choices=STRATEGIES,
+        help='pin the ISBN extraction strategies to try, in order; repeatable (default: planned from past runs)'
+    )
+    parser.add_argument(
+        '--root',
+        action='append',
+        nargs=2,
+        default=None,
+        metavar=('INPUT_PATH', 'OUTPUT_PATH'),
+        help='another input and output directory pair to process with the same workers; repeatable'
+    )
+    parser.add_argument(
+        '--recursive',
+        action='store_true',
+        help='also process files in subdirectories of every input directory'
+    )
+    parser.add_argument(
+        '--stop-timeout',
+        type=float,
+        default=None,
+        help='seconds to wait for files in progress when stopping'
+    )
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """バッチ処理を実行
+
+    Args:
+        argv (list[str]): コマンドライン引数
+
+    Returns:
+        int: 終了コード．処理に失敗したファイルや，後回しのまま終わったファイルがあるときは1，
+            中断したときは2を返す．
+    """
+    args = _parse_args(argv)
+    extensions = args.ext or [FILE_TYPES[0]]
+    try:
+        validate_dir(args.input_path, '入力')
+        validate_dir(args.output_path, '出力')
+        for root_input_path, root_output_path in args.root or []:
+            validate_dir(root_input_path, '入力')
+            validate_dir(root_output_path, '出力')
+        for extension in extensions:
+            validate_file_type(extension)
+    except ValidateError as e:
+        print(f'{e.args[0]}: {e.args[1]}', file=sys.stderr)
+        return 2
+
+    input_path = os.path.abspath(args.input_path)
+    roots = [
+        WatchRoot(os.path.abspath(root_input_path), os.path.abspath(root_output_path), recursive=args.recursive)
+        for root_input_path, root_output_path in args.root or []
+    ]
+    input_paths = [input_path, *(root.input_path for root in roots)]
+    if len({os.path.normcase(path) for path in input_paths}) != len(input_paths):
+        print('The same input directory is given more than once.', file=sys.stderr)
+        return 2
+    # 手法を固定するときは，全ての入力ディレクトリで固定する
+    strategy_pins = {path: args.strategy for path in input_paths} if args.strategy else None
+
+    queue = Queue()
+    log_thread = threading.Thread(target=_print_logs, args=(queue,), daemon=True)
+    log_thread.start()
+
+    report = JsonlReport(args.report)
+    watcher = Watcher(
+        queue=queue,
+        input_path=input_path,
+        output_path=os.path.abspath(args.output_path),
+        extensions=extensions,
+        process_workers=args.workers,
+        io_workers=args.io_workers,
+        # プロセスワーカーを遊ばせないように，I/O待ちの分も多めに投入する
+        backlog_concurrency=args.workers * 2,
+        watch=args.watch,
+        on_job_done=report.write,
+        strategy_pins=strategy_pins,
+        roots=roots,
+        recursive=args.recursive
+    )
+
+    # SIGINTとSIGTERMで終了する
+    interrupted = threading.Event()
+
+    def _request_stop(signum, frame):
+        interrupted.set()
+
+    signal.signal(signal.SIGINT, _request_stop)
+    signal.signal(signal.SIGTERM, _request_stop)
+
+    watcher.start()
+    # シグナルを受け取れるように，メインスレッドは短い間隔で待つ
+    while watcher.is_alive() and not interrupted.wait(0.5):
+        pass
+
+    stop_kwargs = {}
+    if args.stop_timeout is not None:
+        stop_kwargs['timeout'] = args.stop_timeout
+    # バッチ処理を中断したときは，処理中のファイルを待たずに止める
+    mode = StopMode.IMMEDIATE if interrupted.is_set() and not args.watch else StopMode.DRAIN
+    watcher.stop_event(mode=mode, **stop_kwargs)
+    watcher.join()
+
+    queue.put(None)
+    log_thread.join(timeout=5)
+    report.close()
+
+    summary = ', '.join(f'{count} {outcome}' for outcome, count in sorted(report.counts.items()))
+    print(f'Done: {summary or "no files"}.', file=sys.stderr)
+    if interrupted.is_set() and not args.watch:
+        return 2
+    # 後回しのまま終わったファイルは，名前を変更していないため失敗とする
+    if report.counts.get('error') or report.counts.get(CANCELLED) or report.counts.get(DEFERRED):
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,61 @@
+"""本の情報の索引の作成
+
+書誌データのダンプを取り込み，ネットワークを使わずに本の情報を引くための索引を作成する．
+前回から変更のないダンプは読み飛ばすため，新しいダンプを追加して何度でも実行できる．
+
+    $ python3 src/build_index.py dump.json [dump.csv ...] [--index path] [--force]
+
+"""
+
+
+import sys
+import time
+import argparse
+from logic.local_index import LocalBookIndex, DUMP_TYPES
+from app_constants import LOCAL_INDEX_PATH
+
+
+def _parse_args(argv):
+    parser = argparse.ArgumentParser(
+        description='Build the local book info index from bibliographic dumps.'
+    )
+    parser.add_argument(
+        'dumps',
+        nargs='+',
+        help=f'dump files to import ({", ".join(DUMP_TYPES)})'
+    )
+    parser.add_argument('--index', default=LOCAL_INDEX_PATH, help=f'index path (default: {LOCAL_INDEX_PATH})')
+    parser.add_argument('--force', action='store_true', help='import dumps even if they are unchanged')
+    return parser.parse_args(argv)
+
+
+def main(argv=None) -> int:
+    """索引を作成
+
+    Args:
+        argv (list[str]): コマンドライン引数
+
+    Returns:
+        int: 終了コード．取り込めなかったダンプがあるときは1を返す．
+    """
+    args = _parse_args(argv)
+    index = LocalBookIndex(args.index)
+    failed = False
+    for dump in args.dumps:
+        started = time.perf_counter()
+        try:
+            records = index.import_dump(dump, force=args.force)
+        except (OSError, ValueError) as e:
+            print(f'Failed to import {dump}: {e}', file=sys.stderr)
+            failed = True
+            continue
+        if records is None:
+            print(f'Skipped {dump}: unchanged since the last import.', file=sys.stderr)
+        else:
+            print(f'Imported {records} records from {dump} in {time.perf_counter() - started:.1f}s.', file=sys.stderr)
+    print(f'{len(index)} books in {args.index}.', file=sys.stderr)
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
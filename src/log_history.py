@@ -0,0 +1,72 @@
+"""ログの履歴
+
+GUIに表示したログを全てファイルに書き出す．
+GUIのログは古い行を削除するため，ログの出力には履歴のファイルを使う．
+
+"""
+
+
+import os
+import shutil
+import threading
+from datetime import datetime
+
+
+class LogHistory:
+    """ログの履歴クラス
+
+    起動ごとに一つのファイルを作成し，追記していく．
+    古い履歴のファイルは`keep`個を残して削除する．
+
+    Attributes:
+        log_dir (str): 履歴を保存するディレクトリ
+        keep (int): 残す履歴のファイル数
+        path (str): 履歴のファイルパス
+    """
+
+    def __init__(self, log_dir, keep=30):
+        self.log_dir = log_dir
+        self.keep = keep
+        os.makedirs(log_dir, exist_ok=True)
+        self._prune()
+        self.path = os.path.join(log_dir, datetime.now().strftime('%Y%m%d_%H%M%S_LOG.txt'))
+        self._lock = threading.Lock()
+        self._file = open(self.path, mode='a', encoding='utf-8')
+
+    def _prune(self):
+        """古い履歴のファイルを削除"""
+        names = sorted(name for name in os.listdir(self.log_dir) if name.endswith('_LOG.txt'))
+        # これから作成するファイルの分を空ける
+        for name in names[:max(0, len(names) - self.keep + 1)]:
+            try:
+                os.remove(os.path.join(self.log_dir, name))
+            except OSError:
+                pass
+
+    def write(self, lines) -> None:
+        """ログを追記
+
+        Args:
+            lines (list[str]): 改行を含むログの行のリスト
+        """
+        with self._lock:
+            if self._file.closed:
+                return
+            self._file.writelines(lines)
+            self._file.flush()
+
+    def export(self, output_path: str) -> None:
+        """履歴をファイルにコピー
+
+        Args:
+            output_path (str): 出力先のファイルパス
+        """
+        with self._lock:
+            if not self._file.closed:
+                self._file.flush()
+            shutil.copyfile(self.path, output_path)
+
+    def close(self) -> None:
+        """履歴のファイルを閉じる"""
+        with self._lock:
+            self._file.close()
@@ -0,0 +1,139 @@
+"""本の情報のキャッシュ
+
+ISBNコードをキーとして，APIから取得した本の情報をSQLiteに保存する．
+キーは`isbn_candidates.normalize_isbn`で13桁に正規化し，候補の順位付けと同じISBNコードとして扱う．
+
+"""
+
+
+import time
+from collections import namedtuple
+from logic.isbn_to_info import BookInfo
+from logic.isbn_candidates import normalize_isbn
+from logic.sqlite_util import ThreadLocalConnection
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS book_info (
+    isbn TEXT PRIMARY KEY,
+    title TEXT,
+    author TEXT,
+    source TEXT,
+    expires_at REAL NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS book_info_accessed_at ON book_info (accessed_at);
+'''
+
+# 件数の上限を確認する間隔（書き込み回数）
+_EVICT_INTERVAL = 64
+
+"""キャッシュのエントリ
+
+Attributes:
+    book_info (:obj:`BookInfo`): 本の情報．
+        どのAPIでも見つからなかったときはNone
+    source (str): 本の情報を取得したAPI
+"""
+CacheEntry = namedtuple('CacheEntry', [
+    'book_info',
+    'source'
+])
+
+
+class BookInfoCache:
+    """本の情報のキャッシュクラス
+
+    複数の監視プロセスから同じファイルを共有できる．
+
+    Attributes:
+        db_path (str): キャッシュのファイルパス
+        ttl (float): 本の情報が見つかったときの保持秒数
+        negative_ttl (float): 本の情報が見つからなかったときの保持秒数
+        max_entries (int): 最大件数．超えたときは最も参照されていないものから削除する
+    """
+
+    def __init__(self, db_path, ttl, negative_ttl, max_entries):
+        self.db_path = db_path
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self.max_entries = max_entries
+        self._connection = ThreadLocalConnection(db_path, _SCHEMA)
+        self._writes = 0
+
+    def get(self, isbn: str) -> CacheEntry:
+        """キャッシュから本の情報を取得
+
+        Args:
+            isbn (str): ISBNコード
+
+        Returns:
+            :obj:`CacheEntry`: キャッシュのエントリ．
+                キャッシュにないとき，期限切れのとき，またはISBNコードとして正しくないときはNoneを返す．
+        """
+        isbn = normalize_isbn(isbn)
+        if isbn is None:
+            return None
+        now = time.time()
+        connection = self._connection.get()
+        row = connection.execute(
+            'SELECT title, author, source FROM book_info WHERE isbn = ? AND expires_at > ?',
+            (isbn, now)
+        ).fetchone()
+        if row is None:
+            return None
+
+        connection.execute(
+            'UPDATE book_info SET accessed_at = ? WHERE isbn = ?',
+            (now, isbn)
+        )
+        title, author, source = row
+        if source is None:
+            return CacheEntry(book_info=None, source=None)
+        return CacheEntry(book_info=BookInfo(title=title, author=author), source=source)
+
+    def put(self, isbn: str, book_info: BookInfo, source: str) -> None:
+        """本の情報をキャッシュに保存
+
+        Args:
+            isbn (str): ISBNコード
+            book_info (:obj:`BookInfo`): 本の情報
+            source (str): 本の情報を取得したAPI
+        """
+        self._put(isbn, book_info.title, book_info.author, source, self.ttl)
+
+    def put_negative(self, isbn: str) -> None:
+        """本の情報が見つからなかったことをキャッシュに保存
+
+        Args:
+            isbn (str): ISBNコード
+        """
+        self._put(isbn, None, None, None, self.negative_ttl)
+
+    def _put(self, isbn, title, author, source, ttl):
+        # ISBNコードとして正しくないものは保存しない
+        isbn = normalize_isbn(isbn)
+        if isbn is None:
+            return
+        now = time.time()
+        connection = self._connection.get()
+        connection.execute(
+            'INSERT OR REPLACE INTO book_info '
+            '(isbn, title, author, source, expires_at, accessed_at) '
+            'VALUES (?, ?, ?, ?, ?, ?)',
+            (isbn, title, author, source, now + ttl, now)
+        )
+
+        self._writes += 1
+        if self._writes % _EVICT_INTERVAL == 0:
+            self.evict()
+
+    def evict(self) -> None:
+        """期限切れのものと，上限を超えた分を削除"""
+        connection = self._connection.get()
+        connection.execute('DELETE FROM book_info WHERE expires_at <= ?', (time.time(),))
+        connection.execute(
+            'DELETE FROM book_info WHERE isbn IN ('
+            'SELECT isbn FROM book_info ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
@@ -0,0 +1,149 @@
+"""本の情報の同時取得
+
+複数のAPIへ同時に問い合わせ，優先順位に従って本の情報を決定する．
+
+"""
+
+
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ThreadPoolExecutor, wait, FIRST_COMPLETED
+from logic.metrics import Span
+from logic.rate_limiter import RateLimitedException
+
+
+"""本の情報の取得元
+
+Attributes:
+    name (str): 取得元の名前
+    lookup (callable): ISBNコードを受け取り，本の情報を返す関数
+    returns_future (bool): `lookup`が`concurrent.futures.Future`を返すか
+"""
+Provider = namedtuple('Provider', [
+    'name',
+    'lookup',
+    'returns_future'
+], defaults=[False])
+
+"""本の情報の取得結果
+
+Attributes:
+    book_info (:obj:`BookInfo`): 本の情報．どの取得元でも見つからなかったときはNone
+    source (str): 本の情報を取得した取得元の名前
+    errors (list[Exception]): 取得元で発生した例外
+    spans (list[:obj:`Span`]): 結果を決めるまでに答えた取得元ごとの実行時間
+"""
+ResolvedBookInfo = namedtuple('ResolvedBookInfo', [
+    'book_info',
+    'source',
+    'errors',
+    'spans'
+], defaults=[()])
+
+
+class BookInfoResolver:
+    """本の情報の同時取得クラス
+
+    全ての取得元へ同時に問い合わせる．
+    優先する取得元が`grace`秒以内に答えたときはその結果を使い，
+    それ以外のときは最初に見つかった結果を使う．
+    使わなかった問い合わせはキャンセルする．
+    優先する取得元が流量制限にかかったときは，他の取得元の結果を使う．
+    どの取得元でも見つからず，いずれかの取得元が流量制限にかかったときは，問い合わせを後回しにする．
+
+    Attributes:
+        providers (list[:obj:`Provider`]): 取得元のリスト
+        preferred (str): 優先する取得元の名前．Noneのときは最初に見つかった結果を使う
+        grace (float): 優先する取得元を待つ秒数
+        timeout (float): 全体のタイムアウト秒数
+    """
+
+    def __init__(self, providers, preferred=None, grace=0.0, timeout=60.0, max_workers=8):
+        self.providers = providers
+        self.preferred = preferred
+        self.grace = grace
+        self.timeout = timeout
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_workers,
+            thread_name_prefix='book_info_resolver'
+        )
+
+    def _submit(self, provider, isbn) -> Future:
+        if provider.returns_future:
+            return provider.lookup(isbn)
+        return self._executor.submit(provider.lookup, isbn)
+
+    def resolve(self, isbn: str) -> ResolvedBookInfo:
+        """ISBNコードから本の情報を取得
+
+        Args:
+            isbn (str): ISBNコード
+
+        Raises:
+            RateLimitedException: 本の情報が見つからず，いずれかの取得元が流量制限にかかったときに発生
+
+        Returns:
+            :obj:`ResolvedBookInfo`: 本の情報の取得結果
+        """
+        deadline = time.monotonic() + self.timeout
+        started = time.perf_counter()
+        futures = {self._submit(provider, isbn): provider.name for provider in self.providers}
+        errors = []
+        spans = []
+        # 取得元の名前は，優先する取得元の結果を使った後も引けるように別に持つ
+        names = {id(future): name for future, name in futures.items()}
+
+        def _record_span(future):
+            if not future.cancelled():
+                spans.append(Span(names[id(future)], time.perf_counter() - started, future.exception() is None))
+
+        for future in futures:
+            future.add_done_callback(_record_span)
+
+        def _result(future):
+            # 流量制限も他の例外と同じく記録し，他の取得元の結果を待つ
+            try:
+                return future.result()
+            except Exception as e:
+                errors.append(e)
+
+        try:
+            # 優先する取得元を一定時間待つ
+            preferred_future = next(
+                (future for future, name in futures.items() if name == self.preferred),
+                None
+            )
+            if preferred_future is not None:
+                wait([preferred_future], timeout=self.grace)
+                if preferred_future.done():
+                    book_info = _result(preferred_future)
+                    del futures[preferred_future]
+                    if book_info:
+                        return ResolvedBookInfo(book_info, self.preferred, errors, list(spans))
+
+            # 最初に見つかった結果を使う
+            pending = set(futures)
+            while pending:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    errors.append(TimeoutError(f'Timed out resolving ISBN: {isbn}.'))
+                    break
+                done, pending = wait(pending, timeout=remaining, return_when=FIRST_COMPLETED)
+                # 同時に終わったときは取得元の並び順を優先する
+                for future in sorted(done, key=lambda f: list(futures).index(f)):
+                    book_info = _result(future)
+                    if book_info:
+                        return ResolvedBookInfo(book_info, futures[future], errors, list(spans))
+
+            # 流量制限で答えられなかった取得元があるときは，見つからなかったとはしない
+            rate_limited = [error for error in errors if isinstance(error, RateLimitedException)]
+            if rate_limited:
+                raise rate_limited[0]
+            return ResolvedBookInfo(None, None, errors, list(spans))
+        finally:
+            for future in futures:
+                future.cancel()
+
+    def close(self) -> None:
+        """スレッドプールを終了"""
+        self._executor.shutdown(wait=False, cancel_futures=True)
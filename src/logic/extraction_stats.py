@@ -0,0 +1,155 @@
+"""ISBNコード取得の集計
+
+ISBNコードを取得する各段階の実行時間と，ISBNコードが見つかった割合を集計する．
+
+"""
+
+
+import os
+import json
+import time
+import threading
+from collections import namedtuple
+
+
+"""段階ごとの実行記録
+
+Attributes:
+    stage (str): 段階の名前
+    seconds (float): 実行時間
+    hit (bool): ISBNコードが見つかったか
+"""
+StageRecord = namedtuple('StageRecord', [
+    'stage',
+    'seconds',
+    'hit'
+])
+
+
+class StageTimer:
+    """段階の実行時間を計測するクラス
+
+    `with`文で使い，抜けたときに記録を追加する．
+    ISBNコードが見つかったときは`hit`をTrueにする．
+
+    Attributes:
+        stage (str): 段階の名前
+        records (list[:obj:`StageRecord`]): 記録を追加するリスト．Noneのときは記録しない
+        hit (bool): ISBNコードが見つかったか
+    """
+
+    def __init__(self, stage, records):
+        self.stage = stage
+        self.records = records
+        self.hit = False
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        if self.records is not None:
+            self.records.append(
+                StageRecord(self.stage, time.perf_counter() - self._start, self.hit)
+            )
+
+
+class ExtractionStats:
+    """ISBNコード取得の集計クラス
+
+    集計結果はJSONファイルに保存し，次回起動時に引き継ぐ．
+
+    Attributes:
+        stats_path (str): 集計結果のファイルパス
+        save_interval (int): 何件記録するごとに保存するか
+    """
+
+    def __init__(self, stats_path, save_interval=50):
+        self.stats_path = stats_path
+        self.save_interval = save_interval
+        self._stages = {}
+        self._lock = threading.Lock()
+        self._save_lock = threading.Lock()
+        self._records = 0
+        self._load()
+
+    def _load(self):
+        if not self.stats_path or not os.path.isfile(self.stats_path):
+            return
+        try:
+            with open(self.stats_path, encoding='utf-8') as f:
+                stages = json.load(f)
+        except (OSError, ValueError):
+            return
+        for stage, values in stages.items():
+            self._stages[stage] = {
+                'attempts': int(values.get('attempts', 0)),
+                'hits': int(values.get('hits', 0)),
+                'seconds': float(values.get('seconds', 0.0)),
+            }
+
+    def record(self, records) -> None:
+        """実行記録を集計に追加
+
+        Args:
+            records (list[:obj:`StageRecord`]): 実行記録のリスト
+        """
+        with self._lock:
+            for record in records:
+                stage = self._stages.setdefault(
+                    record.stage,
+                    {'attempts': 0, 'hits': 0, 'seconds': 0.0}
+                )
+                stage['attempts'] += 1
+                stage['hits'] += int(record.hit)
+                stage['seconds'] += record.seconds
+            self._records += 1
+            should_save = self._records % self.save_interval == 0
+
+        if should_save:
+            self.save()
+
+    def snapshot(self) -> dict:
+        """集計結果を取得
+
+        Returns:
+            dict: 段階の名前ごとの試行回数，ヒット数，ヒット率，平均実行時間
+        """
+        with self._lock:
+            return {
+                stage: {
+                    'attempts': values['attempts'],
+                    'hits': values['hits'],
+                    'seconds': values['seconds'],
+                    'hit_rate': values['hits'] / values['attempts'] if values['attempts'] else 0.0,
+                    'mean_seconds': values['seconds'] / values['attempts'] if values['attempts'] else 0.0,
+                }
+                for stage, values in self._stages.items()
+            }
+
+    def summary(self) -> str:
+        """集計結果をログ出力用の文字列で取得
+
+        Returns:
+            str: 集計結果
+        """
+        lines = []
+        for stage, values in sorted(self.snapshot().items()):
+            lines.append(
+                f'{stage}: {values["hits"]}/{values["attempts"]} hits '
+                f'({values["hit_rate"]:.0%}), {values["mean_seconds"]:.2f}s avg'
+            )
+        return '\n'.join(lines)
+
+    def save(self) -> None:
+        """集計結果をファイルに保存"""
+        if not self.stats_path:
+            return
+        with self._save_lock:
+            snapshot = self.snapshot()
+            os.makedirs(os.path.dirname(self.stats_path), exist_ok=True)
+            tmp_path = f'{self.stats_path}.{os.getpid()}.tmp'
+            with open(tmp_path, 'w', encoding='utf-8') as f:
+                json.dump(snapshot, f, indent=4, ensure_ascii=False)
+            os.replace(tmp_path, self.stats_path)
@@ -0,0 +1,144 @@
+"""HTTPクライアント
+
+APIを呼び出すための共通HTTPクライアント．
+ホストごとにセッションを使い回し，タイムアウトとリトライを行う．
+
+"""
+
+
+import time
+import random
+import threading
+import requests
+from urllib.parse import urlsplit
+from requests.adapters import HTTPAdapter
+
+
+# リトライするステータスコード
+RETRY_STATUS_CODES = frozenset([500, 502, 503, 504])
+
+
+class HttpClient:
+    """HTTPクライアントクラス
+
+    ホストごとに`requests.Session`を作成し，コネクションを使い回す．
+    5xxや接続エラーのときは，ジッターを入れた指数バックオフでリトライする．
+
+    Attributes:
+        connect_timeout (float): 接続タイムアウト秒数
+        read_timeout (float): 読み込みタイムアウト秒数
+        max_retries (int): 最大リトライ回数
+        backoff (float): リトライ間隔の基準秒数
+        max_backoff (float): リトライ間隔の最大秒数
+        pool_connections (int): ホストごとに保持するコネクションプール数
+        pool_maxsize (int): コネクションプールの最大接続数
+    """
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10.0, max_retries=3,
+                 backoff=0.5, max_backoff=8.0, pool_connections=4, pool_maxsize=16):
+        self.connect_timeout = connect_timeout
+        self.read_timeout = read_timeout
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.max_backoff = max_backoff
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._sessions = {}
+        self._lock = threading.Lock()
+
+    def _session(self, url: str) -> requests.Session:
+        """ホストに対応するセッションを取得
+
+        Args:
+            url (str): リクエスト先URL
+
+        Returns:
+            :obj:`requests.Session`: セッション
+        """
+        parts = urlsplit(url)
+        host = f'{parts.scheme}://{parts.netloc}'
+        with self._lock:
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(
+                    pool_connections=self.pool_connections,
+                    pool_maxsize=self.pool_maxsize,
+                    max_retries=0
+                )
+                session.mount(host, adapter)
+                self._sessions[host] = session
+            return session
+
+    def _sleep_before_retry(self, attempt: int) -> None:
+        """リトライ前に待つ
+
+        Args:
+            attempt (int): 何回目のリトライか（0始まり）
+        """
+        time.sleep(random.uniform(0, min(self.max_backoff, self.backoff * 2 ** attempt)))
+
+    def get(self, url: str, **kwargs) -> requests.Response:
+        """GETリクエスト
+
+        Args:
+            url (str): リクエスト先URL
+
+        Raises:
+            requests.RequestException: リトライしても接続できなかったときに発生
+
+        Returns:
+            :obj:`requests.Response`: レスポンス．
+                リトライしても5xxのときは最後のレスポンスを返す．
+        """
+        kwargs.setdefault('timeout', (self.connect_timeout, self.read_timeout))
+        session = self._session(url)
+        for attempt in range(self.max_retries + 1):
+            is_last = attempt == self.max_retries
+            try:
+                res = session.get(url, **kwargs)
+            except (requests.ConnectionError, requests.Timeout):
+                if is_last:
+                    raise
+            else:
+                if res.status_code not in RETRY_STATUS_CODES or is_last:
+                    return res
+            self._sleep_before_retry(attempt)
+
+    def close(self) -> None:
+        """全てのセッションを閉じる"""
+        with self._lock:
+            for session in self._sessions.values():
+                session.close()
+            self._sessions.clear()
+
+
+_client = HttpClient()
+_client_lock = threading.Lock()
+
+
+def get_http_client() -> HttpClient:
+    """共有HTTPクライアントを取得
+
+    Returns:
+        :obj:`HttpClient`: 共有HTTPクライアント
+    """
+    return _client
+
+
+def configure_http_client(**kwargs) -> HttpClient:
+    """共有HTTPクライアントの設定を変更
+
+    既存のセッションを閉じ，新しい設定で共有HTTPクライアントを作り直す．
+
+    Args:
+        **kwargs: `HttpClient`の引数
+
+    Returns:
+        :obj:`HttpClient`: 共有HTTPクライアント
+    """
+    global _client
+    with _client_lock:
+        _client.close()
+        _client = HttpClient(**kwargs)
+        return _client
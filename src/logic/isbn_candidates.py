@@ -0,0 +1,197 @@
+"""ISBNコードの候補
+
+バーコードや文字列から読み取ったISBNコードを正規化し，チェックディジットで検証する．
+一冊から複数の候補が見つかったときは，読み取った手法，ページの位置，一致した数で順位を付ける．
+
+"""
+
+
+import re
+from collections import namedtuple
+
+
+# 書籍JANコードの二段目（分類と価格）の先頭
+PRICE_CODE_PREFIX = '192'
+# ISBNコードとして使われるEANの接頭辞
+ISBN_PREFIXES = ('978', '979')
+
+# 読み取った手法ごとの重み
+# バーコードは読み違えるとチェックディジットで弾かれるため，文字列より信頼できる
+SOURCE_WEIGHTS = {
+    'barcode': 3.0,
+    'text_layer': 2.0,
+    'ocr': 1.0,
+}
+# 別の手法やページでも見つかったときに，一回ごとに加える重みの割合
+AGREEMENT_BONUS = 0.5
+
+"""読み取ったISBNコード
+
+Attributes:
+    isbn (str): 正規化した13桁のISBNコード
+    source (str): 読み取った手法．`SOURCE_WEIGHTS`のキーのいずれか
+    page_number (int): 読み取ったページ番号（1始まり）．分からないときはNone
+"""
+Sighting = namedtuple('Sighting', [
+    'isbn',
+    'source',
+    'page_number'
+])
+
+"""順位を付けたISBNコードの候補
+
+Attributes:
+    isbn (str): 正規化した13桁のISBNコード
+    score (float): 点数．高いほど確からしい
+    sources (tuple[str]): 読み取った手法
+"""
+Candidate = namedtuple('Candidate', [
+    'isbn',
+    'score',
+    'sources'
+])
+
+# 文字列の中のISBNコード．ISBN-13とISBN-10のどちらにも一致させ，区切りのハイフンは任意とする
+_ISBN_TEXT_PATTERN = re.compile(
+    r'ISBN(?:-?1[03])?[:：]?((?:97[89]-?)?[0-9](?:-?[0-9]){8}-?[0-9X])(?![0-9])'
+)
+
+
+def is_valid_isbn13(isbn: str) -> bool:
+    """13桁のISBNコードのチェックディジットを検証
+
+    Args:
+        isbn (str): ハイフンを含まない13桁の数字
+
+    Returns:
+        bool: ISBNコードの接頭辞を持ち，チェックディジットが正しいときはTrue
+    """
+    if len(isbn) != 13 or not isbn.isdigit() or not isbn.startswith(ISBN_PREFIXES):
+        return False
+    total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(isbn[:12]))
+    return (10 - total % 10) % 10 == int(isbn[12])
+
+
+def is_valid_isbn10(isbn: str) -> bool:
+    """10桁のISBNコードのチェックディジットを検証
+
+    Args:
+        isbn (str): ハイフンを含まない10桁の数字．チェックディジットはXを含む
+
+    Returns:
+        bool: チェックディジットが正しいときはTrue
+    """
+    if len(isbn) != 10 or not isbn[:9].isdigit() or not (isbn[9].isdigit() or isbn[9] == 'X'):
+        return False
+    total = sum(int(digit) * (10 - i) for i, digit in enumerate(isbn[:9]))
+    total += 10 if isbn[9] == 'X' else int(isbn[9])
+    return total % 11 == 0
+
+
+def normalize_isbn(code: str) -> str:
+    """ISBNコードを正規化
+
+    ハイフンや空白を取り除き，10桁のときは13桁に変換する．
+    チェックディジットが正しくないものや，書籍JANコードの二段目は除く．
+
+    Args:
+        code (str): バーコードや文字列から読み取ったコード
+
+    Returns:
+        str: 13桁のISBNコード．ISBNコードでないときはNoneを返す．
+    """
+    if code is None:
+        return None
+    code = re.sub(r'[^0-9X]', '', str(code).upper())
+    if len(code) == 10 and is_valid_isbn10(code):
+        body = '978' + code[:9]
+        total = sum(int(digit) * (3 if i % 2 else 1) for i, digit in enumerate(body))
+        return body + str((10 - total % 10) % 10)
+    if code.startswith(PRICE_CODE_PREFIX):
+        return None
+    if is_valid_isbn13(code):
+        return code
+    return None
+
+
+def find_isbns_in_text(text: str) -> list:
+    """文字列から，`ISBN`に続くISBNコードを全て探す
+
+    Args:
+        text (str): 空白を取り除いた文字列
+
+    Returns:
+        list[str]: 正規化したISBNコードのリスト．見つかった順に並べる．
+    """
+    isbns = []
+    for match in _ISBN_TEXT_PATTERN.finditer(text.upper()):
+        isbn = normalize_isbn(match.group(1))
+        if isbn:
+            isbns.append(isbn)
+    return isbns
+
+
+def _page_weight(page_number, total_pages) -> float:
+    """ページの位置の重み
+
+    ISBNコードは奥付や裏表紙にあることが多いため，末尾のページを最も重くし，次に表紙とする．
+
+    Args:
+        page_number (int): ページ番号（1始まり）．分からないときはNone
+        total_pages (int): 総ページ数．分からないときはNone
+
+    Returns:
+        float: ページの位置の重み
+    """
+    if page_number is None or not total_pages:
+        return 1.0
+    if page_number >= total_pages - 1:
+        return 1.0
+    if page_number <= 2:
+        return 0.8
+    return 0.5
+
+
+def rank_candidates(sightings, total_pages=None) -> list:
+    """読み取ったISBNコードに順位を付ける
+
+    手法とページの位置の重みを足し合わせ，別の手法やページでも見つかったものに重みを加える．
+    同じ点数のときは，先に読み取ったものを優先する．
+
+    Args:
+        sightings (list[:obj:`Sighting`]): 読み取ったISBNコードのリスト
+        total_pages (int): 総ページ数
+
+    Returns:
+        list[:obj:`Candidate`]: 点数が高い順に並べた候補のリスト
+    """
+    grouped = {}
+    for sighting in sightings:
+        grouped.setdefault(sighting.isbn, []).append(sighting)
+
+    candidates = []
+    for isbn, group in grouped.items():
+        score = sum(
+            SOURCE_WEIGHTS.get(sighting.source, 1.0) * _page_weight(sighting.page_number, total_pages)
+            for sighting in group
+        )
+        distinct = {(sighting.source, sighting.page_number) for sighting in group}
+        score *= 1 + AGREEMENT_BONUS * (len(distinct) - 1)
+        sources = tuple(sorted({sighting.source for sighting in group}))
+        candidates.append(Candidate(isbn, score, sources))
+    # sortedは安定なため，同じ点数のときは読み取った順になる
+    return sorted(candidates, key=lambda candidate: -candidate.score)
+
+
+def best_isbn(sightings, total_pages=None) -> str:
+    """最も確からしいISBNコードを取得
+
+    Args:
+        sightings (list[:obj:`Sighting`]): 読み取ったISBNコードのリスト
+        total_pages (int): 総ページ数
+
+    Returns:
+        str: ISBNコード．候補がないときはNoneを返す．
+    """
+    candidates = rank_candidates(sightings, total_pages)
+    return candidates[0].isbn if candidates else None
@@ -6,13 +6,41 @@ PDFからISBNコードを取得する．
 
 
 import re
+import io
+import os
 import pyocr
-import tempfile
+import threading
 import subprocess
 import pyocr.builders
 from os.path import basename
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from PIL import Image
 from pyzbar.pyzbar import decode
 from pdf2image import convert_from_path
+from logic.pdf_reader import get_page_count, get_page_jpeg_images, PdfReadError
+from logic.render_ladder import DEFAULT_LADDER, level_name, render_page, crop_regions
+from logic.extraction_stats import StageTimer
+from logic.metrics import span, current_collector, collect_spans
+from logic.isbn_candidates import Sighting, normalize_isbn, find_isbns_in_text, best_isbn
+
+
+# ISBNコードが載っていることが多い領域
+# 奥付は下部に，和書の裏表紙は右上に載っていることが多い
+ISBN_TEXT_REGIONS = [
+    (0.0, 0.5, 1.0, 1.0),
+    (0.4, 0.0, 1.0, 0.5),
+]
+# ISBNコードに使われる文字
+ISBN_CHAR_WHITELIST = 'ISBN0123456789-X'
+# テキストレイヤーを確認する，末尾と先頭からそれぞれのページ数
+TEXT_LAYER_PAGES = 3
+# 一つのプロセスで並列でテキスト化するページ数の上限
+OCR_WORKERS = min(4, os.cpu_count() or 1)
+# このプロセスで並列でテキスト化するページ数．プロセスワーカーの数に合わせて`configure_ocr_workers`で変える
+_ocr_workers = OCR_WORKERS
+# PDFを画像やテキストに変換して試す手法．既定の順番に並べる
+PDF_STRATEGIES = ('text_layer', 'barcode', 'ocr')
 
 
 class NoSuchISBNException(Exception):
@@ -24,15 +52,25 @@ class NoSuchISBNException(Exception):
     pass
 
 
-def get_isbn_from_pdf(input_path: str) -> str:
+def get_isbn_from_pdf(input_path: str, ladder=DEFAULT_LADDER, records=None, total_pages=None,
+                      sightings=None, strategies=PDF_STRATEGIES) -> str:
     """PDFからISBNコードを取得
 
-    PDFを画像に変換し，いずれか二つの手法でISBNコードを取得する．
+    まず，PDFのテキストレイヤーからISBNコードを取得する．
+    見つからないときは，PDFを一ページずつ画像に変換し，いずれか二つの手法でISBNコードを取得する．
     画像からバーコードを使ってISBNコードを取得．
+    バーコードは描画の段階に従い，低解像度から順に読み取る．
     または，画像から文字列を取得し，ISBNコードを取得．
+    ISBNコードが見つかった時点で，残りのページは変換しない．
+    一つの画像や文字列から複数のISBNコードが見つかったときは，最も確からしいものを返す．
 
     Args:
         input_path (str): ファイルパス
+        ladder (list[:obj:`RenderLevel`]): バーコードを読み取る際の描画の段階
+        records (list[:obj:`StageRecord`]): 段階ごとの実行記録を追加するリスト
+        total_pages (int): 総ページ数．Noneのときは取得する
+        sightings (list[:obj:`Sighting`]): 読み取ったISBNコードを全て追加するリスト
+        strategies (list[str]): 試す手法の順番．`PDF_STRATEGIES`のいずれか
 
     Raises:
         NoSuchISBNException: ISBNコードが見つからなかったときに発生
@@ -41,45 +79,262 @@ def get_isbn_from_pdf(input_path: str) -> str:
         str: 本から取得したISBNコードを取得する．
     """
 
-    cmd = f'echo $(pdfinfo "{input_path}" | grep -E "^Pages" | sed -E "s/^Pages: +//")'
-    cmd_result = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-    total_pages = int(cmd_result.stdout.strip())
+    if total_pages is None:
+        total_pages = get_total_pages(input_path)
     if total_pages == 0:
         raise NoSuchISBNException(
             f'Cannot get ISBN from {basename(input_path)}.'
         )
 
-    with tempfile.TemporaryDirectory() as temp_path:
-        # TODO 総ページ数が2以下のとき
-        last_page_images = convert_from_path(
+    for strategy in strategies:
+        isbn = run_strategy(
+            strategy,
             input_path,
-            first_page=total_pages - 2,
-            output_folder=temp_path,
-            fmt='jpeg'
+            total_pages,
+            ladder=ladder,
+            records=records,
+            sightings=sightings
         )
-
-        # バーコードからISBNコードを取得する
-        isbn = get_isbn_from_barcode(last_page_images)
         if isbn:
             return isbn
 
-        # 文字列からISBNコードを取得する
-        isbn = get_isbn_from_text(last_page_images)
+    raise NoSuchISBNException(
+        f'Cannot get ISBN from {basename(input_path)}.'
+    )
+
+
+def run_strategy(strategy: str, input_path: str, total_pages: int, ladder=DEFAULT_LADDER,
+                 records=None, sightings=None) -> str:
+    """一つの手法でPDFからISBNコードを取得
+
+    Args:
+        strategy (str): 手法．`PDF_STRATEGIES`のいずれか
+        input_path (str): ファイルパス
+        total_pages (int): 総ページ数
+        ladder (list[:obj:`RenderLevel`]): バーコードを読み取る際の描画の段階
+        records (list[:obj:`StageRecord`]): 段階ごとの実行記録を追加するリスト
+        sightings (list[:obj:`Sighting`]): 読み取ったISBNコードを全て追加するリスト
+
+    Raises:
+        ValueError: 知らない手法のときに発生
+
+    Returns:
+        str: ISBNコードを返す．
+            取得できないときはNoneを返す．
+    """
+    page_numbers = scan_page_order(total_pages)
+
+    # テキストレイヤーからISBNコードを取得する
+    if strategy == 'text_layer':
+        with StageTimer('text_layer', records) as timer:
+            isbn = get_isbn_from_text_layer(input_path, total_pages, sightings=sightings)
+            timer.hit = bool(isbn)
+        return isbn
+
+    # バーコードからISBNコードを取得する
+    if strategy == 'barcode':
+        for level in ladder:
+            with StageTimer(f'barcode:{level_name(level)}', records) as timer:
+                for page_number in page_numbers:
+                    isbn = get_isbn_from_barcode(
+                        render_page(input_path, page_number, level),
+                        sightings=sightings,
+                        page_number=page_number,
+                        total_pages=total_pages
+                    )
+                    if isbn:
+                        timer.hit = True
+                        return isbn
+        return None
+
+    # 文字列からISBNコードを取得する
+    if strategy == 'ocr':
+        with StageTimer('ocr', records) as timer:
+            isbn = get_isbn_from_text(
+                iter_page_images(input_path, page_numbers),
+                sightings=sightings,
+                total_pages=total_pages
+            )
+            timer.hit = bool(isbn)
+        return isbn
+
+    raise ValueError(f'Unknown strategy: {strategy}.')
+
+
+def scan_page_order(total_pages: int) -> list:
+    """ISBNコードを探すページの順番を取得
+
+    ISBNコードが載っている可能性が高い順に，
+    最終ページ，裏表紙の内側，表紙，最終ページの二つ前とする．
+    総ページ数が少ないときは，重複したページを除く．
+
+    Args:
+        total_pages (int): 総ページ数
+
+    Returns:
+        list[int]: ページ番号（1始まり）のリスト
+    """
+    page_numbers = []
+    for page_number in (total_pages, total_pages - 1, 1, total_pages - 2):
+        if 1 <= page_number <= total_pages and page_number not in page_numbers:
+            page_numbers.append(page_number)
+    return page_numbers
+
+
+def iter_page_images(input_path: str, page_numbers, dpi=200):
+    """ページを一枚ずつ画像に変換
+
+    一度に保持する画像を一枚にするため，ページごとに変換する．
+
+    Args:
+        input_path (str): ファイルパス
+        page_numbers (list[int]): ページ番号（1始まり）のリスト
+        dpi (int): 解像度
+
+    Yields:
+        tuple: ページ番号と，ページの画像(PIL.Image)
+    """
+    for page_number in page_numbers:
+        with span('render'):
+            page_images = convert_from_path(
+                input_path,
+                dpi=dpi,
+                first_page=page_number,
+                last_page=page_number
+            )
+        if page_images:
+            yield page_number, page_images[0]
+
+
+def get_isbn_from_text_layer(input_path: str, total_pages: int, page_count=TEXT_LAYER_PAGES,
+                             sightings=None) -> str:
+    """テキストレイヤーからISBNコードを取得
+
+    出版社が作成したPDFや，OCR機能付きのスキャナーで作成したPDFはテキストレイヤーを持つため，
+    画像に変換せずに末尾と先頭のページの文字列からISBNコードを取得する．
+
+    Args:
+        input_path (str): ファイルパス
+        total_pages (int): 総ページ数
+        page_count (int): 末尾と先頭からそれぞれ対象とするページ数
+        sightings (list[:obj:`Sighting`]): 読み取ったISBNコードを全て追加するリスト
+
+    Returns:
+        str: ISBNコードを返す．
+            テキストレイヤーがないとき，または取得できないときはNoneを返す．
+    """
+    page_ranges = [
+        (max(1, total_pages - page_count + 1), total_pages),
+        (1, min(page_count, total_pages - page_count)),
+    ]
+    for first_page, last_page in page_ranges:
+        if first_page > last_page:
+            continue
+        try:
+            with span('text_layer'):
+                cmd_result = subprocess.run(
+                    ['pdftotext', '-f', str(first_page), '-l', str(last_page), '-layout', input_path, '-'],
+                    capture_output=True,
+                    text=True,
+                    errors='ignore'
+                )
+        except FileNotFoundError:
+            # pdftotextがないときは，テキストレイヤーを利用してISBNコード取得処理を行わない
+            return
+        # pdftotextはページの区切りに改ページ文字を出力する
+        found = []
+        for offset, page_text in enumerate(cmd_result.stdout.split('\f')):
+            found += [
+                Sighting(isbn, 'text_layer', first_page + offset)
+                for isbn in _find_isbns_in_text(page_text)
+            ]
+        if sightings is not None:
+            sightings.extend(found)
+        isbn = best_isbn(found, total_pages)
         if isbn:
             return isbn
 
-        raise NoSuchISBNException(
-            f'Cannot get ISBN from {basename(input_path)}.'
+
+def get_total_pages(input_path: str) -> int:
+    """PDFの総ページ数を取得
+
+    PDFを直接解析して取得する．解析できないときはpdfinfoを使う．
+
+    Args:
+        input_path (str): ファイルパス
+
+    Returns:
+        int: 総ページ数．取得できないときは0を返す．
+    """
+    try:
+        with span('page_count'):
+            return get_page_count(input_path)
+    except PdfReadError:
+        pass
+
+    with span('pdfinfo'):
+        cmd_result = subprocess.run(['pdfinfo', input_path], capture_output=True, text=True)
+    match = re.search(r'^Pages:\s+(\d+)', cmd_result.stdout, re.MULTILINE)
+    if match is None:
+        return 0
+    return int(match.group(1))
+
+
+def get_isbn_from_embedded_images(input_path: str, page_count=1, sightings=None) -> str:
+    """埋め込まれたJPEG画像のバーコードからISBNコードを取得
+
+    スキャンした本のページは一枚のJPEG画像であることが多いため，
+    ページを描画せずに，埋め込まれた画像をそのままバーコードの読み取りに使う．
+    先頭`page_count`ページと，末尾`page_count + 1`ページを対象とする．
+
+    Args:
+        input_path (str): ファイルパス
+        page_count (int): 先頭から対象とするページ数
+        sightings (list[:obj:`Sighting`]): 読み取ったISBNコードを全て追加するリスト
+
+    Raises:
+        PdfReadError: PDFを解析できなかったときに発生
+
+    Returns:
+        str: ISBNコードを返す．
+            取得できないときはNoneを返す．
+    """
+    total_pages = get_page_count(input_path)
+    page_numbers = sorted(
+        set(range(1, min(page_count, total_pages) + 1))
+        | set(range(max(1, total_pages - page_count), total_pages + 1))
+    )
+    page_images = []
+    with span('embedded_images'):
+        for page_number, jpeg in get_page_jpeg_images(input_path, page_numbers):
+            try:
+                page_images.append((page_number, Image.open(io.BytesIO(jpeg))))
+            except (OSError, ValueError):
+                # 読み込めない画像は読み飛ばす
+                continue
+    for page_number, page_image in page_images:
+        isbn = get_isbn_from_barcode(
+            [page_image],
+            sightings=sightings,
+            page_number=page_number,
+            total_pages=total_pages
         )
+        if isbn:
+            return isbn
 
 
-def get_isbn_from_barcode(page_images) -> str:
+def get_isbn_from_barcode(page_images, sightings=None, page_number=None, total_pages=None) -> str:
     """バーコードからISBNコードを取得
 
-    画像からバーコードを使って，ISBNコードを取得する
+    画像からバーコードを使って，ISBNコードを取得する．
+    一枚の画像にある全てのバーコードを読み取り，チェックディジットが正しいものだけを候補とする．
+    和書の二段目のバーコード（分類と価格）は除く．
 
     Args:
         page_images (PIL.Image): ページの画像
+        sightings (list[:obj:`Sighting`]): 読み取ったISBNコードを全て追加するリスト
+        page_number (int): ページ番号（1始まり）
+        total_pages (int): 総ページ数
 
     Returns:
         str: ISBNコードを返す．
@@ -87,45 +342,174 @@ def get_isbn_from_barcode(page_images) -> str:
     """
     for page_image in page_images:
         # バーコードからコードを抽出する
-        for decoded_image in decode(page_image):
-            # コードの中からISBNコードにあたるものを取得する
-            if re.match('978', decoded_image[0].decode('utf-8', 'ignore')):
-                return decoded_image[0].decode('utf-8', 'ignore').replace('-', '')
+        with span('barcode_decode'):
+            decoded_images = decode(page_image)
+        # コードの中からISBNコードにあたるものを取得する
+        found = []
+        for decoded_image in decoded_images:
+            isbn = normalize_isbn(decoded_image[0].decode('utf-8', 'ignore'))
+            if isbn:
+                found.append(Sighting(isbn, 'barcode', page_number))
+        if sightings is not None:
+            sightings.extend(found)
+        isbn = best_isbn(found, total_pages)
+        if isbn:
+            return isbn
+
+
+@lru_cache(maxsize=None)
+def _get_ocr_tool():
+    """OCRツールを取得
+
+    利用可能なOCRツールの検索は遅いため，プロセスごとに一度だけ行う．
+
+    Returns:
+        OCRツール．利用できるものがないときはNoneを返す．
+    """
+    ocr_tools = pyocr.get_available_tools()
+    if len(ocr_tools) == 0:
+        return None
+    return ocr_tools[0]
+
+
+def _find_isbns_in_text(text: str) -> list:
+    """文字列からISBNコードを探す
+
+    Args:
+        text (str): 文字列
 
+    Returns:
+        list[str]: チェックディジットが正しいISBNコードのリスト．見つかった順に並べる．
+    """
+    # OCRの結果には余計な空白が入りやすいため，取り除いてから探す
+    return find_isbns_in_text(re.sub(r'[ \t]', '', text))
+
+
+def _get_isbn_from_page_text(ocr_tool, page_number, page_image, collector=None, found=None) -> list:
+    """一ページの画像から文字列を取得し，ISBNコードを取得
 
-def get_isbn_from_text(page_images) -> str:
+    まず，ISBNコードが載っていることが多い領域だけを，
+    ISBNコードに使われる文字に限定して高速にテキスト化する．
+    見つからないときは，ページ全体を日本語でテキスト化する．
+    他のページでISBNコードが見つかった後は，時間のかかるページ全体のテキスト化を始めない．
+
+    Args:
+        ocr_tool: OCRツール
+        page_number (int): ページ番号（1始まり）
+        page_image (PIL.Image): ページの画像
+        collector (:obj:`SpanCollector`): 呼び出し元のスレッドでスパンを集めるクラス
+        found (:obj:`threading.Event`): 他のページでISBNコードが見つかったときにセットされるイベント
+
+    Returns:
+        list[:obj:`Sighting`]: 読み取ったISBNコードのリスト．
+            取得できないときは空のリストを返す．
+    """
+    with collect_spans(collector), span('ocr'):
+        whitelist_builder = pyocr.builders.TextBuilder(tesseract_layout=6)
+        whitelist_builder.tesseract_configs += ['-c', f'tessedit_char_whitelist={ISBN_CHAR_WHITELIST}']
+        for region_image in crop_regions(page_image, ISBN_TEXT_REGIONS):
+            text = ocr_tool.image_to_string(
+                region_image,
+                lang='eng',
+                builder=whitelist_builder
+            )
+            isbns = _find_isbns_in_text(text)
+            if isbns:
+                return [Sighting(isbn, 'ocr', page_number) for isbn in isbns]
+
+        if found is not None and found.is_set():
+            return []
+        text = ocr_tool.image_to_string(
+            page_image,
+            lang='jpn',
+            builder=pyocr.builders.TextBuilder(tesseract_layout=3)
+        )
+        return [Sighting(isbn, 'ocr', page_number) for isbn in _find_isbns_in_text(text)]
+
+
+def configure_ocr_workers(process_workers: int) -> None:
+    """このプロセスで並列でテキスト化するページ数を設定
+
+    tesseractはページごとにCPUを使うため，全てのプロセスワーカーで合わせてCPU数を超えないように，
+    CPU数をプロセスワーカーの数で割った数とする．
+    プロセスプールの初期化で呼び出す．
+
+    Args:
+        process_workers (int): プロセスワーカーの数
+    """
+    global _ocr_workers
+    _ocr_workers = max(1, min(OCR_WORKERS, (os.cpu_count() or 1) // max(1, process_workers)))
+
+
+def get_isbn_from_text(page_images, max_workers=None, sightings=None, total_pages=None) -> str:
     """文字列からISBNコードを取得
 
-    画像からテキスト化を行い，ISBNコードを取得する
+    画像からテキスト化を行い，ISBNコードを取得する．
+    ページごとに並列でテキスト化し，ページが終わるたびにISBNコードを探す．
+    見つかった時点で，まだ始まっていないページはキャンセルし，
+    テキスト化している途中のページはページ全体のテキスト化を始めずに終える．
+    一度に保持する画像をテキスト化しているページ数までにするため，スレッドが空いたときに次のページを描画し，
+    テキスト化し終えた画像はすぐに閉じる．
+
+    Note:
+        pyocrはページごとにtesseractのプロセスを起動するため，スレッドで並列化する．
 
     Args:
-        page_images (PIL.Image): ページの画像
+        page_images (iterable[tuple]): ページ番号と，ページの画像(PIL.Image)
+        max_workers (int): 並列でテキスト化するページ数．Noneのときは`configure_ocr_workers`で設定した数
+        sightings (list[:obj:`Sighting`]): 読み取ったISBNコードを全て追加するリスト
+        total_pages (int): 総ページ数
 
     Returns:
         str: ISBNコードを返す．
             取得できないときはNoneを返す．
     """
-    ocr_tools = pyocr.get_available_tools()
-    if len(ocr_tools) == 0:
+    ocr_tool = _get_ocr_tool()
+    if ocr_tool is None:
         # OCRがなかったときは，テキスト抽出を利用してISBNコード取得処理を行わない
         return
 
+    def _found(future):
+        if sightings is not None:
+            sightings.extend(future.result())
+        return best_isbn(future.result(), total_pages)
+
+    # テキスト化するスレッドのスパンも呼び出し元のスレッドで集める
+    collector = current_collector()
     # テキスト化し，ISBNコードを取得する
-    ocr_tool = ocr_tools[0]
-    texts = []
-    for page_image in page_images:
-        text = ocr_tool.image_to_string(
-            page_image,
-            lang='jpn',
-            builder=pyocr.builders.TextBuilder(tesseract_layout=3)
-        )
-        texts.append(text)
-
-    for text in texts:
-        if re.search(r'ISBN978-[0-4]-[0-9]{4}-[0-9]{4}-[0-9]', text):
-            # TODO 取得してきたISBNコードが複数あるとき，どうする？
-            isbn_codes = re.findall(r'978-[0-4]-[0-9]{4}-[0-9]{4}-[0-9]', text)
-            return isbn_codes.pop().replace(
-                '-',
-                ''
-            )
+    max_workers = max_workers or _ocr_workers
+    executor = ThreadPoolExecutor(max_workers=max_workers)
+    # 空いているスレッドの数
+    slots = threading.Semaphore(max_workers)
+    # 見つかったときや，例外で終わるときに，テキスト化している途中のページに知らせる
+    found = threading.Event()
+
+    def _get_isbn_from_page(page_number, page_image):
+        try:
+            return _get_isbn_from_page_text(ocr_tool, page_number, page_image, collector, found)
+        finally:
+            page_image.close()
+            slots.release()
+
+    try:
+        futures = []
+        page_images = iter(page_images)
+        while True:
+            # スレッドが空くまで次のページを描画しない
+            slots.acquire()
+            # 待っている間に終わったページを確認する
+            for future in futures:
+                if future.done() and future.result():
+                    return _found(future)
+            page_image = next(page_images, None)
+            if page_image is None:
+                break
+            futures.append(executor.submit(_get_isbn_from_page, *page_image))
+            del page_image
+
+        for future in as_completed(futures):
+            if future.result():
+                return _found(future)
+    finally:
+        found.set()
+        executor.shutdown(wait=False, cancel_futures=True)
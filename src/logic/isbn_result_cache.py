@@ -0,0 +1,101 @@
+"""ISBNコードの取得結果のキャッシュ
+
+PDFのフィンガープリントをキーとして，取得したISBNコードと取得した手法をSQLiteに保存する．
+
+"""
+
+
+import time
+from collections import namedtuple
+from logic.sqlite_util import ThreadLocalConnection
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS isbn_result (
+    fingerprint TEXT PRIMARY KEY,
+    isbn TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    accessed_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS isbn_result_accessed_at ON isbn_result (accessed_at);
+'''
+
+# 件数の上限を確認する間隔（書き込み回数）
+_EVICT_INTERVAL = 64
+
+"""キャッシュしたISBNコードの取得結果
+
+Attributes:
+    isbn (str): ISBNコード
+    strategy (str): ISBNコードを取得した手法
+"""
+CachedIsbn = namedtuple('CachedIsbn', [
+    'isbn',
+    'strategy'
+])
+
+
+class IsbnResultCache:
+    """ISBNコードの取得結果のキャッシュクラス
+
+    Attributes:
+        db_path (str): キャッシュのファイルパス
+        max_entries (int): 最大件数．超えたときは最も参照されていないものから削除する
+    """
+
+    def __init__(self, db_path, max_entries):
+        self.db_path = db_path
+        self.max_entries = max_entries
+        self._connection = ThreadLocalConnection(db_path, _SCHEMA)
+        self._writes = 0
+
+    def get(self, fingerprint: str) -> CachedIsbn:
+        """キャッシュからISBNコードの取得結果を取得
+
+        Args:
+            fingerprint (str): PDFのフィンガープリント
+
+        Returns:
+            :obj:`CachedIsbn`: ISBNコードの取得結果．キャッシュにないときはNoneを返す．
+        """
+        connection = self._connection.get()
+        row = connection.execute(
+            'SELECT isbn, strategy FROM isbn_result WHERE fingerprint = ?',
+            (fingerprint,)
+        ).fetchone()
+        if row is None:
+            return None
+
+        connection.execute(
+            'UPDATE isbn_result SET accessed_at = ? WHERE fingerprint = ?',
+            (time.time(), fingerprint)
+        )
+        return CachedIsbn(*row)
+
+    def put(self, fingerprint: str, isbn: str, strategy: str) -> None:
+        """ISBNコードの取得結果をキャッシュに保存
+
+        Args:
+            fingerprint (str): PDFのフィンガープリント
+            isbn (str): ISBNコード
+            strategy (str): ISBNコードを取得した手法
+        """
+        connection = self._connection.get()
+        connection.execute(
+            'INSERT OR REPLACE INTO isbn_result (fingerprint, isbn, strategy, accessed_at) '
+            'VALUES (?, ?, ?, ?)',
+            (fingerprint, isbn, strategy, time.time())
+        )
+
+        self._writes += 1
+        if self._writes % _EVICT_INTERVAL == 0:
+            self.evict()
+
+    def evict(self) -> None:
+        """上限を超えた分を，最も参照されていないものから削除"""
+        connection = self._connection.get()
+        connection.execute(
+            'DELETE FROM isbn_result WHERE fingerprint IN ('
+            'SELECT fingerprint FROM isbn_result ORDER BY accessed_at DESC LIMIT -1 OFFSET ?)',
+            (self.max_entries,)
+        )
@@ -7,8 +7,12 @@ ISBNコードを用いて本の情報を取得する．
 
 import re
 import json
+import time
 import requests
 from box import Box
+from email.utils import parsedate_to_datetime
+from logic.http_client import get_http_client
+from logic.rate_limiter import get_rate_limiter, RateLimitedException
 
 
 GOOGLE_API_URL = 'https://www.googleapis.com/books/v1/volumes?q=isbn:{}'
@@ -16,6 +20,12 @@ OPENBD_API_URL = 'https://api.openbd.jp/v1/get?isbn={}'
 
 HEADERS = {"content-type": "application/json"}
 
+# Google Books APIの流量制限の名前
+GOOGLE_RATE_LIMITER = 'google_books'
+# Google Books APIが流量制限のときに返すエラーの理由
+GOOGLE_RATE_LIMIT_REASONS = frozenset(['rateLimitExceeded', 'userRateLimitExceeded'])
+GOOGLE_DAILY_LIMIT_REASONS = frozenset(['dailyLimitExceeded', 'quotaExceeded'])
+
 
 class NoSuchBookInfoException(Exception):
     """本の情報がないときの例外クラス
@@ -79,21 +89,90 @@ def _format_author(author: str) -> str:
     return re.sub('／.+', '', author)
 
 
+def _retry_after(res) -> float:
+    """Retry-Afterヘッダーの秒数を取得
+
+    Args:
+        res (:obj:`requests.Response`): レスポンス
+
+    Returns:
+        float: 秒数．ヘッダーがないときや解釈できないときはNoneを返す．
+    """
+    value = res.headers.get('Retry-After')
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def _google_error_reason(res) -> str:
+    """Google Books APIのエラーの理由を取得
+
+    Args:
+        res (:obj:`requests.Response`): レスポンス
+
+    Returns:
+        str: エラーの理由．取得できないときは空文字列を返す．
+    """
+    try:
+        errors = res.json().get('error', {}).get('errors', [])
+    except (ValueError, AttributeError):
+        return ''
+    return errors[0].get('reason', '') if errors and isinstance(errors[0], dict) else ''
+
+
 def book_info_from_google(isbn: str) -> BookInfo:
     """Google Books API を使って本の情報を取得
 
     ISBNコードを使って，Google Books APIから本の情報を取得する．
+    流量制限が設定されているときは，リクエストしてよくなるまで待つ．
 
     Args:
         isbn (bool): ISBNコード
 
     Raises:
         NoSuchBookInfoException: 本の情報がなかったときに発生
+        RateLimitedException: 流量制限にかかったときに発生
 
     Returns:
         :obj:`BookInfo`: 本の情報
     """
-    res = requests.get(GOOGLE_API_URL.format(isbn), headers=HEADERS)
+    limiter = get_rate_limiter(GOOGLE_RATE_LIMITER)
+    if limiter is not None:
+        limiter.acquire()
+    try:
+        res = get_http_client().get(GOOGLE_API_URL.format(isbn), headers=HEADERS)
+    except requests.RequestException as e:
+        raise NoSuchBookInfoException(
+            f'Cannot find book info from Google.\n'
+            f'ISBN: {isbn}. Error: {e!r}.'
+        )
+
+    # 流量制限にかかったときは，本の情報がないとはせずに時間をおいて問い合わせる
+    reason = _google_error_reason(res) if res.status_code in (403, 429) else ''
+    if res.status_code == 429 or reason in GOOGLE_RATE_LIMIT_REASONS:
+        retry_after = _retry_after(res)
+        if limiter is not None:
+            retry_after = limiter.penalize(retry_after)
+        raise RateLimitedException(
+            f'Google rate limited the request for ISBN: {isbn}.',
+            retry_after=retry_after if retry_after is not None else 1.0
+        )
+    if reason in GOOGLE_DAILY_LIMIT_REASONS:
+        retry_after = limiter.exhaust() if limiter is not None else _retry_after(res)
+        raise RateLimitedException(
+            f'Google daily quota is used up. ISBN: {isbn}.',
+            retry_after=retry_after if retry_after is not None else 60 * 60
+        )
+    if limiter is not None:
+        limiter.reward()
+
     if res.status_code == 200:
         google_res = Box(
             res.json(),
@@ -127,21 +206,53 @@ def book_info_from_openbd(isbn: str) -> BookInfo:
     Returns:
         :obj:`BookInfo`: 本の情報
     """
-    res = requests.get(OPENBD_API_URL.format(isbn), headers=HEADERS)
-    if res.status_code == 200:
+    return book_infos_from_openbd([isbn])[0]
+
+
+def book_infos_from_openbd(isbns: list) -> list:
+    """OPENBD を使って複数の本の情報を一度に取得
+
+    OPENBDはカンマ区切りで複数のISBNコードを受け付けるため，一回のリクエストで取得する．
+
+    Args:
+        isbns (list[str]): ISBNコードのリスト
+
+    Raises:
+        NoSuchBookInfoException: リクエストが失敗したときに発生
+
+    Returns:
+        list[:obj:`BookInfo`]: ISBNコードと同じ順番の本の情報．
+            該当する本がないものはNoneになる．
+    """
+    joined_isbns = ','.join(isbns)
+    try:
+        res = get_http_client().get(OPENBD_API_URL.format(joined_isbns), headers=HEADERS)
+    except requests.RequestException as e:
+        raise NoSuchBookInfoException(
+            f'Cannot find book info from OPENBD.\n'
+            f'ISBN: {joined_isbns}. Error: {e!r}.'
+        )
+    if res.status_code != 200:
+        raise NoSuchBookInfoException(
+            f'Cannot find book info from OPENBD.\n'
+            f'ISBN: {joined_isbns}. Status Code: {res.status_code}.'
+        )
+
+    book_infos = []
+    for item in res.json():
+        # 該当する本がないときはnullが返される
+        if item is None:
+            book_infos.append(None)
+            continue
+
         openbd_res = Box(
-            res.json()[0],
+            item,
             camel_killer_box=True,
             default_box=True,
             default_box_attr=''
         )
-        if openbd_res is not None:
-            open_bd_summary = openbd_res.summary
-            title = _format_title(open_bd_summary.title)
-            author = _format_author(open_bd_summary.author)
-            return BookInfo(title=title, author=author)
-    else:
-        raise NoSuchBookInfoException(
-            f'Cannot find book info from OPENBD.\n'
-            f'ISBN: {isbn}. Status Code: {res.status_code}.'
-        )
+        open_bd_summary = openbd_res.summary
+        title = _format_title(open_bd_summary.title)
+        author = _format_author(open_bd_summary.author)
+        book_infos.append(BookInfo(title=title, author=author))
+    return book_infos
@@ -0,0 +1,219 @@
+"""処理の記録
+
+ファイルごとの処理の進み具合をSQLiteに記録し，
+処理が中断されたときに途中から再開できるようにする．
+
+"""
+
+
+import os
+import time
+from collections import namedtuple
+from logic.sqlite_util import ThreadLocalConnection
+
+
+_SCHEMA = '''
+PRAGMA synchronous=FULL;
+CREATE TABLE IF NOT EXISTS job (
+    path TEXT PRIMARY KEY,
+    state TEXT NOT NULL,
+    fingerprint TEXT,
+    isbn TEXT,
+    candidates TEXT,
+    strategy TEXT,
+    title TEXT,
+    author TEXT,
+    source TEXT,
+    renamed_path TEXT,
+    updated_at REAL NOT NULL
+);
+CREATE INDEX IF NOT EXISTS job_state ON job (state);
+'''
+
+
+class JobState:
+    """処理の状態
+
+    Attributes:
+        DETECTED: ファイルを検知した
+        ISBN_EXTRACTED: ISBNコードを取得した
+        METADATA_RESOLVED: 本の情報を取得した
+        RENAMED: ファイル名を変更した
+        MOVED: 出力ディレクトリに移動した
+        NO_ISBN: ISBNコードが見つからず，tmpディレクトリに移動した
+        NO_BOOK_INFO: 本の情報が見つからなかった
+        GONE: 再開しようとしたときにファイルがなくなっていた
+    """
+    DETECTED = 'detected'
+    ISBN_EXTRACTED = 'isbn_extracted'
+    METADATA_RESOLVED = 'metadata_resolved'
+    RENAMED = 'renamed'
+    MOVED = 'moved'
+    NO_ISBN = 'no_isbn'
+    NO_BOOK_INFO = 'no_book_info'
+    GONE = 'gone'
+
+    # これ以上処理することがない状態
+    FINISHED = frozenset([MOVED, NO_ISBN, NO_BOOK_INFO, GONE])
+
+
+"""処理の記録
+
+Attributes:
+    path (str): 処理対象ファイルパス
+    state (str): 処理の状態
+    fingerprint (str): PDFのフィンガープリント
+    isbn (str): ISBNコード
+    candidates (str): 順位の高い順にカンマで区切ったISBNコードの候補
+    strategy (str): ISBNコードを取得した手法
+    title (str): タイトル
+    author (str): 著者
+    source (str): 本の情報を取得したAPI
+    renamed_path (str): 変更後のファイルパス
+    updated_at (float): 更新日時
+"""
+Job = namedtuple('Job', [
+    'path',
+    'state',
+    'fingerprint',
+    'isbn',
+    'candidates',
+    'strategy',
+    'title',
+    'author',
+    'source',
+    'renamed_path',
+    'updated_at'
+])
+
+_COLUMNS = ', '.join(Job._fields)
+
+
+class JobJournal:
+    """処理の記録クラス
+
+    WALモードのSQLiteを使い，状態が変わるたびに記録する．
+
+    Attributes:
+        db_path (str): 記録のファイルパス
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._connection = ThreadLocalConnection(db_path, _SCHEMA)
+
+    def get(self, path: str) -> Job:
+        """処理の記録を取得
+
+        Args:
+            path (str): 処理対象ファイルパス
+
+        Returns:
+            :obj:`Job`: 処理の記録．ないときはNoneを返す．
+        """
+        row = self._connection.get().execute(
+            f'SELECT {_COLUMNS} FROM job WHERE path = ?',
+            (path,)
+        ).fetchone()
+        return Job(*row) if row else None
+
+    def start(self, path: str) -> Job:
+        """処理を開始したことを記録
+
+        以前の記録があるときは上書きする．
+
+        Args:
+            path (str): 処理対象ファイルパス
+
+        Returns:
+            :obj:`Job`: 処理の記録
+        """
+        self._connection.get().execute(
+            'INSERT OR REPLACE INTO job (path, state, updated_at) VALUES (?, ?, ?)',
+            (path, JobState.DETECTED, time.time())
+        )
+        return self.get(path)
+
+    def advance(self, path: str, state: str, **fields) -> Job:
+        """処理の状態を進める
+
+        Args:
+            path (str): 処理対象ファイルパス
+            state (str): 処理の状態
+            **fields: 合わせて記録する`Job`の項目
+
+        Returns:
+            :obj:`Job`: 処理の記録
+        """
+        unknown_fields = set(fields) - set(Job._fields)
+        if unknown_fields:
+            raise ValueError(f'Unknown job fields: {", ".join(sorted(unknown_fields))}.')
+
+        assignments = ', '.join(f'{field} = ?' for field in ['state', 'updated_at', *fields])
+        self._connection.get().execute(
+            f'UPDATE job SET {assignments} WHERE path = ?',
+            (state, time.time(), *fields.values(), path)
+        )
+        return self.get(path)
+
+    def pending(self, input_dir=None, recursive=False) -> list:
+        """終わっていない処理の記録を取得
+
+        Args:
+            input_dir (str): 指定したときは，このディレクトリにあるファイルの記録だけを返す
+            recursive (bool): `input_dir`のサブディレクトリにあるファイルの記録も返すか
+
+        Returns:
+            list[:obj:`Job`]: 処理の記録のリスト．更新日時が古い順に並べる．
+        """
+        finished = tuple(JobState.FINISHED)
+        rows = self._connection.get().execute(
+            f'SELECT {_COLUMNS} FROM job WHERE state NOT IN ({", ".join("?" * len(finished))}) '
+            'ORDER BY updated_at',
+            finished
+        ).fetchall()
+        jobs = [Job(*row) for row in rows]
+        if input_dir is not None:
+            in_dir = _under_dir if recursive else _same_dir
+            jobs = [job for job in jobs if in_dir(job.path, input_dir)]
+        return jobs
+
+    def purge(self, older_than: float) -> None:
+        """終わった処理の古い記録を削除
+
+        Args:
+            older_than (float): 何秒より前に更新された記録を削除するか
+        """
+        finished = tuple(JobState.FINISHED)
+        self._connection.get().execute(
+            f'DELETE FROM job WHERE state IN ({", ".join("?" * len(finished))}) AND updated_at < ?',
+            (*finished, time.time() - older_than)
+        )
+
+
+def _same_dir(path: str, input_dir: str) -> bool:
+    """ファイルがディレクトリの直下にあるか
+
+    Args:
+        path (str): ファイルパス
+        input_dir (str): ディレクトリ
+
+    Returns:
+        bool: ディレクトリの直下にあるときはTrue
+    """
+    return os.path.normcase(os.path.dirname(os.path.abspath(path))) == \
+        os.path.normcase(os.path.abspath(input_dir))
+
+
+def _under_dir(path: str, input_dir: str) -> bool:
+    """ファイルがディレクトリの下にあるか
+
+    Args:
+        path (str): ファイルパス
+        input_dir (str): ディレクトリ
+
+    Returns:
+        bool: ディレクトリまたはそのサブディレクトリにあるときはTrue
+    """
+    input_dir = os.path.normcase(os.path.abspath(input_dir))
+    return os.path.normcase(os.path.abspath(path)).startswith(os.path.join(input_dir, ''))
@@ -0,0 +1,266 @@
+"""本の情報の索引
+
+書誌データの一括ダンプからISBNコードと本の情報の索引を作成し，ネットワークを使わずに本の情報を引く．
+ISBNコードは13桁の整数としてSQLiteの主キーに持ち，一度の探索で引けるようにする．
+取り込んだダンプはファイルサイズと更新日時を記録し，変更があったものだけを取り込み直す．
+
+"""
+
+
+import os
+import csv
+import json
+import time
+from itertools import chain
+from logic.isbn_to_info import BookInfo, _format_title, _format_author
+from logic.sqlite_util import ThreadLocalConnection
+from logic.isbn_candidates import normalize_isbn
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS book (
+    isbn INTEGER PRIMARY KEY,
+    title TEXT NOT NULL,
+    author TEXT NOT NULL
+);
+CREATE TABLE IF NOT EXISTS dump (
+    path TEXT PRIMARY KEY,
+    size INTEGER NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    records INTEGER NOT NULL,
+    imported_at REAL NOT NULL
+);
+'''
+
+# 一度のトランザクションで書き込む件数
+_BATCH_SIZE = 10000
+
+# 取り込めるダンプの拡張子
+DUMP_TYPES = ('json', 'jsonl', 'ndjson', 'csv', 'tsv')
+
+
+def isbn13_key(isbn: str) -> int:
+    """ISBNコードを索引のキーにする
+
+    Args:
+        isbn (str): ISBNコード
+
+    Returns:
+        int: 13桁のISBNコードの整数．ISBNコードとして正しくないときはNoneを返す．
+    """
+    isbn = normalize_isbn(isbn)
+    return int(isbn) if isbn else None
+
+
+def _records_from_openbd(item):
+    """OPENBD形式の一件から，ISBNコードとタイトルと著者を取り出す
+
+    Args:
+        item (dict): OPENBD形式の一件．`summary`を持たないときはそのままの項目を使う
+
+    Returns:
+        tuple: ISBNコード，タイトル，著者．取り出せないときはNoneを返す．
+    """
+    if not isinstance(item, dict):
+        return None
+    summary = item.get('summary', item)
+    if not isinstance(summary, dict):
+        return None
+    isbn, title, author = summary.get('isbn'), summary.get('title'), summary.get('author')
+    if not isbn or not title:
+        return None
+    return isbn, _format_title(title), _format_author(author or '')
+
+
+def _read_json(path):
+    """OPENBD形式のJSONを読み込む
+
+    Args:
+        path (str): ダンプのファイルパス
+
+    Yields:
+        tuple: ISBNコード，タイトル，著者
+    """
+    with open(path, encoding='utf-8') as f:
+        items = json.load(f)
+    if isinstance(items, dict):
+        items = [items]
+    for item in items:
+        record = _records_from_openbd(item)
+        if record is not None:
+            yield record
+
+
+def _read_jsonl(path):
+    """一行に一件のOPENBD形式のJSON Linesを読み込む
+
+    Args:
+        path (str): ダンプのファイルパス
+
+    Yields:
+        tuple: ISBNコード，タイトル，著者
+    """
+    with open(path, encoding='utf-8') as f:
+        for line in f:
+            line = line.strip()
+            if not line:
+                continue
+            try:
+                record = _records_from_openbd(json.loads(line))
+            except json.JSONDecodeError:
+                continue
+            if record is not None:
+                yield record
+
+
+def _read_csv(path, delimiter=','):
+    """ISBNコード，タイトル，著者の列を持つCSVを読み込む
+
+    一行目に`isbn`の列があるときは見出しとして列名で読み，ないときは先頭の三列を使う．
+
+    Args:
+        path (str): ダンプのファイルパス
+        delimiter (str): 区切り文字
+
+    Yields:
+        tuple: ISBNコード，タイトル，著者
+    """
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f, delimiter=delimiter)
+        header = next(reader, None)
+        if header is None:
+            return
+        columns = [column.strip().lower() for column in header]
+        if 'isbn' in columns:
+            indexes = [columns.index(name) if name in columns else None for name in ('isbn', 'title', 'author')]
+            rows = reader
+        else:
+            indexes = [0, 1, 2]
+            rows = chain([header], reader)
+        for row in rows:
+            isbn, title, author = (
+                row[index] if index is not None and index < len(row) else '' for index in indexes
+            )
+            if isbn and title:
+                yield isbn, _format_title(title), author.strip()
+
+
+def read_dump(path: str):
+    """ダンプを拡張子に合わせて読み込む
+
+    Args:
+        path (str): ダンプのファイルパス
+
+    Raises:
+        ValueError: 取り込めない拡張子のときに発生
+
+    Yields:
+        tuple: ISBNコード，タイトル，著者
+    """
+    extension = os.path.splitext(path)[1].lower().lstrip('.')
+    if extension == 'json':
+        return _read_json(path)
+    if extension in ('jsonl', 'ndjson'):
+        return _read_jsonl(path)
+    if extension == 'csv':
+        return _read_csv(path)
+    if extension == 'tsv':
+        return _read_csv(path, delimiter='\t')
+    raise ValueError(f'Unsupported dump type: {path}. Use one of {", ".join(DUMP_TYPES)}.')
+
+
+class LocalBookIndex:
+    """本の情報の索引クラス
+
+    複数の監視プロセスから同じファイルを共有できる．
+
+    Attributes:
+        db_path (str): 索引のファイルパス
+    """
+
+    def __init__(self, db_path):
+        self.db_path = db_path
+        self._connection = ThreadLocalConnection(db_path, _SCHEMA)
+
+    def get(self, isbn: str) -> BookInfo:
+        """索引から本の情報を取得
+
+        Args:
+            isbn (str): ISBNコード
+
+        Returns:
+            :obj:`BookInfo`: 本の情報．索引にないときはNoneを返す．
+        """
+        key = isbn13_key(isbn)
+        if key is None:
+            return None
+        row = self._connection.get().execute(
+            'SELECT title, author FROM book WHERE isbn = ?',
+            (key,)
+        ).fetchone()
+        if row is None:
+            return None
+        return BookInfo(title=row[0], author=row[1])
+
+    def __len__(self):
+        return self._connection.get().execute('SELECT COUNT(*) FROM book').fetchone()[0]
+
+    def import_dump(self, path: str, force=False) -> int:
+        """ダンプを取り込む
+
+        前回取り込んだときからファイルサイズと更新日時が変わっていないダンプは読み飛ばす．
+        同じISBNコードは後から取り込んだものに置き換える．
+
+        Args:
+            path (str): ダンプのファイルパス
+            force (bool): 変更がないダンプも取り込むか
+
+        Raises:
+            ValueError: 取り込めない拡張子のときに発生
+
+        Returns:
+            int: 取り込んだ件数．読み飛ばしたときはNoneを返す．
+        """
+        path = os.path.abspath(path)
+        stat = os.stat(path)
+        connection = self._connection.get()
+        if not force:
+            row = connection.execute(
+                'SELECT size, mtime_ns FROM dump WHERE path = ?',
+                (path,)
+            ).fetchone()
+            if row == (stat.st_size, stat.st_mtime_ns):
+                return None
+
+        records = 0
+        batch = []
+        for isbn, title, author in read_dump(path):
+            key = isbn13_key(isbn)
+            if key is None:
+                continue
+            batch.append((key, title, author))
+            if len(batch) >= _BATCH_SIZE:
+                records += self._write(batch)
+                batch = []
+        if batch:
+            records += self._write(batch)
+
+        connection.execute(
+            'INSERT OR REPLACE INTO dump (path, size, mtime_ns, records, imported_at) VALUES (?, ?, ?, ?, ?)',
+            (path, stat.st_size, stat.st_mtime_ns, records, time.time())
+        )
+        return records
+
+    def _write(self, batch):
+        connection = self._connection.get()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            connection.executemany(
+                'INSERT OR REPLACE INTO book (isbn, title, author) VALUES (?, ?, ?)',
+                batch
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+        return len(batch)
@@ -0,0 +1,370 @@
+"""処理の計測
+
+PDFを処理する各段階の実行時間をスパンとして記録し，カウンターとヒストグラムに集計する．
+集計結果はPrometheusのテキスト形式でローカルのHTTPエンドポイントから公開し，
+定期的にJSONファイルにも保存する．
+
+"""
+
+
+import os
+import json
+import time
+import threading
+from collections import namedtuple, deque
+from contextlib import contextmanager
+from http.server import ThreadingHTTPServer, BaseHTTPRequestHandler
+
+
+# 実行時間のヒストグラムの区切り（秒）
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+
+"""段階の実行記録
+
+Attributes:
+    stage (str): 段階の名前
+    seconds (float): 実行時間
+    ok (bool): 例外が発生せずに終わったか
+"""
+Span = namedtuple('Span', [
+    'stage',
+    'seconds',
+    'ok'
+])
+
+
+class SpanCollector:
+    """一つのファイルのスパンを集めるクラス
+
+    Attributes:
+        spans (list[:obj:`Span`]): スパンのリスト
+        file_size (int): ファイルサイズ
+        page_count (int): 総ページ数
+    """
+
+    def __init__(self):
+        self.spans = []
+        self.file_size = None
+        self.page_count = None
+
+
+_local = threading.local()
+
+
+def current_collector() -> SpanCollector:
+    """現在のスレッドでスパンを集めているクラスを取得
+
+    Returns:
+        :obj:`SpanCollector`: スパンを集めるクラス．集めていないときはNone
+    """
+    return getattr(_local, 'collector', None)
+
+
+@contextmanager
+def collect_spans(collector=None):
+    """`with`文の中で記録したスパンを集める
+
+    別のスレッドで集めているスパンに追加するときは，そのクラスを渡す．
+
+    Args:
+        collector (:obj:`SpanCollector`): スパンを集めるクラス．Noneのときは新たに作成する
+
+    Yields:
+        :obj:`SpanCollector`: スパンを集めるクラス
+    """
+    if collector is None:
+        collector = SpanCollector()
+    previous = current_collector()
+    _local.collector = collector
+    try:
+        yield collector
+    finally:
+        _local.collector = previous
+
+
+def add_spans(spans) -> None:
+    """別のスレッドやプロセスで記録したスパンを，現在のスレッドで集めているスパンに追加
+
+    Args:
+        spans (list[:obj:`Span`]): スパンのリスト
+    """
+    collector = current_collector()
+    if collector is not None:
+        collector.spans.extend(spans)
+
+
+class span:
+    """段階の実行時間をスパンとして記録するクラス
+
+    `with`文で使い，抜けたときに現在のスレッドで集めているスパンに追加する．
+    集めていないときは何もしない．
+
+    Attributes:
+        stage (str): 段階の名前
+    """
+
+    def __init__(self, stage):
+        self.stage = stage
+        self._start = None
+
+    def __enter__(self):
+        self._start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, *args):
+        collector = current_collector()
+        if collector is not None:
+            collector.spans.append(
+                Span(self.stage, time.perf_counter() - self._start, exc_type is None)
+            )
+
+
+def _format_labels(labels: dict) -> str:
+    """ラベルをPrometheusのテキスト形式にする
+
+    Args:
+        labels (dict): ラベル
+
+    Returns:
+        str: `{key="value",...}`形式の文字列．ラベルがないときは空文字列
+    """
+    if not labels:
+        return ''
+    pairs = []
+    for key, value in sorted(labels.items()):
+        value = str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+        pairs.append(f'{key}="{value}"')
+    return '{' + ','.join(pairs) + '}'
+
+
+class MetricsRegistry:
+    """計測結果の集計クラス
+
+    段階ごとの実行時間のヒストグラムと，処理したページ数，バイト数，失敗数のカウンターを持つ．
+    直近のスパンはファイルサイズと総ページ数と合わせて保持する．
+
+    Attributes:
+        buckets (tuple[float]): 実行時間のヒストグラムの区切り
+        recent_spans (int): 保持する直近のスパン数
+    """
+
+    def __init__(self, buckets=DEFAULT_BUCKETS, recent_spans=200):
+        self.buckets = tuple(sorted(buckets))
+        self._lock = threading.Lock()
+        self._histograms = {}
+        self._counters = {}
+        self._recent = deque(maxlen=recent_spans)
+        self._started_at = time.time()
+
+    def inc(self, name: str, value=1, **labels) -> None:
+        """カウンターを増やす
+
+        Args:
+            name (str): カウンターの名前
+            value (float): 増やす値
+            **labels: ラベル
+        """
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + value
+
+    def observe(self, stage: str, seconds: float, ok=True, file_size=None, page_count=None) -> None:
+        """段階の実行時間を記録
+
+        Args:
+            stage (str): 段階の名前
+            seconds (float): 実行時間
+            ok (bool): 例外が発生せずに終わったか
+            file_size (int): ファイルサイズ
+            page_count (int): 総ページ数
+        """
+        with self._lock:
+            histogram = self._histograms.setdefault(
+                stage,
+                {'buckets': [0] * len(self.buckets), 'count': 0, 'sum': 0.0}
+            )
+            for i, bound in enumerate(self.buckets):
+                if seconds <= bound:
+                    histogram['buckets'][i] += 1
+            histogram['count'] += 1
+            histogram['sum'] += seconds
+            self._recent.append({
+                'stage': stage,
+                'seconds': seconds,
+                'ok': ok,
+                'file_size': file_size,
+                'page_count': page_count,
+                'at': time.time(),
+            })
+        if not ok:
+            self.inc('book_maker_stage_failures_total', stage=stage)
+        if file_size is not None:
+            self.inc('book_maker_stage_bytes_total', file_size, stage=stage)
+        if page_count is not None:
+            self.inc('book_maker_stage_pages_total', page_count, stage=stage)
+
+    def record(self, collector: SpanCollector) -> None:
+        """一つのファイルで集めたスパンを記録
+
+        Args:
+            collector (:obj:`SpanCollector`): スパンを集めるクラス
+        """
+        for stage_span in collector.spans:
+            self.observe(
+                stage_span.stage,
+                stage_span.seconds,
+                ok=stage_span.ok,
+                file_size=collector.file_size,
+                page_count=collector.page_count
+            )
+
+    def snapshot(self) -> dict:
+        """集計結果を取得
+
+        Returns:
+            dict: ヒストグラム，カウンター，直近のスパン
+        """
+        with self._lock:
+            return {
+                'started_at': self._started_at,
+                'updated_at': time.time(),
+                'buckets': list(self.buckets),
+                'stages': {
+                    stage: {
+                        'count': values['count'],
+                        'sum': values['sum'],
+                        'mean': values['sum'] / values['count'] if values['count'] else 0.0,
+                        'buckets': list(values['buckets']),
+                    }
+                    for stage, values in self._histograms.items()
+                },
+                'counters': [
+                    {'name': name, 'labels': dict(labels), 'value': value}
+                    for (name, labels), value in self._counters.items()
+                ],
+                'recent_spans': list(self._recent),
+            }
+
+    def render_prometheus(self) -> str:
+        """集計結果をPrometheusのテキスト形式で取得
+
+        Returns:
+            str: Prometheusのテキスト形式の集計結果
+        """
+        snapshot = self.snapshot()
+        lines = [
+            '# HELP book_maker_stage_seconds Time spent in each ingestion stage.',
+            '# TYPE book_maker_stage_seconds histogram',
+        ]
+        for stage, values in sorted(snapshot['stages'].items()):
+            for bound, count in zip(self.buckets, values['buckets']):
+                lines.append(f'book_maker_stage_seconds_bucket{_format_labels({"stage": stage, "le": bound})} {count}')
+            lines.append(f'book_maker_stage_seconds_bucket{_format_labels({"stage": stage, "le": "+Inf"})} {values["count"]}')
+            lines.append(f'book_maker_stage_seconds_sum{_format_labels({"stage": stage})} {values["sum"]}')
+            lines.append(f'book_maker_stage_seconds_count{_format_labels({"stage": stage})} {values["count"]}')
+
+        counters = {}
+        for counter in snapshot['counters']:
+            counters.setdefault(counter['name'], []).append(counter)
+        for name, values in sorted(counters.items()):
+            lines.append(f'# TYPE {name} counter')
+            for counter in values:
+                lines.append(f'{name}{_format_labels(counter["labels"])} {counter["value"]}')
+        return '\n'.join(lines) + '\n'
+
+    def save(self, path: str) -> None:
+        """集計結果をJSONファイルに保存
+
+        Args:
+            path (str): 保存先のファイルパス
+        """
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump(self.snapshot(), f, indent=4, ensure_ascii=False)
+        os.replace(tmp_path, path)
+
+
+class MetricsServer:
+    """集計結果を公開するHTTPサーバークラス
+
+    `/metrics`へのリクエストに，Prometheusのテキスト形式で集計結果を返す．
+
+    Attributes:
+        registry (:obj:`MetricsRegistry`): 計測結果の集計
+        host (str): 待ち受けるホスト
+        port (int): 待ち受けるポート
+    """
+
+    def __init__(self, registry, host='127.0.0.1', port=9464):
+        self.registry = registry
+
+        class _RequestHandler(BaseHTTPRequestHandler):
+            def do_GET(handler):
+                if handler.path.split('?')[0] != '/metrics':
+                    handler.send_error(404)
+                    return
+                body = registry.render_prometheus().encode('utf-8')
+                handler.send_response(200)
+                handler.send_header('Content-Type', 'text/plain; version=0.0.4; charset=utf-8')
+                handler.send_header('Content-Length', str(len(body)))
+                handler.end_headers()
+                handler.wfile.write(body)
+
+            def log_message(handler, *args):
+                # アクセスログは出力しない
+                pass
+
+        self._server = ThreadingHTTPServer((host, port), _RequestHandler)
+        self._server.daemon_threads = True
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = threading.Thread(
+            target=self._server.serve_forever,
+            name='book_maker_metrics_server',
+            daemon=True
+        )
+        self._thread.start()
+
+    def close(self) -> None:
+        """HTTPサーバーを終了"""
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class MetricsSnapshotWriter:
+    """集計結果を定期的に保存するクラス
+
+    Attributes:
+        registry (:obj:`MetricsRegistry`): 計測結果の集計
+        path (str): 保存先のファイルパス
+        interval (float): 保存する間隔の秒数
+    """
+
+    def __init__(self, registry, path, interval=60.0):
+        self.registry = registry
+        self.path = path
+        self.interval = interval
+        self._stop = threading.Event()
+        self._thread = threading.Thread(
+            target=self._run,
+            name='book_maker_metrics_snapshot',
+            daemon=True
+        )
+        self._thread.start()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                self.registry.save(self.path)
+            except OSError:
+                # 保存できなかったときは次の機会に保存する
+                pass
+
+    def close(self) -> None:
+        """定期的な保存を終了し，最後の集計結果を保存"""
+        self._stop.set()
+        self._thread.join()
+        try:
+            self.registry.save(self.path)
+        except OSError:
+            pass
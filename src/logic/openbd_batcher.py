@@ -0,0 +1,121 @@
+"""OPENBDのまとめて取得
+
+複数のワーカーから依頼されたISBNコードを短い時間だけ溜め，
+OPENBDへ一回のリクエストでまとめて問い合わせる．
+
+"""
+
+
+import time
+import threading
+from concurrent.futures import Future
+from logic.isbn_to_info import book_infos_from_openbd
+
+
+class OpenBDBatcher:
+    """OPENBDのまとめて取得クラス
+
+    最初の依頼から`window`秒経つか，`max_batch_size`件溜まったときにまとめて問い合わせ，
+    結果をそれぞれの依頼元に返す．
+
+    Attributes:
+        window (float): 依頼を溜める秒数
+        max_batch_size (int): 一回のリクエストで問い合わせる最大件数
+    """
+
+    def __init__(self, window=0.05, max_batch_size=100):
+        self.window = window
+        self.max_batch_size = max_batch_size
+        self._pending = []
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run,
+            name='openbd_batcher',
+            daemon=True
+        )
+        self._thread.start()
+
+    def submit(self, isbn: str) -> Future:
+        """ISBNコードの問い合わせを依頼
+
+        Args:
+            isbn (str): ISBNコード
+
+        Returns:
+            :obj:`concurrent.futures.Future`: 本の情報．該当する本がないときはNone
+        """
+        future = Future()
+        with self._condition:
+            if self._closed:
+                raise RuntimeError('OpenBDBatcher is already closed.')
+            self._pending.append((isbn, future))
+            self._condition.notify()
+        return future
+
+    def lookup(self, isbn: str):
+        """ISBNコードから本の情報を取得
+
+        まとめて問い合わせた結果が返ってくるまで待つ．
+
+        Args:
+            isbn (str): ISBNコード
+
+        Raises:
+            NoSuchBookInfoException: リクエストが失敗したときに発生
+
+        Returns:
+            :obj:`BookInfo`: 本の情報．該当する本がないときはNone
+        """
+        return self.submit(isbn).result()
+
+    def close(self) -> None:
+        """溜まっている依頼を問い合わせてから終了"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify()
+        self._thread.join()
+
+    def _next_batch(self) -> list:
+        """次に問い合わせる依頼を取得
+
+        Returns:
+            list[tuple]: ISBNコードとFutureの組のリスト．終了するときは空のリスト
+        """
+        with self._condition:
+            while not self._pending and not self._closed:
+                self._condition.wait()
+
+            # 最初の依頼から一定時間経つか，上限まで溜まるまで待つ
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch_size and not self._closed:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._condition.wait(remaining)
+
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._next_batch()
+            if not batch:
+                return
+
+            # キャンセルされた依頼は問い合わせない
+            batch = [(isbn, future) for isbn, future in batch if future.set_running_or_notify_cancel()]
+            if not batch:
+                continue
+
+            isbns = list(dict.fromkeys(isbn for isbn, _ in batch))
+            try:
+                book_infos = dict(zip(isbns, book_infos_from_openbd(isbns)))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+
+            for isbn, future in batch:
+                future.set_result(book_infos.get(isbn))
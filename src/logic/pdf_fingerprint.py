@@ -0,0 +1,53 @@
+"""PDFのフィンガープリント
+
+ファイルの中身から，同じファイルかを判別するためのフィンガープリントを計算する．
+
+"""
+
+
+import os
+import hashlib
+
+
+# 先頭，末尾，中間から読み込むバイト数
+SAMPLE_SIZE = 64 * 1024
+# 中間から読み込む箇所の数
+MIDDLE_SAMPLES = 3
+# 全体のハッシュを計算するときに一度に読み込むバイト数
+_CHUNK_SIZE = 1024 * 1024
+
+
+def fingerprint(input_path: str, full_hash=False) -> str:
+    """フィンガープリントを計算
+
+    ファイルサイズと，先頭，末尾，中間の一部のハッシュからフィンガープリントを計算する．
+    `full_hash`がTrueのときは，ファイル全体のハッシュを使う．
+
+    Args:
+        input_path (str): ファイルパス
+        full_hash (bool): ファイル全体のハッシュを使うか
+
+    Returns:
+        str: フィンガープリント
+    """
+    size = os.path.getsize(input_path)
+    with open(input_path, 'rb') as f:
+        if full_hash:
+            digest = hashlib.sha256()
+            for chunk in iter(lambda: f.read(_CHUNK_SIZE), b''):
+                digest.update(chunk)
+            return f'full:{size}:{digest.hexdigest()}'
+
+        digest = hashlib.blake2b(digest_size=20)
+        if size <= SAMPLE_SIZE * (MIDDLE_SAMPLES + 2):
+            # 小さいファイルは全体を読み込む
+            digest.update(f.read())
+        else:
+            # 先頭，中間，末尾を読み込む
+            offsets = [0]
+            offsets += [size * i // (MIDDLE_SAMPLES + 1) for i in range(1, MIDDLE_SAMPLES + 1)]
+            offsets += [size - SAMPLE_SIZE]
+            for offset in offsets:
+                f.seek(offset)
+                digest.update(f.read(SAMPLE_SIZE))
+        return f'quick:{size}:{digest.hexdigest()}'
@@ -0,0 +1,863 @@
+"""PDFの読み込み
+
+外部コマンドを使わずに，PDFのトレーラーとページツリーを解析する．
+総ページ数の取得や，ページに埋め込まれたJPEG画像の取り出しを行う．
+
+"""
+
+
+import re
+import mmap
+import zlib
+from collections import namedtuple
+
+
+# 空白文字と区切り文字
+_WHITESPACE = b'\x00\t\n\x0c\r '
+_REGULAR_TOKEN = re.compile(rb'[^\x00\t\n\x0c\r ()<>\[\]{}/%]+')
+_INTEGER = re.compile(rb'[+-]?\d+$')
+_REAL = re.compile(rb'[+-]?(\d+\.\d*|\.\d+|\d+)$')
+_NAME_ESCAPE = re.compile(rb'#([0-9a-fA-F]{2})')
+_OBJ_HEADER = re.compile(rb'(\d+)\s+(\d+)\s+obj\b')
+_STARTXREF = re.compile(rb'startxref\s+(\d+)')
+
+# 末尾からstartxrefを探すバイト数
+_TAIL_SIZE = 4096
+# ページツリーの最大の深さ
+_MAX_DEPTH = 64
+
+# 文字列のエスケープ
+_STRING_ESCAPES = {
+    ord('n'): b'\n',
+    ord('r'): b'\r',
+    ord('t'): b'\t',
+    ord('b'): b'\b',
+    ord('f'): b'\f',
+    ord('('): b'(',
+    ord(')'): b')',
+    ord('\\'): b'\\',
+}
+
+
+class PdfReadError(Exception):
+    """PDFを解析できなかったときの例外クラス
+
+    PDFが壊れているときや，暗号化されているときに投げられる例外クラス．
+
+    """
+    pass
+
+
+# 壊れたPDFを解析したときに発生しうる例外
+_BROKEN_PDF_ERRORS = (PdfReadError, KeyError, IndexError, TypeError, ValueError, RecursionError)
+
+
+class Name(str):
+    """PDFの名前オブジェクト
+
+    先頭の`/`を除いた文字列として扱う．
+
+    """
+    pass
+
+
+"""間接参照
+
+Attributes:
+    num (int): オブジェクト番号
+    gen (int): 世代番号
+"""
+Ref = namedtuple('Ref', [
+    'num',
+    'gen'
+])
+
+
+class Stream:
+    """PDFのストリームオブジェクト
+
+    Attributes:
+        dict (dict): ストリームの辞書
+        raw (bytes): フィルターを適用する前のデータ
+    """
+
+    def __init__(self, dict_, raw):
+        self.dict = dict_
+        self.raw = raw
+
+    def filters(self) -> list:
+        """フィルター名のリストを取得
+
+        Returns:
+            list[str]: フィルター名のリスト
+        """
+        filters = self.dict.get('Filter')
+        if filters is None:
+            return []
+        if isinstance(filters, list):
+            return [str(f) for f in filters]
+        return [str(filters)]
+
+
+class _Parser:
+    """PDFオブジェクトの構文解析クラス
+
+    Attributes:
+        data (bytes or mmap.mmap): PDFのデータ
+        pos (int): 現在の読み込み位置
+    """
+
+    def __init__(self, data, pos=0, resolve=None):
+        self.data = data
+        self.pos = pos
+        self._resolve = resolve
+
+    def skip_whitespace(self):
+        data = self.data
+        length = len(data)
+        while self.pos < length:
+            c = data[self.pos]
+            if c in _WHITESPACE:
+                self.pos += 1
+            elif c == 0x25:  # %
+                # コメントは行末まで読み飛ばす
+                while self.pos < length and data[self.pos] not in b'\r\n':
+                    self.pos += 1
+            else:
+                break
+
+    def token(self) -> bytes:
+        """区切り文字までの字句を読み込む
+
+        Returns:
+            bytes: 字句．ないときは空のバイト列
+        """
+        self.skip_whitespace()
+        match = _REGULAR_TOKEN.match(self.data, self.pos)
+        if match is None:
+            return b''
+        self.pos = match.end()
+        return match.group()
+
+    def expect(self, keyword: bytes) -> None:
+        if self.token() != keyword:
+            raise PdfReadError(f'Expected {keyword!r} at {self.pos}.')
+
+    def parse(self):
+        """オブジェクトを一つ読み込む
+
+        Returns:
+            object: 読み込んだオブジェクト
+        """
+        self.skip_whitespace()
+        data = self.data
+        if self.pos >= len(data):
+            raise PdfReadError('Unexpected end of data.')
+
+        c = data[self.pos:self.pos + 2]
+        if c == b'<<':
+            return self._parse_dict()
+        if c[:1] == b'<':
+            return self._parse_hex_string()
+        if c[:1] == b'(':
+            return self._parse_literal_string()
+        if c[:1] == b'[':
+            return self._parse_array()
+        if c[:1] == b'/':
+            return self._parse_name()
+
+        start = self.pos
+        token = self.token()
+        if not token:
+            raise PdfReadError(f'Unexpected character {c[:1]!r} at {start}.')
+        if _INTEGER.match(token):
+            # `num gen R`のときは間接参照
+            mark = self.pos
+            gen = self.token()
+            if _INTEGER.match(gen) and self.token() == b'R':
+                return Ref(int(token), int(gen))
+            self.pos = mark
+            return int(token)
+        if _REAL.match(token):
+            return float(token)
+        if token == b'true':
+            return True
+        if token == b'false':
+            return False
+        if token == b'null':
+            return None
+        # 演算子などのキーワードはそのまま返す
+        return token
+
+    def _parse_name(self) -> Name:
+        self.pos += 1
+        match = _REGULAR_TOKEN.match(self.data, self.pos)
+        raw = b''
+        if match is not None:
+            self.pos = match.end()
+            raw = match.group()
+        raw = _NAME_ESCAPE.sub(lambda m: bytes([int(m.group(1), 16)]), raw)
+        return Name(raw.decode('latin-1'))
+
+    def _parse_array(self) -> list:
+        self.pos += 1
+        items = []
+        while True:
+            self.skip_whitespace()
+            if self.data[self.pos:self.pos + 1] == b']':
+                self.pos += 1
+                return items
+            items.append(self.parse())
+
+    def _parse_dict(self):
+        self.pos += 2
+        dict_ = {}
+        while True:
+            self.skip_whitespace()
+            if self.data[self.pos:self.pos + 2] == b'>>':
+                self.pos += 2
+                break
+            key = self.parse()
+            if not isinstance(key, Name):
+                raise PdfReadError(f'Dictionary key is not a name at {self.pos}.')
+            dict_[str(key)] = self.parse()
+
+        # 辞書の後ろにstreamがあるときはストリームオブジェクト
+        mark = self.pos
+        if self.token() != b'stream':
+            self.pos = mark
+            return dict_
+        return self._parse_stream(dict_)
+
+    def _parse_stream(self, dict_) -> Stream:
+        data = self.data
+        # streamの直後の改行を読み飛ばす
+        if data[self.pos:self.pos + 2] == b'\r\n':
+            self.pos += 2
+        elif data[self.pos:self.pos + 1] in (b'\n', b'\r'):
+            self.pos += 1
+        start = self.pos
+
+        length = dict_.get('Length')
+        if isinstance(length, Ref) and self._resolve is not None:
+            try:
+                length = self._resolve(length)
+            except PdfReadError:
+                length = None
+        end = start + length if isinstance(length, int) and length >= 0 else -1
+
+        # Lengthが正しくないときはendstreamを探す
+        if end < 0 or data.find(b'endstream', end, end + 32) < 0:
+            end = data.find(b'endstream', start)
+            if end < 0:
+                raise PdfReadError(f'Missing endstream for stream at {start}.')
+            while end > start and data[end - 1] in b'\r\n':
+                end -= 1
+
+        raw = data[start:end]
+        end_mark = data.find(b'endstream', end)
+        self.pos = end_mark + len(b'endstream') if end_mark >= 0 else end
+        return Stream(dict_, raw)
+
+    def _parse_hex_string(self) -> bytes:
+        end = self.data.find(b'>', self.pos)
+        if end < 0:
+            raise PdfReadError('Unterminated hex string.')
+        hex_digits = re.sub(rb'[^0-9a-fA-F]', b'', self.data[self.pos + 1:end])
+        if len(hex_digits) % 2:
+            hex_digits += b'0'
+        self.pos = end + 1
+        return bytes.fromhex(hex_digits.decode('ascii'))
+
+    def _parse_literal_string(self) -> bytes:
+        data = self.data
+        self.pos += 1
+        depth = 1
+        out = bytearray()
+        while self.pos < len(data):
+            c = data[self.pos]
+            self.pos += 1
+            if c == 0x5c:  # \
+                e = data[self.pos]
+                self.pos += 1
+                if e in _STRING_ESCAPES:
+                    out += _STRING_ESCAPES[e]
+                elif 0x30 <= e <= 0x37:
+                    # 8進数のエスケープ
+                    digits = bytes([e])
+                    while len(digits) < 3 and 0x30 <= data[self.pos] <= 0x37:
+                        digits += data[self.pos:self.pos + 1]
+                        self.pos += 1
+                    out.append(int(digits, 8) & 0xff)
+                elif e == 0x0d:
+                    # 行末の\は改行を無視する
+                    if data[self.pos] == 0x0a:
+                        self.pos += 1
+                elif e != 0x0a:
+                    out.append(e)
+            elif c == 0x28:  # (
+                depth += 1
+                out.append(c)
+            elif c == 0x29:  # )
+                depth -= 1
+                if depth == 0:
+                    return bytes(out)
+                out.append(c)
+            else:
+                out.append(c)
+        raise PdfReadError('Unterminated literal string.')
+
+
+def _png_unpredict(data: bytes, columns: int, colors: int, bits: int) -> bytes:
+    """PNGの予測子を元に戻す
+
+    Args:
+        data (bytes): 予測子が適用されたデータ
+        columns (int): 一行の列数
+        colors (int): 色成分数
+        bits (int): 色成分あたりのビット数
+
+    Returns:
+        bytes: 元のデータ
+    """
+    bpp = max(1, colors * bits // 8)
+    row_size = (columns * colors * bits + 7) // 8
+    out = bytearray()
+    previous = bytearray(row_size)
+    for i in range(0, len(data), row_size + 1):
+        filter_type = data[i]
+        row = bytearray(data[i + 1:i + 1 + row_size])
+        row.extend(b'\x00' * (row_size - len(row)))
+        for j in range(row_size):
+            left = row[j - bpp] if j >= bpp else 0
+            up = previous[j]
+            if filter_type == 1:
+                row[j] = (row[j] + left) & 0xff
+            elif filter_type == 2:
+                row[j] = (row[j] + up) & 0xff
+            elif filter_type == 3:
+                row[j] = (row[j] + (left + up) // 2) & 0xff
+            elif filter_type == 4:
+                up_left = previous[j - bpp] if j >= bpp else 0
+                p = left + up - up_left
+                pa, pb, pc = abs(p - left), abs(p - up), abs(p - up_left)
+                if pa <= pb and pa <= pc:
+                    predictor = left
+                elif pb <= pc:
+                    predictor = up
+                else:
+                    predictor = up_left
+                row[j] = (row[j] + predictor) & 0xff
+        out += row
+        previous = row
+    return bytes(out)
+
+
+def decode_stream(stream: Stream) -> bytes:
+    """ストリームのフィルターを適用してデータを取得
+
+    Note:
+        FlateDecodeのみ対応している．
+
+    Args:
+        stream (:obj:`Stream`): ストリームオブジェクト
+
+    Raises:
+        PdfReadError: 対応していないフィルターのときに発生
+
+    Returns:
+        bytes: フィルター適用後のデータ
+    """
+    data = stream.raw
+    params = stream.dict.get('DecodeParms') or {}
+    if isinstance(params, list):
+        params = (params[0] if params else None) or {}
+    for filter_name in stream.filters():
+        if filter_name not in ('FlateDecode', 'Fl'):
+            raise PdfReadError(f'Unsupported filter: {filter_name}.')
+        try:
+            data = zlib.decompressobj().decompress(data)
+        except zlib.error as e:
+            raise PdfReadError(f'Cannot inflate stream: {e}.')
+
+        predictor = params.get('Predictor', 1) if isinstance(params, dict) else 1
+        if predictor >= 10:
+            data = _png_unpredict(
+                data,
+                columns=params.get('Columns', 1),
+                colors=params.get('Colors', 1),
+                bits=params.get('BitsPerComponent', 8)
+            )
+    return data
+
+
+class PdfReader:
+    """PDFの読み込みクラス
+
+    Attributes:
+        input_path (str): ファイルパス
+    """
+
+    def __init__(self, input_path):
+        self.input_path = input_path
+        self._file = open(input_path, 'rb')
+        try:
+            self._data = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        except ValueError:
+            # 空のファイルはmmapできない
+            self._file.close()
+            raise PdfReadError(f'{input_path} is empty.')
+
+        self._xref = {}
+        self._objects = {}
+        self._object_streams = {}
+        self._pages = None
+        try:
+            try:
+                self.trailer = self._load_xref()
+            except _BROKEN_PDF_ERRORS:
+                # 相互参照表が壊れているときはファイル全体から再構築する
+                self._xref = {}
+                self._objects = {}
+                self.trailer = self._rebuild_xref()
+        except Exception:
+            self.close()
+            raise
+
+        if 'Encrypt' in self.trailer:
+            self.close()
+            raise PdfReadError(f'{input_path} is encrypted.')
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self) -> None:
+        """ファイルを閉じる"""
+        if not self._data.closed:
+            self._data.close()
+        self._file.close()
+
+    def _load_xref(self) -> dict:
+        """相互参照表を読み込む
+
+        startxrefから辿れる全ての相互参照表を読み込み，トレーラーを返す．
+
+        Returns:
+            dict: トレーラー辞書
+        """
+        tail_start = max(0, len(self._data) - _TAIL_SIZE)
+        matches = list(_STARTXREF.finditer(self._data, tail_start))
+        if not matches:
+            raise PdfReadError('startxref not found.')
+
+        trailer = None
+        offset = int(matches[-1].group(1))
+        visited = set()
+        while offset is not None and offset not in visited:
+            visited.add(offset)
+            section_trailer = self._read_xref_section(offset)
+            if trailer is None:
+                trailer = section_trailer
+            prev = section_trailer.get('Prev')
+            offset = prev if isinstance(prev, int) else None
+
+        if trailer is None or 'Root' not in trailer:
+            raise PdfReadError('Trailer has no Root.')
+        return trailer
+
+    def _read_xref_section(self, offset: int) -> dict:
+        """相互参照表の一区画を読み込む
+
+        Args:
+            offset (int): 相互参照表の位置
+
+        Returns:
+            dict: 区画のトレーラー辞書
+        """
+        parser = _Parser(self._data, offset)
+        parser.skip_whitespace()
+        if self._data[parser.pos:parser.pos + 4] != b'xref':
+            return self._read_xref_stream(offset)
+
+        parser.pos += 4
+        while True:
+            token = parser.token()
+            if token == b'trailer':
+                break
+            if not _INTEGER.match(token):
+                raise PdfReadError(f'Broken xref table at {parser.pos}.')
+            start = int(token)
+            count = int(parser.token())
+            for num in range(start, start + count):
+                entry_offset = int(parser.token())
+                gen = int(parser.token())
+                kind = parser.token()
+                if kind == b'n':
+                    self._xref.setdefault(num, ('offset', entry_offset, gen))
+                else:
+                    self._xref.setdefault(num, ('free', 0, 0))
+
+        trailer = parser.parse()
+        if not isinstance(trailer, dict):
+            raise PdfReadError('Broken trailer.')
+
+        # 互換用の相互参照ストリームがあるときはそれも読み込む
+        xref_stream_offset = trailer.get('XRefStm')
+        if isinstance(xref_stream_offset, int):
+            self._read_xref_stream(xref_stream_offset)
+        return trailer
+
+    def _read_xref_stream(self, offset: int) -> dict:
+        """相互参照ストリームを読み込む
+
+        Args:
+            offset (int): 相互参照ストリームの位置
+
+        Returns:
+            dict: 相互参照ストリームの辞書
+        """
+        _, stream = self._parse_indirect_object(offset)
+        if not isinstance(stream, Stream) or stream.dict.get('Type') != 'XRef':
+            raise PdfReadError(f'No xref stream at {offset}.')
+
+        widths = stream.dict['W']
+        size = stream.dict['Size']
+        index = stream.dict.get('Index', [0, size])
+        data = decode_stream(stream)
+        entry_size = sum(widths)
+        pos = 0
+        for i in range(0, len(index), 2):
+            for num in range(index[i], index[i] + index[i + 1]):
+                if pos + entry_size > len(data):
+                    break
+                fields = []
+                for width in widths:
+                    fields.append(int.from_bytes(data[pos:pos + width], 'big') if width else None)
+                    pos += width
+                kind = fields[0] if fields[0] is not None else 1
+                if kind == 1:
+                    self._xref.setdefault(num, ('offset', fields[1], fields[2] or 0))
+                elif kind == 2:
+                    self._xref.setdefault(num, ('compressed', fields[1], fields[2]))
+                else:
+                    self._xref.setdefault(num, ('free', 0, 0))
+        return stream.dict
+
+    def _rebuild_xref(self) -> dict:
+        """ファイル全体からオブジェクトを探して相互参照表を再構築
+
+        Returns:
+            dict: トレーラー辞書
+        """
+        for match in _OBJ_HEADER.finditer(self._data):
+            self._xref[int(match.group(1))] = ('offset', match.start(), int(match.group(2)))
+
+        # トレーラー，またはRootを持つ相互参照ストリームを探す
+        trailer = {}
+        position = self._data.rfind(b'trailer')
+        if position >= 0:
+            try:
+                parsed = _Parser(self._data, position + len(b'trailer')).parse()
+                if isinstance(parsed, dict):
+                    trailer = parsed
+            except PdfReadError:
+                pass
+        if 'Root' not in trailer:
+            for num in self._xref:
+                try:
+                    obj = self.get_object(num)
+                except PdfReadError:
+                    continue
+                if isinstance(obj, Stream) and obj.dict.get('Type') == 'XRef' and 'Root' in obj.dict:
+                    trailer = obj.dict
+                elif isinstance(obj, dict) and obj.get('Type') == 'Catalog':
+                    trailer = {'Root': Ref(num, 0)}
+                    break
+        if 'Root' not in trailer:
+            raise PdfReadError(f'Cannot find document catalog in {self.input_path}.')
+        return trailer
+
+    def _parse_indirect_object(self, offset: int):
+        """`num gen obj ... endobj`を読み込む
+
+        Args:
+            offset (int): オブジェクトの位置
+
+        Returns:
+            tuple: オブジェクト番号と，オブジェクト
+        """
+        parser = _Parser(self._data, offset, resolve=self.resolve)
+        num = parser.token()
+        parser.token()
+        parser.expect(b'obj')
+        if not _INTEGER.match(num):
+            raise PdfReadError(f'No object at {offset}.')
+        return int(num), parser.parse()
+
+    def get_object(self, num: int):
+        """オブジェクト番号からオブジェクトを取得
+
+        Args:
+            num (int): オブジェクト番号
+
+        Returns:
+            object: オブジェクト．存在しないときはNone
+        """
+        if num in self._objects:
+            return self._objects[num]
+
+        entry = self._xref.get(num)
+        if entry is None or entry[0] == 'free':
+            return None
+
+        # 循環参照に備えて，読み込み中はNoneとしておく
+        self._objects[num] = None
+        if entry[0] == 'offset':
+            _, obj = self._parse_indirect_object(entry[1])
+        else:
+            obj = self._get_compressed_object(entry[1], entry[2])
+        self._objects[num] = obj
+        return obj
+
+    def _get_compressed_object(self, stream_num: int, index: int):
+        """オブジェクトストリームの中のオブジェクトを取得
+
+        Args:
+            stream_num (int): オブジェクトストリームのオブジェクト番号
+            index (int): オブジェクトストリームの中の番号
+
+        Returns:
+            object: オブジェクト
+        """
+        if stream_num not in self._object_streams:
+            stream = self.get_object(stream_num)
+            if not isinstance(stream, Stream):
+                raise PdfReadError(f'Object stream {stream_num} not found.')
+            data = decode_stream(stream)
+            first = stream.dict['First']
+            header = _Parser(data, 0)
+            offsets = []
+            for _ in range(stream.dict['N']):
+                header.token()
+                offsets.append(first + int(header.token()))
+            self._object_streams[stream_num] = (data, offsets)
+
+        data, offsets = self._object_streams[stream_num]
+        return _Parser(data, offsets[index], resolve=self.resolve).parse()
+
+    def resolve(self, obj):
+        """間接参照を辿ってオブジェクトを取得
+
+        Args:
+            obj (object): オブジェクト，または間接参照
+
+        Returns:
+            object: 参照先のオブジェクト
+        """
+        depth = 0
+        while isinstance(obj, Ref):
+            depth += 1
+            if depth > _MAX_DEPTH:
+                raise PdfReadError('Too deep reference chain.')
+            obj = self.get_object(obj.num)
+        return obj
+
+    @property
+    def catalog(self) -> dict:
+        catalog = self.resolve(self.trailer.get('Root'))
+        if not isinstance(catalog, dict):
+            raise PdfReadError('Document catalog is broken.')
+        return catalog
+
+    @property
+    def page_count(self) -> int:
+        """総ページ数
+
+        ページツリーの根のCountを使う．壊れているときはページツリーを辿って数える．
+
+        """
+        pages = self.resolve(self.catalog.get('Pages'))
+        if isinstance(pages, dict):
+            count = self.resolve(pages.get('Count'))
+            if isinstance(count, int) and count >= 0:
+                return count
+        return len(self.pages)
+
+    @property
+    def pages(self) -> list:
+        """ページ辞書のリスト
+
+        親から継承されるResourcesは，それぞれのページ辞書に設定する．
+
+        """
+        if self._pages is not None:
+            return self._pages
+
+        pages = []
+        visited = set()
+        root = self.catalog.get('Pages')
+        stack = [(root, {}, 0)]
+        while stack:
+            node_ref, inherited, depth = stack.pop()
+            if isinstance(node_ref, Ref):
+                if node_ref.num in visited:
+                    continue
+                visited.add(node_ref.num)
+            node = self.resolve(node_ref)
+            if not isinstance(node, dict) or depth > _MAX_DEPTH:
+                continue
+
+            inherited = dict(inherited)
+            for key in ('Resources', 'MediaBox', 'Rotate'):
+                if key in node:
+                    inherited[key] = node[key]
+
+            kids = self.resolve(node.get('Kids'))
+            if node.get('Type') == 'Pages' or (node.get('Type') != 'Page' and isinstance(kids, list)):
+                for kid in reversed(kids or []):
+                    stack.append((kid, inherited, depth + 1))
+            else:
+                page = dict(inherited)
+                page.update(node)
+                pages.append(page)
+
+        self._pages = pages
+        return pages
+
+    def _xobjects(self, resources, depth=0):
+        """リソースのXObjectを辿る
+
+        Args:
+            resources (dict): リソース辞書
+
+        Yields:
+            :obj:`Stream`: XObjectのストリーム
+        """
+        resources = self.resolve(resources)
+        if not isinstance(resources, dict) or depth > 2:
+            return
+        xobjects = self.resolve(resources.get('XObject'))
+        if not isinstance(xobjects, dict):
+            return
+        for ref in xobjects.values():
+            xobject = self.resolve(ref)
+            if not isinstance(xobject, Stream):
+                continue
+            yield xobject
+            # Form XObjectの中の画像も辿る
+            if xobject.dict.get('Subtype') == 'Form':
+                yield from self._xobjects(xobject.dict.get('Resources'), depth + 1)
+
+    def page_jpeg_images(self, index: int) -> list:
+        """ページに埋め込まれたJPEG画像を取得
+
+        DCTDecodeのみで圧縮された画像は，そのままJPEGファイルとして扱える．
+
+        Args:
+            index (int): ページ番号（0始まり）
+
+        Returns:
+            list[bytes]: JPEG画像のリスト
+        """
+        images = []
+        for xobject in self._xobjects(self.pages[index].get('Resources')):
+            if xobject.dict.get('Subtype') != 'Image':
+                continue
+            if xobject.filters() in (['DCTDecode'], ['DCT']):
+                images.append(xobject.raw)
+        return images
+
+    def page_has_fonts(self, index: int) -> bool:
+        """ページがフォントを使っているか
+
+        フォントを使うページは，テキストレイヤーを持つとみなす．
+
+        Args:
+            index (int): ページ番号（0始まり）
+
+        Returns:
+            bool: ページまたはページのForm XObjectがフォントを持つときはTrue
+        """
+        resources_list = [self.pages[index].get('Resources')]
+        resources_list += [
+            xobject.dict.get('Resources')
+            for xobject in self._xobjects(self.pages[index].get('Resources'))
+            if xobject.dict.get('Subtype') == 'Form'
+        ]
+        for resources in resources_list:
+            resources = self.resolve(resources)
+            if isinstance(resources, dict) and self.resolve(resources.get('Font')):
+                return True
+        return False
+
+
+def get_page_count(input_path: str) -> int:
+    """PDFの総ページ数を取得
+
+    Args:
+        input_path (str): ファイルパス
+
+    Raises:
+        PdfReadError: PDFを解析できなかったときに発生
+
+    Returns:
+        int: 総ページ数
+    """
+    try:
+        with PdfReader(input_path) as reader:
+            return reader.page_count
+    except PdfReadError:
+        raise
+    except _BROKEN_PDF_ERRORS as e:
+        raise PdfReadError(f'Cannot read {input_path}: {e!r}.')
+
+
+def get_page_jpeg_images(input_path: str, page_numbers) -> list:
+    """PDFの指定したページに埋め込まれたJPEG画像を取得
+
+    Args:
+        input_path (str): ファイルパス
+        page_numbers (list[int]): ページ番号（1始まり）のリスト
+
+    Raises:
+        PdfReadError: PDFを解析できなかったときに発生
+
+    Returns:
+        list[tuple]: ページ番号とJPEG画像の組のリスト
+    """
+    try:
+        with PdfReader(input_path) as reader:
+            images = []
+            for page_number in page_numbers:
+                for image in reader.page_jpeg_images(page_number - 1):
+                    images.append((page_number, image))
+            return images
+    except PdfReadError:
+        raise
+    except _BROKEN_PDF_ERRORS as e:
+        raise PdfReadError(f'Cannot read {input_path}: {e!r}.')
+
+
+def has_text_layer(input_path: str, page_numbers) -> bool:
+    """PDFの指定したページがテキストレイヤーを持つか
+
+    Args:
+        input_path (str): ファイルパス
+        page_numbers (list[int]): ページ番号（1始まり）のリスト
+
+    Raises:
+        PdfReadError: PDFを解析できなかったときに発生
+
+    Returns:
+        bool: いずれかのページがフォントを使っているときはTrue
+    """
+    try:
+        with PdfReader(input_path) as reader:
+            return any(reader.page_has_fonts(page_number - 1) for page_number in page_numbers)
+    except PdfReadError:
+        raise
+    except _BROKEN_PDF_ERRORS as e:
+        raise PdfReadError(f'Cannot read {input_path}: {e!r}.')
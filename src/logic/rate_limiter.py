@@ -0,0 +1,257 @@
+"""APIの流量制限
+
+トークンバケットを使ってAPIへのリクエストの間隔を制御する．
+プロセス内の全てのワーカーで共有し，SQLiteを使うときは複数のプロセスでも共有する．
+429が返されたときはリクエストの間隔を広げ，一日あたりのリクエスト数も制限する．
+
+"""
+
+
+import time
+import threading
+from contextlib import contextmanager
+from logic.sqlite_util import ThreadLocalConnection
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS rate_limit (
+    name TEXT PRIMARY KEY,
+    tokens REAL NOT NULL,
+    rate REAL NOT NULL,
+    updated_at REAL NOT NULL,
+    blocked_until REAL NOT NULL,
+    day TEXT NOT NULL,
+    used INTEGER NOT NULL
+);
+'''
+
+# 429が返されたときに，リクエストの間隔を何倍に広げるか
+_DECREASE_FACTOR = 0.5
+# リクエストが成功したときに，本来の頻度の何割ずつ戻すか
+_INCREASE_RATIO = 0.1
+
+_SECONDS_PER_DAY = 60 * 60 * 24
+
+
+class RateLimitedException(Exception):
+    """流量制限にかかったときの例外クラス
+
+    待っても流量制限が解けないときや，一日あたりのリクエスト数を使い切ったときに投げられる例外クラス．
+    本の情報がないわけではないため，時間をおいて再び問い合わせる．
+
+    Attributes:
+        retry_after (float): 再び問い合わせるまでに待つ秒数
+    """
+
+    def __init__(self, message, retry_after):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+def _today(now: float) -> str:
+    # Google Books APIの一日あたりの上限に合わせて，日付はUTCで区切る
+    return time.strftime('%Y-%m-%d', time.gmtime(now))
+
+
+def _seconds_until_tomorrow(now: float) -> float:
+    return _SECONDS_PER_DAY - now % _SECONDS_PER_DAY
+
+
+class RateLimiter:
+    """APIの流量制限クラス
+
+    一秒あたり`rate`回，最大`burst`回まで連続してリクエストできるトークンバケット．
+    429が返されたときは頻度を半分にし，成功するたびに本来の頻度に少しずつ戻す．
+
+    Attributes:
+        name (str): 流量制限の名前．SQLiteを共有するときのキーにする
+        rate (float): 一秒あたりのリクエスト数
+        burst (int): 連続してリクエストできる数
+        min_rate (float): 429が返されたときに下げる頻度の下限
+        daily_quota (int): 一日あたりのリクエスト数の上限．Noneのときは制限しない
+        max_wait (float): トークンが溜まるのを待つ最大秒数
+        db_path (str): 複数のプロセスで共有するSQLiteのファイルパス．Noneのときはプロセス内だけで共有する
+    """
+
+    def __init__(self, name, rate, burst=1, min_rate=None, daily_quota=None, max_wait=10.0, db_path=None):
+        self.name = name
+        self.rate = rate
+        self.burst = burst
+        self.min_rate = min_rate if min_rate is not None else rate / 10
+        self.daily_quota = daily_quota
+        self.max_wait = max_wait
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._memory_state = self._initial_state(time.time())
+        self._connection = ThreadLocalConnection(db_path, _SCHEMA) if db_path else None
+
+    def _initial_state(self, now: float) -> dict:
+        return {
+            'tokens': float(self.burst),
+            'rate': float(self.rate),
+            'updated_at': now,
+            'blocked_until': 0.0,
+            'day': _today(now),
+            'used': 0,
+        }
+
+    @contextmanager
+    def _state(self):
+        """バケットの状態を排他的に読み書きする
+
+        SQLiteを使うときは，書き込みトランザクションでプロセス間の排他を行う．
+
+        Yields:
+            dict: バケットの状態．変更は`with`文を抜けたときに保存する
+        """
+        if self._connection is None:
+            with self._lock:
+                yield self._memory_state
+            return
+
+        connection = self._connection.get()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            row = connection.execute(
+                'SELECT tokens, rate, updated_at, blocked_until, day, used FROM rate_limit WHERE name = ?',
+                (self.name,)
+            ).fetchone()
+            if row is None:
+                state = self._initial_state(time.time())
+            else:
+                state = dict(zip(['tokens', 'rate', 'updated_at', 'blocked_until', 'day', 'used'], row))
+            yield state
+            connection.execute(
+                'INSERT OR REPLACE INTO rate_limit '
+                '(name, tokens, rate, updated_at, blocked_until, day, used) VALUES (?, ?, ?, ?, ?, ?, ?)',
+                (self.name, state['tokens'], state['rate'], state['updated_at'],
+                 state['blocked_until'], state['day'], state['used'])
+            )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
+
+    def _try_acquire(self) -> tuple:
+        """トークンを一つ取り出す
+
+        Returns:
+            tuple: 取り出せたか(一日あたりの上限に達したときはNone)と，次に取り出せるまでの秒数
+        """
+        with self._state() as state:
+            now = time.time()
+            if state['day'] != _today(now):
+                state['day'] = _today(now)
+                state['used'] = 0
+            if self.daily_quota is not None and state['used'] >= self.daily_quota:
+                return None, _seconds_until_tomorrow(now)
+            if state['blocked_until'] > now:
+                return False, state['blocked_until'] - now
+
+            state['tokens'] = min(self.burst, state['tokens'] + (now - state['updated_at']) * state['rate'])
+            state['updated_at'] = now
+            if state['tokens'] >= 1:
+                state['tokens'] -= 1
+                state['used'] += 1
+                return True, 0.0
+            return False, (1 - state['tokens']) / state['rate']
+
+    def acquire(self, max_wait=None) -> None:
+        """リクエストしてよくなるまで待つ
+
+        Args:
+            max_wait (float): 待つ最大秒数．Noneのときは`max_wait`を使う
+
+        Raises:
+            RateLimitedException: 待っても流量制限が解けないときや，
+                一日あたりのリクエスト数を使い切ったときに発生
+        """
+        if max_wait is None:
+            max_wait = self.max_wait
+        deadline = time.monotonic() + max_wait
+        while True:
+            acquired, wait = self._try_acquire()
+            if acquired:
+                return
+            if acquired is None:
+                raise RateLimitedException(
+                    f'Daily quota of {self.daily_quota} requests to {self.name} is used up.',
+                    retry_after=wait
+                )
+            if time.monotonic() + wait > deadline:
+                raise RateLimitedException(
+                    f'Requests to {self.name} are rate limited for {wait:.1f}s.',
+                    retry_after=wait
+                )
+            time.sleep(wait)
+
+    def penalize(self, retry_after=None) -> float:
+        """429が返されたときに，リクエストの間隔を広げる
+
+        Args:
+            retry_after (float): Retry-Afterヘッダーの秒数．Noneのときは広げた間隔だけ待つ
+
+        Returns:
+            float: 次にリクエストできるまでの秒数
+        """
+        with self._state() as state:
+            now = time.time()
+            state['rate'] = max(self.min_rate, state['rate'] * _DECREASE_FACTOR)
+            state['tokens'] = 0.0
+            state['updated_at'] = now
+            wait = retry_after if retry_after is not None else 1 / state['rate']
+            state['blocked_until'] = max(state['blocked_until'], now + wait)
+            return state['blocked_until'] - now
+
+    def reward(self) -> None:
+        """リクエストが成功したときに，リクエストの頻度を本来の値に近づける"""
+        with self._state() as state:
+            if state['rate'] < self.rate:
+                state['rate'] = min(self.rate, state['rate'] + self.rate * _INCREASE_RATIO)
+
+    def exhaust(self) -> float:
+        """一日あたりのリクエスト数を使い切ったことにする
+
+        APIから一日あたりの上限に達したと返されたときに使う．
+
+        Returns:
+            float: 次にリクエストできるまでの秒数
+        """
+        with self._state() as state:
+            now = time.time()
+            state['blocked_until'] = max(state['blocked_until'], now + _seconds_until_tomorrow(now))
+            return state['blocked_until'] - now
+
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+
+def get_rate_limiter(name: str) -> RateLimiter:
+    """流量制限を取得
+
+    Args:
+        name (str): 流量制限の名前
+
+    Returns:
+        :obj:`RateLimiter`: 流量制限．設定されていないときはNoneを返す．
+    """
+    with _limiters_lock:
+        return _limiters.get(name)
+
+
+def configure_rate_limiter(name: str, **kwargs) -> RateLimiter:
+    """流量制限を設定
+
+    プロセス内の全てのワーカーで共有する流量制限を作り直す．
+
+    Args:
+        name (str): 流量制限の名前
+        **kwargs: `RateLimiter`の引数
+
+    Returns:
+        :obj:`RateLimiter`: 流量制限
+    """
+    with _limiters_lock:
+        limiter = _limiters[name] = RateLimiter(name, **kwargs)
+        return limiter
@@ -0,0 +1,109 @@
+"""描画の段階
+
+バーコードを読み取るために，ページを低解像度から段階的に描画する．
+
+"""
+
+
+from collections import namedtuple
+from pdf2image import convert_from_path
+from logic.metrics import span
+
+
+"""描画の段階
+
+Attributes:
+    dpi (int): 解像度
+    grayscale (bool): グレースケールで描画するか
+    regions (list[tuple]): 切り出す領域(left, top, right, bottom)をページに対する割合で指定する．
+        Noneのときはページ全体を使う
+"""
+RenderLevel = namedtuple('RenderLevel', [
+    'dpi',
+    'grayscale',
+    'regions'
+])
+
+# バーコードが載っていることが多い領域
+# 和書の裏表紙は右上に，洋書は下部にバーコードが載っていることが多い
+BARCODE_REGIONS = [
+    (0.4, 0.0, 1.0, 0.5),
+    (0.0, 0.5, 1.0, 1.0),
+]
+
+# 既定の描画の段階
+# 低解像度で領域を切り出したものから始め，読み取れないときに解像度を上げ，ページ全体を使う
+DEFAULT_LADDER = [
+    RenderLevel(dpi=100, grayscale=True, regions=BARCODE_REGIONS),
+    RenderLevel(dpi=200, grayscale=True, regions=None),
+    RenderLevel(dpi=300, grayscale=True, regions=None),
+]
+
+
+def level_name(level: RenderLevel) -> str:
+    """描画の段階の名前を取得
+
+    集計の際に段階を区別するために使う．
+
+    Args:
+        level (:obj:`RenderLevel`): 描画の段階
+
+    Returns:
+        str: 描画の段階の名前
+    """
+    name = f'{level.dpi}dpi'
+    if level.grayscale:
+        name += '-gray'
+    if level.regions:
+        name += '-roi'
+    return name
+
+
+def render_page(input_path: str, page_number: int, level: RenderLevel) -> list:
+    """ページを描画の段階に従って画像に変換
+
+    Args:
+        input_path (str): ファイルパス
+        page_number (int): ページ番号（1始まり）
+        level (:obj:`RenderLevel`): 描画の段階
+
+    Returns:
+        list[PIL.Image]: 画像のリスト．領域を指定したときは領域ごとの画像になる．
+    """
+    with span('render'):
+        page_images = convert_from_path(
+            input_path,
+            dpi=level.dpi,
+            first_page=page_number,
+            last_page=page_number,
+            grayscale=level.grayscale
+        )
+    if not page_images:
+        return []
+
+    page_image = page_images[0]
+    if not level.regions:
+        return [page_image]
+    return crop_regions(page_image, level.regions)
+
+
+def crop_regions(page_image, regions) -> list:
+    """ページの画像から領域を切り出す
+
+    Args:
+        page_image (PIL.Image): ページの画像
+        regions (list[tuple]): 切り出す領域(left, top, right, bottom)をページに対する割合で指定する
+
+    Returns:
+        list[PIL.Image]: 領域ごとの画像
+    """
+    width, height = page_image.size
+    return [
+        page_image.crop((
+            int(left * width),
+            int(top * height),
+            int(right * width),
+            int(bottom * height)
+        ))
+        for left, top, right, bottom in regions
+    ]
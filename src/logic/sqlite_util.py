@@ -0,0 +1,64 @@
+"""SQLiteの共通処理
+
+複数のスレッドや監視プロセスから共有されるSQLiteデータベースへの接続を扱う．
+
+"""
+
+
+import os
+import sqlite3
+import threading
+
+
+# ロックが取れないときに待つ秒数
+BUSY_TIMEOUT = 30.0
+
+
+def connect(db_path: str) -> sqlite3.Connection:
+    """SQLiteデータベースに接続
+
+    WALモードで接続し，複数プロセスからの同時読み書きに耐えられるようにする．
+
+    Args:
+        db_path (str): データベースのファイルパス
+
+    Returns:
+        :obj:`sqlite3.Connection`: データベース接続
+    """
+    db_dir = os.path.dirname(db_path)
+    if db_dir:
+        os.makedirs(db_dir, exist_ok=True)
+
+    connection = sqlite3.connect(db_path, timeout=BUSY_TIMEOUT, isolation_level=None)
+    connection.execute('PRAGMA journal_mode=WAL')
+    connection.execute('PRAGMA synchronous=NORMAL')
+    return connection
+
+
+class ThreadLocalConnection:
+    """スレッドごとのSQLite接続
+
+    sqlite3の接続はスレッド間で共有できないため，スレッドごとに接続を作成する．
+
+    Attributes:
+        db_path (str): データベースのファイルパス
+    """
+
+    def __init__(self, db_path, schema=''):
+        self.db_path = db_path
+        self._schema = schema
+        self._local = threading.local()
+
+    def get(self) -> sqlite3.Connection:
+        """現在のスレッドの接続を取得
+
+        Returns:
+            :obj:`sqlite3.Connection`: データベース接続
+        """
+        connection = getattr(self._local, 'connection', None)
+        if connection is None:
+            connection = connect(self.db_path)
+            if self._schema:
+                connection.executescript(self._schema)
+            self._local.connection = connection
+        return connection
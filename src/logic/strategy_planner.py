@@ -0,0 +1,245 @@
+"""ISBNコードを取得する手法の計画
+
+監視する入力ディレクトリと文書の特徴（総ページ数，テキストレイヤーの有無）ごとに，手法ごとのヒット率と実行時間をSQLiteに記録する．
+記録をもとに，ISBNコードが見つかるまでの時間の期待値が小さくなるように手法を並べ，ほとんど当たらない手法は省く．
+ディレクトリごとに手法を固定することもできる．
+サブディレクトリも対象とするときは，サブディレクトリのファイルも監視する入力ディレクトリの記録と固定を使う．
+
+"""
+
+
+import os
+import random
+from collections import namedtuple
+from logic.pdf_reader import get_page_count, has_text_layer, PdfReadError
+from logic.sqlite_util import ThreadLocalConnection
+
+
+_SCHEMA = '''
+CREATE TABLE IF NOT EXISTS strategy_stats (
+    source_dir TEXT NOT NULL,
+    page_bucket TEXT NOT NULL,
+    text_layer TEXT NOT NULL,
+    strategy TEXT NOT NULL,
+    attempts INTEGER NOT NULL,
+    hits INTEGER NOT NULL,
+    seconds REAL NOT NULL,
+    PRIMARY KEY (source_dir, page_bucket, text_layer, strategy)
+);
+'''
+
+# 手法．`embedded`はPDFを直接解析できないときにシェルに代わる
+STRATEGIES = ('embedded', 'shell', 'text_layer', 'barcode', 'ocr')
+# 計画で並べる手法と，記録がないときの順番
+DEFAULT_STRATEGIES = ('embedded', 'text_layer', 'barcode', 'ocr')
+
+# 記録がないときに仮定する，手法ごとの実行時間とヒット率
+PRIOR_SECONDS = {
+    'embedded': 0.05,
+    'shell': 1.0,
+    'text_layer': 0.2,
+    'barcode': 2.0,
+    'ocr': 10.0,
+}
+PRIOR_HIT_RATE = 0.5
+# 仮定した値を何回分の記録とみなすか
+PRIOR_WEIGHT = 2
+
+# 総ページ数の区切り
+PAGE_BUCKETS = (2, 50, 300)
+
+"""文書の特徴
+
+Attributes:
+    source_dir (str): 監視する入力ディレクトリ
+    page_count (int): 総ページ数．分からないときはNone
+    text_layer (bool): 先頭と末尾のページがテキストレイヤーを持つか．分からないときはNone
+"""
+DocumentFeatures = namedtuple('DocumentFeatures', [
+    'source_dir',
+    'page_count',
+    'text_layer'
+])
+
+"""手法の計画
+
+Attributes:
+    strategies (list[str]): 試す手法の順番
+    skipped (list[str]): 省いた手法
+    pinned (bool): 固定した手法か
+"""
+Plan = namedtuple('Plan', [
+    'strategies',
+    'skipped',
+    'pinned'
+])
+
+
+def page_bucket(page_count) -> str:
+    """総ページ数の区分を取得
+
+    Args:
+        page_count (int): 総ページ数．分からないときはNone
+
+    Returns:
+        str: 総ページ数の区分
+    """
+    if page_count is None:
+        return 'unknown'
+    for bound in PAGE_BUCKETS:
+        if page_count <= bound:
+            return f'<={bound}'
+    return f'>{PAGE_BUCKETS[-1]}'
+
+
+def _normalize_dir(path: str) -> str:
+    return os.path.normcase(os.path.abspath(path))
+
+
+def document_features(input_path: str, source_dir=None) -> DocumentFeatures:
+    """文書の特徴を取得
+
+    PDFを直接解析し，先頭と末尾のページがフォントを使っているかを確認する．
+
+    Args:
+        input_path (str): ファイルパス
+        source_dir (str): 監視する入力ディレクトリ．Noneのときはファイルのあるディレクトリ
+
+    Returns:
+        :obj:`DocumentFeatures`: 文書の特徴．解析できないときは総ページ数とテキストレイヤーの有無をNoneとする．
+    """
+    source_dir = _normalize_dir(source_dir or os.path.dirname(input_path))
+    try:
+        page_count = get_page_count(input_path)
+        text_layer = has_text_layer(input_path, sorted({1, page_count})) if page_count else False
+    except PdfReadError:
+        return DocumentFeatures(source_dir, None, None)
+    return DocumentFeatures(source_dir, page_count, text_layer)
+
+
+class StrategyPlanner:
+    """ISBNコードを取得する手法の計画クラス
+
+    ヒット率を`p`，一回の平均実行時間を`c`とすると，`c / p`の小さい順に試すと
+    ISBNコードが見つかるまでの時間の期待値が最も小さくなる．
+    記録が少ないうちは`PRIOR_SECONDS`と`PRIOR_HIT_RATE`で補う．
+
+    Attributes:
+        db_path (str): 記録のファイルパス
+        pins (dict): 入力ディレクトリごとに固定する手法のリスト
+        skip_after (int): 手法を省くかを判断するまでの試行回数
+        skip_rate (float): このヒット率を下回る手法は省く
+        explore_rate (float): 省いた手法も試す割合．記録を更新し続けるために使う
+    """
+
+    def __init__(self, db_path, pins=None, skip_after=20, skip_rate=0.02, explore_rate=0.05):
+        self.db_path = db_path
+        self.pins = {_normalize_dir(path): list(strategies) for path, strategies in (pins or {}).items()}
+        self.skip_after = skip_after
+        self.skip_rate = skip_rate
+        self.explore_rate = explore_rate
+        self._connection = ThreadLocalConnection(db_path, _SCHEMA)
+
+        for strategies in self.pins.values():
+            unknown = set(strategies) - set(STRATEGIES)
+            if unknown:
+                raise ValueError(f'Unknown strategies: {", ".join(sorted(unknown))}.')
+
+    @staticmethod
+    def _key(features):
+        text_layer = 'unknown' if features.text_layer is None else str(features.text_layer).lower()
+        return features.source_dir, page_bucket(features.page_count), text_layer
+
+    def stats(self, features: DocumentFeatures) -> dict:
+        """文書の特徴に合う記録を取得
+
+        Args:
+            features (:obj:`DocumentFeatures`): 文書の特徴
+
+        Returns:
+            dict: 手法ごとの試行回数，ヒット数，合計実行時間
+        """
+        rows = self._connection.get().execute(
+            'SELECT strategy, attempts, hits, seconds FROM strategy_stats '
+            'WHERE source_dir = ? AND page_bucket = ? AND text_layer = ?',
+            self._key(features)
+        ).fetchall()
+        return {
+            strategy: {'attempts': attempts, 'hits': hits, 'seconds': seconds}
+            for strategy, attempts, hits, seconds in rows
+        }
+
+    def plan(self, features: DocumentFeatures) -> Plan:
+        """手法を試す順番を決める
+
+        Args:
+            features (:obj:`DocumentFeatures`): 文書の特徴
+
+        Returns:
+            :obj:`Plan`: 手法の計画
+        """
+        pinned = self.pins.get(features.source_dir)
+        if pinned is not None:
+            return Plan(list(pinned), [], True)
+
+        stats = self.stats(features)
+        candidates = []
+        skipped = []
+        explore = random.random() < self.explore_rate
+        for strategy in DEFAULT_STRATEGIES:
+            # テキストレイヤーがないと分かっているときは，テキストレイヤーを読まない
+            if strategy == 'text_layer' and features.text_layer is False:
+                skipped.append(strategy)
+                continue
+
+            values = stats.get(strategy, {'attempts': 0, 'hits': 0, 'seconds': 0.0})
+            attempts = values['attempts']
+            if (not explore and attempts >= self.skip_after
+                    and values['hits'] / attempts < self.skip_rate):
+                skipped.append(strategy)
+                continue
+
+            hit_rate = (values['hits'] + PRIOR_HIT_RATE * PRIOR_WEIGHT) / (attempts + PRIOR_WEIGHT)
+            seconds = (values['seconds'] + PRIOR_SECONDS[strategy] * PRIOR_WEIGHT) / (attempts + PRIOR_WEIGHT)
+            candidates.append((seconds / hit_rate, strategy))
+
+        # 全て省いたときは，既定の順番で全て試す
+        if not candidates:
+            return Plan(list(DEFAULT_STRATEGIES), [], False)
+        # sortedは安定なため，同じ値のときは既定の順番になる
+        return Plan([strategy for _, strategy in sorted(candidates, key=lambda c: c[0])], skipped, False)
+
+    def record(self, features: DocumentFeatures, stages) -> None:
+        """手法ごとの実行記録を追加
+
+        描画の段階ごとの記録は，手法ごとにまとめる．
+
+        Args:
+            features (:obj:`DocumentFeatures`): 文書の特徴
+            stages (list[:obj:`StageRecord`]): 段階ごとの実行記録
+        """
+        totals = {}
+        for stage in stages:
+            strategy = stage.stage.split(':')[0]
+            hit, seconds = totals.get(strategy, (False, 0.0))
+            totals[strategy] = (hit or stage.hit, seconds + stage.seconds)
+        if not totals:
+            return
+
+        key = self._key(features)
+        connection = self._connection.get()
+        connection.execute('BEGIN IMMEDIATE')
+        try:
+            for strategy, (hit, seconds) in totals.items():
+                connection.execute(
+                    'INSERT INTO strategy_stats '
+                    '(source_dir, page_bucket, text_layer, strategy, attempts, hits, seconds) '
+                    'VALUES (?, ?, ?, ?, 1, ?, ?) '
+                    'ON CONFLICT (source_dir, page_bucket, text_layer, strategy) DO UPDATE SET '
+                    'attempts = attempts + 1, hits = hits + excluded.hits, seconds = seconds + excluded.seconds',
+                    (*key, strategy, int(hit), seconds)
+                )
+            connection.execute('COMMIT')
+        except BaseException:
+            connection.execute('ROLLBACK')
+            raise
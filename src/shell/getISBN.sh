@@ -12,18 +12,30 @@ if [[ ! $1 =~ .+(\.pdf)$ ]]; then
 fi
 shopt -u nocasematch
 
-# Delete all .image* generated by pdfimages
-rm -f .image*
+# Extract images into a scratch directory of this job only, so that jobs can run in parallel
+# Prefer tmpfs to avoid writing the images to disk
+if [ -d /dev/shm ] && [ -w /dev/shm ]; then
+  WORK_DIR="$(mktemp -d /dev/shm/getISBN.XXXXXX)"
+else
+  WORK_DIR="$(mktemp -d "${TMPDIR:-/tmp}/getISBN.XXXXXX")"
+fi || exit 1
+# Delete the scratch directory however the script ends
+trap 'rm -rf "$WORK_DIR"' EXIT
+trap 'exit 1' INT TERM
 
 # Get total count of PDF pages
-pages=$(pdfinfo "$FILE_PATH" | grep -E "^Pages" | sed -E "s/^Pages: +//") &&
-# Generate JPEG from PDF
-pdfimages -j -l "$PAGE_COUNT" "$FILE_PATH" .image_h &&
-pdfimages -j -f $((pages - PAGE_COUNT)) "$FILE_PATH" .image_t &&
-# Grep ISBN
-isbnTitle="$(zbarimg -q .image* | sort | uniq | grep -E '^EAN-13:978' | sed -E 's/^EAN-13://' | sed 's/-//')" &&
-# If the ISBN was found, echo the ISBN
-[ "$isbnTitle" != "" ] &&
-echo "$isbnTitle" && rm -f .image* && exit 0 ||
-# Else, exit with error code
-rm -f .image* && exit 1
+pages=$(pdfinfo "$FILE_PATH" | grep -E "^Pages" | sed -E "s/^Pages: +//") || exit 1
+# Generate JPEG from PDF, with the page number in each file name (image_h-PPP-NNN.jpg)
+pdfimages -j -p -l "$PAGE_COUNT" "$FILE_PATH" "$WORK_DIR/image_h" || exit 1
+pdfimages -j -p -f $((pages - PAGE_COUNT)) "$FILE_PATH" "$WORK_DIR/image_t" || exit 1
+
+# Print every barcode that may be an ISBN as "page<TAB>code"
+# The caller validates the check digits and ranks the candidates
+# Exit with error code when no barcode was found
+for image in "$WORK_DIR"/image_*; do
+  [ -e "$image" ] || continue
+  page=$(basename "$image" | sed -E 's/^image_[ht]-0*([0-9]+)-[0-9]+\..*$/\1/')
+  while IFS= read -r code; do
+    printf '%s\t%s\n' "$page" "$code"
+  done < <(zbarimg -q "$image" | grep -E '^(EAN-13|ISBN-10|ISBN-13):' | sed -E 's/^[^:]+://' | sed 's/-//g')
+done | sort -u -k1,1n -k2,2 | grep .
@@ -0,0 +1,216 @@
+"""書き込み完了の待機
+
+スキャナーやネットワーク越しのコピーが書き込み中のファイルを処理しないように，
+ファイルの書き込みが終わるまで待ってから処理を投入する．
+
+"""
+
+
+import os
+import time
+import errno
+import threading
+
+
+def _can_open_exclusively(path: str) -> bool:
+    """ファイルを排他的に開けるか
+
+    Windowsでは書き込み中のファイルを書き込みモードで開けない．
+    それ以外では，書き込み側がflockでロックしているときにロックを取れない．
+    flockは読み込みモードで開いたファイルにも使えるため，書き込み権限は不要とする．
+    読み取り専用のファイルなど，権限がなくて開けないときは，書き込み中ではないとみなす．
+
+    Args:
+        path (str): ファイルパス
+
+    Returns:
+        bool: 開けるときはTrue
+    """
+    try:
+        import fcntl
+    except ImportError:
+        fcntl = None
+
+    try:
+        if fcntl is None:
+            # 読み取り専用のファイルは書き込まれていない
+            if not os.access(path, os.W_OK):
+                return True
+            with open(path, 'rb+'):
+                return True
+        with open(path, 'rb') as f:
+            try:
+                fcntl.flock(f.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError as e:
+                if e.errno in (errno.EWOULDBLOCK, errno.EAGAIN):
+                    return False
+                # ロックに対応していないファイルシステムでは，ファイルサイズと更新日時だけで判断する
+                return True
+            fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+            return True
+    except PermissionError:
+        # 書き込み中のファイルを開けないのはWindowsだけで，それ以外は権限の問題とみなす
+        return fcntl is not None
+    except OSError:
+        return False
+
+
+class StabilityGate:
+    """書き込み完了の待機クラス
+
+    作成，更新，移動のイベントを同じファイルごとにまとめ，
+    ファイルサイズと更新日時が`quiet_period`秒変わらず，
+    排他的に開けるようになったときに`on_stable`を呼び出す．
+
+    Attributes:
+        on_stable (callable): 書き込みが終わったファイルパスを受け取る関数
+        quiet_period (float): ファイルサイズと更新日時が変わらない必要がある秒数
+        poll_interval (float): ファイルの状態を確認する間隔
+    """
+
+    def __init__(self, on_stable, quiet_period=2.0, poll_interval=0.5):
+        self.on_stable = on_stable
+        self.quiet_period = quiet_period
+        self.poll_interval = poll_interval
+        # ファイルパスごとに，最後に確認した(ファイルサイズ, 更新日時)と，最後に変化した時刻を保持する
+        self._pending = {}
+        # 書き込みが終わり，`on_stable`を呼び出している途中のファイル数
+        self._dispatching = 0
+        self._condition = threading.Condition()
+        self._closed = False
+        self._thread = threading.Thread(
+            target=self._run,
+            name='book_maker_stability_gate',
+            daemon=True
+        )
+        self._thread.start()
+
+    def notify(self, path: str) -> bool:
+        """ファイルのイベントを通知
+
+        同じファイルのイベントは一つにまとめる．
+
+        Args:
+            path (str): ファイルパス
+
+        Returns:
+            bool: 新たに待機を始めたときはTrue，すでに待機中のときはFalse
+        """
+        with self._condition:
+            if self._closed:
+                return False
+            is_new = path not in self._pending
+            # イベントがあったときは，書き込みが続いているとみなす
+            signature = self._pending[path][0] if not is_new else None
+            self._pending[path] = (signature, time.monotonic())
+            self._condition.notify_all()
+            return is_new
+
+    def is_stable(self, path: str) -> bool:
+        """ファイルの書き込みが終わっているか
+
+        待機せずに，更新日時から`quiet_period`秒経っていて，排他的に開けるかを確認する．
+        起動時にすでにあるファイルを，待機せずに処理してよいかの判断に使う．
+
+        Args:
+            path (str): ファイルパス
+
+        Returns:
+            bool: 書き込みが終わっているときはTrue
+        """
+        try:
+            mtime = os.stat(path).st_mtime
+        except OSError:
+            return False
+        return time.time() - mtime >= self.quiet_period and _can_open_exclusively(path)
+
+    def wait_until_empty(self, timeout=None) -> bool:
+        """待機中のファイルがなくなるまで待つ
+
+        書き込みが終わったファイルは，`on_stable`の呼び出しが終わるまで待つ．
+
+        Args:
+            timeout (float): 待つ最大秒数．Noneのときは無期限に待つ
+
+        Returns:
+            bool: 待機中のファイルがなくなったか，待機を終了したときはTrue，タイムアウトしたときはFalse
+        """
+        with self._condition:
+            return self._condition.wait_for(
+                lambda: self._closed or (not self._pending and not self._dispatching),
+                timeout
+            )
+
+    def pending_count(self) -> int:
+        """待機中のファイル数
+
+        Returns:
+            int: 待機中のファイル数
+        """
+        with self._condition:
+            return len(self._pending)
+
+    def close(self) -> None:
+        """待機を終了
+
+        待機中のファイルは投入しない．
+
+        """
+        with self._condition:
+            self._closed = True
+            self._pending.clear()
+            self._condition.notify_all()
+        self._thread.join()
+
+    def _check(self) -> list:
+        """待機中のファイルの状態を確認
+
+        Returns:
+            list[str]: 書き込みが終わったファイルパスのリスト
+        """
+        now = time.monotonic()
+        stable_paths = []
+        with self._condition:
+            pending = list(self._pending.items())
+
+        for path, (signature, last_change) in pending:
+            try:
+                stat = os.stat(path)
+                current = (stat.st_size, stat.st_mtime_ns)
+            except OSError:
+                # 削除されたり，移動されたりしたファイルは待機をやめる
+                current = None
+
+            with self._condition:
+                if path not in self._pending or self._pending[path][1] != last_change:
+                    # 確認している間にイベントがあった
+                    continue
+                if current is None:
+                    del self._pending[path]
+                    self._condition.notify_all()
+                elif current != signature:
+                    self._pending[path] = (current, now)
+                elif now - last_change >= self.quiet_period and _can_open_exclusively(path):
+                    del self._pending[path]
+                    self._dispatching += 1
+                    stable_paths.append(path)
+        return stable_paths
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._pending and not self._closed:
+                    self._condition.wait()
+                if self._closed:
+                    return
+                self._condition.wait(self.poll_interval)
+                if self._closed:
+                    return
+
+            for path in self._check():
+                try:
+                    self.on_stable(path)
+                finally:
+                    with self._condition:
+                        self._dispatching -= 1
+                        self._condition.notify_all()
@@ -6,16 +6,359 @@
 
 
 import os
-import time
+import errno
 import shutil
+import fnmatch
+import weakref
 import datetime
+import tempfile
+import itertools
 import threading
-import subprocess
+from collections import namedtuple
+from concurrent.futures import wait as wait_futures
 from watchdog.observers import Observer
+from watchdog.observers.polling import PollingObserver
 from watchdog.events import PatternMatchingEventHandler
-from logic.isbn_from_pdf import get_isbn_from_pdf, NoSuchISBNException
-from logic.isbn_to_info import book_info_from_google, book_info_from_openbd, NoSuchBookInfoException
+from logic.isbn_from_pdf import NoSuchISBNException
+from logic.isbn_to_info import book_info_from_google, BookInfo, GOOGLE_RATE_LIMITER
+from logic.rate_limiter import configure_rate_limiter, RateLimitedException
+from logic.openbd_batcher import OpenBDBatcher
+from logic.book_info_resolver import BookInfoResolver, Provider
+from logic.book_info_cache import BookInfoCache
+from logic.local_index import LocalBookIndex
+from logic.isbn_result_cache import IsbnResultCache
+from logic.pdf_fingerprint import fingerprint as pdf_fingerprint
+from logic.extraction_stats import ExtractionStats
+from logic.strategy_planner import StrategyPlanner, document_features, DEFAULT_STRATEGIES
+from logic.job_journal import JobJournal, JobState
+from logic.http_client import configure_http_client
+from logic.metrics import (
+    MetricsRegistry,
+    MetricsServer,
+    MetricsSnapshotWriter,
+    collect_spans,
+    current_collector,
+    add_spans,
+    span
+)
 from log_constants import Message, LogStatus
+from worker_pool import WorkerPool
+from stability_gate import StabilityGate
+from app_constants import (
+    PROCESS_WORKERS,
+    IO_WORKERS,
+    BOOK_INFO_CACHE_PATH,
+    BOOK_INFO_CACHE_TTL,
+    BOOK_INFO_CACHE_NEGATIVE_TTL,
+    BOOK_INFO_CACHE_MAX_ENTRIES,
+    LOCAL_INDEX_PATH,
+    HTTP_CONNECT_TIMEOUT,
+    HTTP_READ_TIMEOUT,
+    HTTP_MAX_RETRIES,
+    HTTP_BACKOFF,
+    HTTP_MAX_BACKOFF,
+    HTTP_POOL_CONNECTIONS,
+    HTTP_POOL_MAXSIZE,
+    OPENBD_BATCH_WINDOW,
+    OPENBD_BATCH_MAX_SIZE,
+    BOOK_INFO_PREFERRED_SOURCE,
+    BOOK_INFO_PREFERRED_GRACE,
+    BOOK_INFO_RESOLVE_TIMEOUT,
+    ISBN_RESULT_CACHE_PATH,
+    ISBN_RESULT_CACHE_MAX_ENTRIES,
+    ISBN_CANDIDATE_LIMIT,
+    PDF_FINGERPRINT_FULL_HASH,
+    EXTRACTION_STATS_PATH,
+    STRATEGY_STATS_PATH,
+    STRATEGY_PINS,
+    STRATEGY_SKIP_AFTER,
+    STRATEGY_SKIP_RATE,
+    STRATEGY_EXPLORE_RATE,
+    BACKLOG_CONCURRENCY,
+    JOB_JOURNAL_PATH,
+    JOB_JOURNAL_RETENTION,
+    STABILITY_QUIET_PERIOD,
+    STABILITY_POLL_INTERVAL,
+    WATCH_POLL_INTERVAL,
+    METRICS_PORT,
+    METRICS_HOST,
+    METRICS_SNAPSHOT_PATH,
+    METRICS_SNAPSHOT_INTERVAL,
+    STOP_DRAIN_TIMEOUT,
+    GOOGLE_RATE_LIMIT,
+    GOOGLE_RATE_BURST,
+    GOOGLE_MIN_RATE,
+    GOOGLE_DAILY_QUOTA,
+    GOOGLE_RATE_LIMIT_MAX_WAIT,
+    RATE_LIMIT_DB_PATH,
+    RATE_LIMIT_MAX_DEFER,
+    DEFERRED_RESUBMIT_INTERVAL
+)
+
+
+class StopMode:
+    """監視の終了方法
+
+    Attributes:
+        DRAIN: 処理中のファイルを期限まで待ち，終わらないものは次の段階の前で止める
+        IMMEDIATE: 処理中のファイルを待たずに止める
+    """
+    DRAIN = 'drain'
+    IMMEDIATE = 'immediate'
+
+
+"""監視を終了したときの処理の件数
+
+中断された処理は処理の記録に残り，次に監視を始めたときに再開する．
+
+Attributes:
+    completed (int): 終了を待つ間に終わった処理の数
+    cancelled (int): 始まる前に取り消した処理と，段階の間で止めた処理の数
+    pending (int): 期限までに止まらず，実行中のまま残った処理の数
+"""
+StopReport = namedtuple('StopReport', [
+    'completed',
+    'cancelled',
+    'pending'
+])
+
+# 段階の間で止めた処理の結果
+CANCELLED = 'cancelled'
+# 流量制限にかかり，後回しにした処理の結果
+DEFERRED = 'deferred'
+
+"""一つのファイルの処理結果
+
+Attributes:
+    path (str): 処理対象ファイルパス
+    outcome (str): 最後の処理の状態．段階の間で止めたときは`CANCELLED`，
+        後回しにしたときは`DEFERRED`，例外が発生したときは'error'
+    isbn (str): ISBNコード
+    strategy (str): ISBNコードを取得した手法
+    source (str): 本の情報を取得したAPI
+    filename (str): 変更後のファイル名
+    file_size (int): ファイルサイズ
+    page_count (int): 総ページ数
+    seconds (float): 処理全体の実行時間
+    stages (dict): 段階の名前ごとの実行時間の合計
+    error (str): 発生した例外
+"""
+JobOutcome = namedtuple('JobOutcome', [
+    'path',
+    'outcome',
+    'isbn',
+    'strategy',
+    'source',
+    'filename',
+    'file_size',
+    'page_count',
+    'seconds',
+    'stages',
+    'error'
+])
+
+"""監視するディレクトリ
+
+Attributes:
+    input_path (str): 入力ディレクトリ
+    output_path (str): 出力ディレクトリ
+    extensions (list[str]): 拡張子パターン．Noneのときは`Watcher`の拡張子パターンを使う
+    recursive (bool): サブディレクトリも対象とするか
+"""
+WatchRoot = namedtuple('WatchRoot', [
+    'input_path',
+    'output_path',
+    'extensions',
+    'recursive'
+], defaults=[None, False])
+
+
+# 移動先のファイルパスごとのロック．使われなくなったロックは捨てる
+_destination_locks = weakref.WeakValueDictionary()
+_destination_locks_lock = threading.Lock()
+
+
+def _destination_lock(path):
+    """移動先のファイルパスのロックを取得
+
+    全ての入力ディレクトリのハンドラーで共有する．
+
+    Args:
+        path (str): 移動先のファイルパス
+
+    Returns:
+        :obj:`threading.Lock`: ロック
+    """
+    key = os.path.normcase(os.path.abspath(path))
+    with _destination_locks_lock:
+        lock = _destination_locks.get(key)
+        if lock is None:
+            lock = _destination_locks[key] = threading.Lock()
+        return lock
+
+
+def _move_exclusively(src_path, dest_path) -> bool:
+    """移動先に同じファイル名のものがないときだけファイルを移動
+
+    移動先のファイル名を`O_EXCL`で作成して確保してから置き換えるため，
+    同時に同じファイル名へ移動する処理や，別のプロセスのファイルを上書きしない．
+
+    Args:
+        src_path (str): 移動対象ファイルパス
+        dest_path (str): 移動先のファイルパス
+
+    Returns:
+        bool: 移動したときはTrue，移動先に同じファイル名のものがあるときはFalse
+    """
+    with _destination_lock(dest_path):
+        try:
+            fd = os.open(dest_path, os.O_WRONLY | os.O_CREAT | os.O_EXCL)
+        except FileExistsError:
+            return False
+        os.close(fd)
+        try:
+            try:
+                os.replace(src_path, dest_path)
+            except OSError as e:
+                if e.errno != errno.EXDEV:
+                    raise
+                # 別のファイルシステムへは，同じディレクトリの一時ファイルに複製してから置き換える
+                fd, part_path = tempfile.mkstemp(dir=os.path.dirname(dest_path), prefix='.', suffix='.part')
+                os.close(fd)
+                try:
+                    shutil.copy2(src_path, part_path)
+                    os.replace(part_path, dest_path)
+                except BaseException:
+                    if os.path.exists(part_path):
+                        os.remove(part_path)
+                    raise
+                os.remove(src_path)
+        except BaseException:
+            # 移動できなかったときは，確保したファイル名を解放する．元のファイルは残っている
+            try:
+                os.remove(dest_path)
+            except OSError:
+                pass
+            raise
+        return True
+
+
+def _move_to_unique_path(src_path, dest_dir, basename) -> str:
+    """ファイルを重ならないファイル名で移動
+
+    同じファイル名のものがあるときは，`name (1).pdf`のように番号を付ける．
+
+    Args:
+        src_path (str): 移動対象ファイルパス
+        dest_dir (str): 移動先のディレクトリ
+        basename (str): 移動後のファイル名
+
+    Returns:
+        str: 移動後のファイルパス
+    """
+    stem, extension = os.path.splitext(basename)
+    for number in itertools.count():
+        name = basename if number == 0 else f'{stem} ({number}){extension}'
+        dest_path = os.path.join(dest_dir, name)
+        if _move_exclusively(src_path, dest_path):
+            return dest_path
+
+
+class JobCancelledException(Exception):
+    """処理を止めたときの例外クラス
+
+    監視を終了するときに，処理の段階の間で投げられる例外クラス．
+
+    """
+    pass
+
+
+def _create_book_info_cache():
+    """設定値を使って本の情報のキャッシュを作成
+
+    Returns:
+        :obj:`BookInfoCache`: 本の情報のキャッシュ
+    """
+    return BookInfoCache(
+        db_path=BOOK_INFO_CACHE_PATH,
+        ttl=BOOK_INFO_CACHE_TTL,
+        negative_ttl=BOOK_INFO_CACHE_NEGATIVE_TTL,
+        max_entries=BOOK_INFO_CACHE_MAX_ENTRIES
+    )
+
+
+def _create_local_index():
+    """設定値を使って本の情報の索引を開く
+
+    Returns:
+        :obj:`LocalBookIndex`: 本の情報の索引．索引のファイルがないときはNoneを返す．
+    """
+    if not os.path.isfile(LOCAL_INDEX_PATH):
+        return None
+    return LocalBookIndex(LOCAL_INDEX_PATH)
+
+
+def _create_strategy_planner(pins=None):
+    """設定値を使ってISBNコードを取得する手法の計画クラスを作成
+
+    Args:
+        pins (dict): 設定値に加えて，入力ディレクトリごとに固定する手法のリスト
+
+    Returns:
+        :obj:`StrategyPlanner`: ISBNコードを取得する手法の計画クラス
+    """
+    return StrategyPlanner(
+        db_path=STRATEGY_STATS_PATH,
+        pins={**STRATEGY_PINS, **(pins or {})},
+        skip_after=STRATEGY_SKIP_AFTER,
+        skip_rate=STRATEGY_SKIP_RATE,
+        explore_rate=STRATEGY_EXPLORE_RATE
+    )
+
+
+def _create_isbn_result_cache():
+    """設定値を使ってISBNコードの取得結果のキャッシュを作成
+
+    Returns:
+        :obj:`IsbnResultCache`: ISBNコードの取得結果のキャッシュ
+    """
+    return IsbnResultCache(
+        db_path=ISBN_RESULT_CACHE_PATH,
+        max_entries=ISBN_RESULT_CACHE_MAX_ENTRIES
+    )
+
+
+def _create_openbd_batcher():
+    """設定値を使ってOPENBDへまとめて問い合わせるクラスを作成
+
+    Returns:
+        :obj:`OpenBDBatcher`: OPENBDへまとめて問い合わせるクラス
+    """
+    return OpenBDBatcher(
+        window=OPENBD_BATCH_WINDOW,
+        max_batch_size=OPENBD_BATCH_MAX_SIZE
+    )
+
+
+def _create_resolver(openbd_batcher):
+    """設定値を使って各APIへ同時に問い合わせるクラスを作成
+
+    Args:
+        openbd_batcher (obj: `OpenBDBatcher`): OPENBDへまとめて問い合わせるクラス
+
+    Returns:
+        :obj:`BookInfoResolver`: 各APIへ同時に問い合わせるクラス
+    """
+    return BookInfoResolver(
+        providers=[
+            Provider('Google', book_info_from_google),
+            Provider('openBD', openbd_batcher.submit, returns_future=True),
+        ],
+        preferred=BOOK_INFO_PREFERRED_SOURCE,
+        grace=BOOK_INFO_PREFERRED_GRACE,
+        timeout=BOOK_INFO_RESOLVE_TIMEOUT,
+        max_workers=IO_WORKERS
+    )
 
 
 class Handler(PatternMatchingEventHandler):
@@ -28,9 +371,24 @@ class Handler(PatternMatchingEventHandler):
         input_path (str): 入力ディレクトリ
         output_path (str): 出力ディレクトリ
         patterns (list[str]): 拡張子パターン
+        pool (obj: `WorkerPool`): 処理を実行するワーカープール
+        book_info_cache (obj: `BookInfoCache`): 本の情報のキャッシュ
+        local_index (obj: `LocalBookIndex`): 本の情報の索引．Noneのときは使わない
+        resolver (obj: `BookInfoResolver`): 各APIへ同時に問い合わせるクラス
+        isbn_result_cache (obj: `IsbnResultCache`): ISBNコードの取得結果のキャッシュ
+        extraction_stats (obj: `ExtractionStats`): ISBNコード取得の集計
+        planner (obj: `StrategyPlanner`): ISBNコードを取得する手法の計画クラス
+        journal (obj: `JobJournal`): 処理の記録
+        metrics (obj: `MetricsRegistry`): 処理の計測結果の集計
+        on_job_done (callable): ファイルの処理が終わるたびに`JobOutcome`を受け取る関数
+        recursive (bool): 入力ディレクトリのサブディレクトリも対象とするか
+        exclude_dirs (list[str]): サブディレクトリも対象とするときに除くディレクトリ．出力ディレクトリは常に除く
     """
 
-    def __init__(self, queue, input_path, output_path, patterns=None):
+    def __init__(self, queue, input_path, output_path, patterns=None, pool=None,
+                 book_info_cache=None, resolver=None, isbn_result_cache=None,
+                 extraction_stats=None, journal=None, metrics=None, on_job_done=None,
+                 local_index=None, planner=None, recursive=False, exclude_dirs=()):
         if patterns is None:
             patterns = ['*.pdf']
         super(Handler, self).__init__(patterns=patterns,
@@ -38,6 +396,32 @@ class Handler(PatternMatchingEventHandler):
                                       case_sensitive=False)
         self.queue = queue
         self.input_path = input_path
+        self.recursive = recursive
+        # 処理中のファイルパスと，その処理結果
+        self._in_flight = {}
+        self._in_flight_lock = threading.Lock()
+        # 処理中のファイルと後回しにしたファイルがなくなったことを通知する
+        self._idle = threading.Condition(self._in_flight_lock)
+        # 流量制限にかかり，後回しにしたファイルパスと，再び投入するタイマー
+        self._deferred = {}
+        self._cancelled = threading.Event()
+        self.gate = StabilityGate(
+            on_stable=self._on_stable,
+            quiet_period=STABILITY_QUIET_PERIOD,
+            poll_interval=STABILITY_POLL_INTERVAL
+        )
+        self.pool = pool if pool is not None else WorkerPool()
+        self.book_info_cache = book_info_cache if book_info_cache is not None else _create_book_info_cache()
+        self.local_index = local_index
+        self.resolver = resolver if resolver is not None else _create_resolver(_create_openbd_batcher())
+        self.isbn_result_cache = isbn_result_cache if isbn_result_cache is not None else _create_isbn_result_cache()
+        self.extraction_stats = extraction_stats if extraction_stats is not None else ExtractionStats(EXTRACTION_STATS_PATH)
+        self.planner = planner if planner is not None else _create_strategy_planner()
+        self.journal = journal if journal is not None else JobJournal(JOB_JOURNAL_PATH)
+        self.metrics = metrics if metrics is not None else MetricsRegistry()
+        self.on_job_done = on_job_done
+        # 処理中に発生した例外を，処理結果を作るまで保持する
+        self._errors = {}
 
         # 入力ディレクトリと出力ディレクトリが同じとき，
         # 出力ディレクトリとして現在時刻を使って新たにディレクトリを作成する
@@ -48,163 +432,764 @@ class Handler(PatternMatchingEventHandler):
             )
         else:
             self.output_path = output_path
+        # 自身で作成した出力ディレクトリだけを後始末で削除する
+        self._created_output_path = not os.path.isdir(self.output_path)
         os.makedirs(self.output_path, exist_ok=True)
 
         # tmpディレクトリを出力ディレクトリ内部に作成する
         self.tmp_path = os.path.join(self.output_path, 'tmp')
         os.makedirs(self.tmp_path, exist_ok=True)
 
-    def __del__(self):
+        # 出力ディレクトリに移動したファイルを，再び処理しないように除く
+        # 入力ディレクトリの外にあるディレクトリは，除かなくても対象にならない
+        input_prefix = os.path.join(os.path.normcase(os.path.abspath(input_path)), '')
+        self.exclude_dirs = [
+            exclude_dir for exclude_dir in (
+                os.path.normcase(os.path.abspath(path)) for path in [self.output_path, *exclude_dirs]
+            )
+            if exclude_dir.startswith(input_prefix)
+        ]
+
+    def close(self):
         """後処理を行う
 
         出力ディレクトリの中に作成したtmpディレクトリの後始末や，
-        出力ディレクトリ自体の後始末を行う．
+        自身で作成した出力ディレクトリの後始末を行う．
+        処理中のファイルが残っているときは，ディレクトリを使い続けるため何もしない．
+
+        """
+        with self._in_flight_lock:
+            if self._in_flight:
+                return
+
+        try:
+            # tmpディレクトリが空のとき，tmpディレクトリを削除する
+            if not os.listdir(self.tmp_path):
+                os.rmdir(self.tmp_path)
+
+            # 自身で作成した出力ディレクトリが空のとき，出力ディレクトリを削除する
+            if self._created_output_path and not os.listdir(self.output_path):
+                os.rmdir(self.output_path)
+        except OSError:
+            # 他のプロセスが使っているときなどは残す
+            pass
+
+    def cancel(self):
+        """処理中のファイルを止める
+
+        処理中のファイルは次の段階の前で止まり，終わった段階までが処理の記録に残る．
+        これから投入されるファイルや，後回しにしたファイルは処理しない．
+
+        """
+        self._cancelled.set()
+        with self._idle:
+            for timer in self._deferred.values():
+                timer.cancel()
+            self._deferred.clear()
+            self._idle.notify_all()
+
+    def wait_until_idle(self, timeout=None) -> bool:
+        """処理中のファイルと後回しにしたファイルがなくなるまで待つ
+
+        処理を止めたときも待つのをやめる．
+
+        Args:
+            timeout (float): 待つ最大秒数．Noneのときは無期限に待つ
+
+        Returns:
+            bool: 待つのをやめたときはTrue，タイムアウトしたときはFalse
+        """
+        with self._idle:
+            return self._idle.wait_for(
+                lambda: self._cancelled.is_set() or (not self._in_flight and not self._deferred),
+                timeout
+            )
+
+    def in_flight_futures(self) -> list:
+        """処理中のファイルの処理結果を取得
 
+        Returns:
+            list[:obj:`concurrent.futures.Future`]: 処理結果のリスト
         """
-        # tmpディレクトリが空のとき，tmpディレクトリを削除する
-        tmp_files_len = len(os.listdir(self.tmp_path))
-        if tmp_files_len == 0:
-            os.rmdir(self.tmp_path)
+        with self._in_flight_lock:
+            return [future for future in self._in_flight.values() if future is not None]
 
-        # 出力ディレクトリが空のとき，出力ディレクトリを削除する
-        output_files_len = len(os.listdir(self.output_path))
-        if output_files_len == 0:
-            os.rmdir(self.output_path)
+    def _raise_if_cancelled(self):
+        """処理を止めるときに例外を投げる
 
-    def _book_info_from_each_api(self, isbn, event_src_path):
+        Raises:
+            JobCancelledException: 処理を止めるときに発生
+        """
+        if self._cancelled.is_set():
+            raise JobCancelledException()
+
+    def _book_info_from_each_api(self, isbn):
         """各APIを使って本の情報を取得
 
-        Google Books API，OPENBDを使って，本の情報を取得する．
+        本の情報の索引にあるときは索引を使い，次にキャッシュにあるときはキャッシュを使い，
+        どちらにもないときはGoogle Books API，OPENBDへ同時に問い合わせて，本の情報を取得する．
 
         Args:
             isbn (str): ISBNコード
-            event_src_path (str): 情報を取得する本のファイルパス
+
+        Raises:
+            RateLimitedException: 流量制限にかかり，本の情報があるか分からないときに発生
+
+        Returns:
+            tuple: 本の情報と，取得したAPI．見つからなかったときは(None, None)を返す．
         """
-        google_book_info = None
-        try:
-            google_book_info = book_info_from_google(isbn)
-        except NoSuchBookInfoException as e:
-            self.queue.put(Message(LogStatus.WARNING, e.args[0]))
+        if self.local_index is not None:
+            with span('local_index'):
+                book_info = self.local_index.get(isbn)
+            if book_info is not None:
+                self.queue.put(
+                    Message(
+                        LogStatus.INFO,
+                        f'<LocalIndex> Title: {book_info.title}, Author: {book_info.author}.'
+                    )
+                )
+                return book_info, 'local_index'
+
+        cache_entry = self.book_info_cache.get(isbn)
+        if cache_entry is not None:
+            if cache_entry.book_info is None:
+                self.queue.put(
+                    Message(
+                        LogStatus.WARNING,
+                        f'<Cache> No book info for ISBN: {isbn}.'
+                    )
+                )
+                return None, None
 
-        if google_book_info:
             self.queue.put(
                 Message(
                     LogStatus.INFO,
-                    f'<Google> Title: {google_book_info.title}, Author: {google_book_info.author}.'
+                    f'<Cache:{cache_entry.source}> Title: {cache_entry.book_info.title}, '
+                    f'Author: {cache_entry.book_info.author}.'
                 )
             )
-            self._rename_and_move_pdf(google_book_info, event_src_path)
-            return
+            return cache_entry.book_info, cache_entry.source
 
-        openbd_book_info = None
-        try:
-            openbd_book_info = book_info_from_openbd(isbn)
-        except NoSuchBookInfoException as e:
-            self.queue.put(Message(LogStatus.WARNING, e.args[0]))
+        resolved = self.resolver.resolve(isbn)
+        add_spans(resolved.spans)
+        for error in resolved.errors:
+            self.queue.put(Message(LogStatus.WARNING, str(error)))
 
-        if openbd_book_info:
+        if resolved.book_info:
             self.queue.put(
                 Message(
                     LogStatus.INFO,
-                    f'<openBD> Title: {openbd_book_info.title}, Author: {openbd_book_info.author}.'
+                    f'<{resolved.source}> Title: {resolved.book_info.title}, '
+                    f'Author: {resolved.book_info.author}.'
                 )
             )
-            self._rename_and_move_pdf(openbd_book_info, event_src_path)
+            self.book_info_cache.put(isbn, resolved.book_info, resolved.source)
+            return resolved.book_info, resolved.source
 
-    def _rename_and_move_pdf(self, book_info, event_src_path):
-        """本の情報を使ってファイル名を変更
+        # APIがエラーを返したときは，本の情報がないとキャッシュしない
+        if not resolved.errors:
+            self.book_info_cache.put_negative(isbn)
+        return None, None
 
-        本の情報を使ってファイル名を変更し，出力ディレクトリに移動させる．
+    def _renamed_path(self, book_info):
+        """本の情報を使った，出力ディレクトリでのファイルパスを取得
 
         Args:
             book_info (obj: `BookInfo`): 本の情報
-            event_src_path (str): リネーム対象ファイルパス
+
+        Returns:
+            str: 変更後のファイルパス
         """
-        # ファイル名を本の情報を使って変更する
-        pdf_rename_path = os.path.join(
-            os.path.dirname(event_src_path),
-            f'[{book_info.author}]{book_info.title}.pdf'
-        )
-        os.rename(event_src_path, pdf_rename_path)
+        return os.path.join(self.output_path, f'[{book_info.author}]{book_info.title}.pdf')
 
-        # 出力ディレクトリに同じファイル名のものがあるとき，tmpフォルダに移動させる
-        output_path_with_basename = os.path.join(
-            self.output_path,
-            os.path.basename(pdf_rename_path)
-        )
-        if os.path.isfile(output_path_with_basename):
-            shutil.move(pdf_rename_path, self.tmp_path)
-            self.queue.put(
-                Message(
-                    LogStatus.WARNING,
-                    f'{output_path_with_basename} already exists!\n'
-                    f'Move {os.path.basename(pdf_rename_path)} to {self.tmp_path}.'))
-        else:
-            shutil.move(pdf_rename_path, self.output_path)
+    def _move_pdf(self, src_path, basename=None) -> str:
+        """ファイルを出力ディレクトリに移動
+
+        同じ本の情報になるファイルを同時に処理しても上書きしないように，
+        移動先のファイル名を確保してから移動する．
+
+        Args:
+            src_path (str): 移動対象ファイルパス
+            basename (str): 移動後のファイル名．Noneのときは元のファイル名
+
+        Returns:
+            str: 移動後のファイルパス
+        """
+        basename = basename or os.path.basename(src_path)
+        output_path_with_basename = os.path.join(self.output_path, basename)
+        if _move_exclusively(src_path, output_path_with_basename):
             self.queue.put(
                 Message(
                     LogStatus.INFO,
-                    f'Move {os.path.basename(pdf_rename_path)} to {self.output_path}.'
+                    f'Move {basename} to {self.output_path}.'
                 )
             )
+            return output_path_with_basename
+
+        # 出力ディレクトリに同じファイル名のものがあるとき，tmpフォルダに移動させる
+        moved_path = _move_to_unique_path(src_path, self.tmp_path, basename)
+        self.queue.put(
+            Message(
+                LogStatus.WARNING,
+                f'{output_path_with_basename} already exists!\n'
+                f'Move {basename} to {moved_path}.'))
+        return moved_path
 
     def on_created(self, event):
         """作成イベント感知メソッド
 
         `__init__`で定義したパターンに従ったファイルが作成されたイベントを感知し，
-        ISBNコードを使ってファイル名を正しい本の題名に変更させる．
+        書き込みが終わるのを待ってからワーカープールに処理を投入する．
+        監視スレッドを塞がないように，ここでは待機を始めるだけにする．
 
         Args:
             event (obj: `watchdog.events.DirCreatedEvent` or `watchdog.events.FileCreatedEvent`): イベント情報
         """
-        shell_path = os.path.join(
-            os.path.dirname(__file__),
-            './shell/getISBN.sh'
+        self._notify(event.src_path)
+
+    def on_modified(self, event):
+        """更新イベント感知メソッド
+
+        書き込み中のファイルは更新イベントが続くため，待機を延長する．
+
+        Args:
+            event (obj: `watchdog.events.FileModifiedEvent`): イベント情報
+        """
+        self._notify(event.src_path)
+
+    def on_moved(self, event):
+        """移動イベント感知メソッド
+
+        入力ディレクトリに移動されてきたファイルは，作成されたファイルとして扱う．
+
+        Args:
+            event (obj: `watchdog.events.FileMovedEvent`): イベント情報
+        """
+        dest_path = os.path.abspath(event.dest_path)
+        if not self._is_watched(dest_path):
+            return
+        if not any(fnmatch.fnmatchcase(os.path.basename(dest_path).lower(), pattern.lower())
+                   for pattern in self.patterns):
+            return
+        self._notify(dest_path)
+
+    def _is_watched(self, path) -> bool:
+        """ファイルが監視の対象か
+
+        Args:
+            path (str): ファイルパス
+
+        Returns:
+            bool: 入力ディレクトリの直下にあるとき，
+                サブディレクトリも対象とするときは除くディレクトリ以外の下にあるときはTrue
+        """
+        path = os.path.normcase(os.path.abspath(path))
+        input_path = os.path.normcase(os.path.abspath(self.input_path))
+        if not self.recursive:
+            return os.path.dirname(path) == input_path
+        if not path.startswith(os.path.join(input_path, '')):
+            return False
+        return not any(
+            path == exclude_dir or path.startswith(os.path.join(exclude_dir, ''))
+            for exclude_dir in self.exclude_dirs
         )
-        event_src_path = event.src_path
-        self.queue.put(
-            Message(
-                LogStatus.INFO,
-                f'File detected! {event_src_path}.'))
-        cmd = f'{shell_path} {event_src_path}'
-        result = subprocess.run(
-            cmd,
-            shell=True,
-            capture_output=True,
-            text=True
+
+    def _notify(self, event_src_path):
+        """書き込みの完了を待つファイルを通知
+
+        Args:
+            event_src_path (str): ファイルパス
+        """
+        event_src_path = os.path.abspath(event_src_path)
+        if not self._is_watched(event_src_path):
+            return
+        # 処理中のファイルは無視する
+        with self._in_flight_lock:
+            if event_src_path in self._in_flight:
+                return
+        if self.gate.notify(event_src_path):
+            self.queue.put(
+                Message(
+                    LogStatus.INFO,
+                    f'File detected! {event_src_path}.'))
+
+    def _on_stable(self, event_src_path):
+        """書き込みが終わったファイルの処理を投入
+
+        Args:
+            event_src_path (str): ファイルパス
+        """
+        try:
+            self.submit(event_src_path)
+        except RuntimeError:
+            # ワーカープールが終了しているとき
+            pass
+
+    def submit(self, event_src_path):
+        """ワーカープールに処理を投入
+
+        同じファイルを二重に処理しないように，処理中のファイルは投入しない．
+
+        Args:
+            event_src_path (str): 処理対象ファイルパス
+
+        Returns:
+            :obj:`concurrent.futures.Future`: 処理結果．処理中のファイルのときはNoneを返す．
+        """
+        event_src_path = os.path.abspath(event_src_path)
+        with self._in_flight_lock:
+            if event_src_path in self._in_flight or self._cancelled.is_set():
+                return None
+            self._in_flight[event_src_path] = None
+        try:
+            # 複数の入力ディレクトリで共有するワーカープールに，ディレクトリごとに公平に投入する
+            future = self.pool.submit_fair(self.input_path, self._process_pdf, event_src_path)
+        except Exception:
+            with self._in_flight_lock:
+                self._in_flight.pop(event_src_path, None)
+            raise
+        with self._in_flight_lock:
+            if event_src_path in self._in_flight:
+                self._in_flight[event_src_path] = future
+        # 始まる前に取り消されたときも，処理中のファイルから取り除く
+        future.add_done_callback(lambda _: self._discard_in_flight(event_src_path, future))
+        return future
+
+    def _discard_in_flight(self, event_src_path, future):
+        """処理中のファイルから取り除く
+
+        Args:
+            event_src_path (str): 処理対象ファイルパス
+            future (obj: `concurrent.futures.Future`): 処理結果
+        """
+        with self._idle:
+            if self._in_flight.get(event_src_path) in (None, future):
+                self._in_flight.pop(event_src_path, None)
+            self._idle.notify_all()
+
+    def _defer(self, event_src_path, delay):
+        """流量制限にかかったファイルを，時間をおいて再び投入する
+
+        Args:
+            event_src_path (str): 処理対象ファイルパス
+            delay (float): 再び投入するまでの秒数
+        """
+        with self._idle:
+            if self._cancelled.is_set() or event_src_path in self._deferred:
+                return
+            self._start_retry_timer(event_src_path, delay)
+
+    def _start_retry_timer(self, event_src_path, delay):
+        """再び投入するタイマーを開始
+
+        `_idle`を取得した状態で呼び出す．
+
+        Args:
+            event_src_path (str): 処理対象ファイルパス
+            delay (float): 再び投入するまでの秒数
+        """
+        timer = threading.Timer(delay, self._retry_deferred, args=(event_src_path,))
+        timer.daemon = True
+        self._deferred[event_src_path] = timer
+        timer.start()
+
+    def _retry_deferred(self, event_src_path):
+        """後回しにしたファイルを再び投入
+
+        前の処理がまだ終わっておらず投入できなかったときは，時間をおいてもう一度投入する．
+
+        Args:
+            event_src_path (str): 処理対象ファイルパス
+        """
+        rejected = False
+        try:
+            # 後回しにしたファイルから取り除く前に投入し，処理中のファイルがない時間を作らない
+            rejected = self.submit(event_src_path) is None
+        except RuntimeError:
+            # ワーカープールが終了しているとき
+            pass
+        finally:
+            with self._idle:
+                self._deferred.pop(event_src_path, None)
+                if rejected and not self._cancelled.is_set():
+                    self._start_retry_timer(event_src_path, DEFERRED_RESUBMIT_INTERVAL)
+                self._idle.notify_all()
+
+    def existing_files(self):
+        """入力ディレクトリにすでにあるファイルを取得
+
+        監視していない間に置かれたファイルを処理するために使う．
+        サブディレクトリも対象とするときは，除くディレクトリ以外を辿る．
+
+        Returns:
+            list[str]: パターンに一致するファイルパスのリスト．更新日時が古い順に並べる．
+        """
+        patterns = [pattern.lower() for pattern in self.patterns]
+        paths = []
+        dirs = [self.input_path]
+        while dirs:
+            try:
+                entries = list(os.scandir(dirs.pop()))
+            except OSError:
+                # 辿っている間に削除されたディレクトリなどは読み飛ばす
+                continue
+            for entry in entries:
+                if entry.is_dir(follow_symlinks=False):
+                    if self.recursive and self._is_watched(os.path.join(entry.path, '')):
+                        dirs.append(entry.path)
+                    continue
+                if not entry.is_file():
+                    continue
+                if any(fnmatch.fnmatchcase(entry.name.lower(), pattern) for pattern in patterns):
+                    paths.append(entry.path)
+        return sorted(paths, key=os.path.getmtime)
+
+    def _process_pdf(self, event_src_path):
+        """PDFを処理し，計測結果を記録
+
+        Args:
+            event_src_path (str): 処理対象ファイルパス
+
+        Returns:
+            str: 最後の処理の状態．段階の間で止めたときは`CANCELLED`，
+                例外が発生したときはNoneを返す．
+        """
+        with collect_spans() as collector:
+            try:
+                collector.file_size = os.path.getsize(event_src_path)
+            except OSError:
+                pass
+            with span('total'):
+                state = self._process_pdf_once(event_src_path)
+        self.metrics.record(collector)
+        self.metrics.inc('book_maker_files_total', state=state or 'error')
+        with self._in_flight_lock:
+            error = self._errors.pop(event_src_path, None)
+        if self.on_job_done is not None:
+            self.on_job_done(self._job_outcome(event_src_path, state, collector, error))
+        return state
+
+    def _job_outcome(self, event_src_path, state, collector, error):
+        """処理結果を作成
+
+        Args:
+            event_src_path (str): 処理対象ファイルパス
+            state (str): 最後の処理の状態
+            collector (obj: `SpanCollector`): 処理中に集めたスパン
+            error (str): 発生した例外
+
+        Returns:
+            :obj:`JobOutcome`: 処理結果
+        """
+        job = self.journal.get(event_src_path)
+        stages = {}
+        seconds = None
+        for stage_span in collector.spans:
+            if stage_span.stage == 'total':
+                seconds = stage_span.seconds
+                continue
+            stages[stage_span.stage] = stages.get(stage_span.stage, 0.0) + stage_span.seconds
+        return JobOutcome(
+            path=event_src_path,
+            outcome=state or 'error',
+            isbn=job.isbn if job else None,
+            strategy=job.strategy if job else None,
+            source=job.source if job else None,
+            filename=os.path.basename(job.renamed_path) if job and job.renamed_path else None,
+            file_size=collector.file_size,
+            page_count=collector.page_count,
+            seconds=seconds,
+            stages=stages,
+            error=error
         )
+
+    def _process_pdf_once(self, event_src_path):
+        """PDFを処理
+
+        ISBNコードを使ってファイル名を正しい本の題名に変更させる．
+        I/Oスレッド上で実行され，ISBNコードの取得はプロセスワーカーで行う．
+        段階ごとに処理の記録を残し，中断された処理は終わっている段階を飛ばして再開する．
+
+        Args:
+            event_src_path (str): 処理対象ファイルパス
+
+        Returns:
+            str: 最後の処理の状態．段階の間で止めたときは`CANCELLED`，
+                後回しにしたときは`DEFERRED`，例外が発生したときはNoneを返す．
+        """
         try:
-            if result.returncode == 0:
-                # ISBNコードをシェルから取得
-                isbn = result.stdout.strip()
+            self._raise_if_cancelled()
+            job = self.journal.get(event_src_path)
+            if job is None or job.state in JobState.FINISHED or not self._can_resume(job):
+                job = self.journal.start(event_src_path)
+            elif job.state != JobState.DETECTED:
                 self.queue.put(
                     Message(
                         LogStatus.INFO,
-                        f'ISBN was found from shell: {isbn}.'
+                        f'Resume {os.path.basename(event_src_path)} from {job.state}.'
                     )
                 )
-                self._book_info_from_each_api(isbn, event_src_path)
 
+            if job.state == JobState.DETECTED:
+                job = self._extract_isbn(job)
+            if job.state == JobState.ISBN_EXTRACTED:
+                self._raise_if_cancelled()
+                job = self._resolve_book_info(job)
+            if job.state == JobState.METADATA_RESOLVED:
+                self._raise_if_cancelled()
+                job = self._rename_pdf(job)
+            if job.state == JobState.RENAMED:
+                with span('move'):
+                    moved_path = self._move_pdf(job.renamed_path)
+                job = self.journal.advance(event_src_path, JobState.MOVED, renamed_path=moved_path)
+            return job.state
+
+        except JobCancelledException:
+            # 終わった段階までが処理の記録に残り，次に監視を始めたときに再開する
+            return CANCELLED
+
+        except RateLimitedException as e:
+            # 流量制限にかかったときは本の情報がないとはせず，時間をおいて本の情報の取得から再開する
+            if e.retry_after <= RATE_LIMIT_MAX_DEFER:
+                # 前の処理が終わる前に再び投入しないように，少なくとも少し空ける
+                delay = max(DEFERRED_RESUBMIT_INTERVAL, e.retry_after)
+                self._defer(event_src_path, delay)
+                self.queue.put(
+                    Message(
+                        LogStatus.WARNING,
+                        f'{e.args[0]} Retry {os.path.basename(event_src_path)} in {delay:.0f}s.'
+                    )
+                )
             else:
-                # ISBNコードをバーコードから，または文字列から取得
-                isbn = get_isbn_from_pdf(event_src_path)
                 self.queue.put(
                     Message(
-                        LogStatus.INFO,
-                        f'ISBN was found from Python: {isbn}.'
+                        LogStatus.WARNING,
+                        f'{e.args[0]} {os.path.basename(event_src_path)} resumes on the next start.'
                     )
                 )
-                self._book_info_from_each_api(isbn, event_src_path)
+            return DEFERRED
 
         except NoSuchISBNException as e:
             # ISBNコードが見つからなかったとき
             self.queue.put(Message(LogStatus.WARNING, e.args[0]))
 
-            shutil.move(event_src_path, self.tmp_path)
+            with span('move'):
+                moved_path = _move_to_unique_path(
+                    event_src_path,
+                    self.tmp_path,
+                    os.path.basename(event_src_path)
+                )
+            self.journal.advance(event_src_path, JobState.NO_ISBN)
             self.queue.put(
                 Message(
                     LogStatus.WARNING,
-                    f'Move {os.path.basename(event_src_path)} to {self.tmp_path}.'))
+                    f'Move {os.path.basename(event_src_path)} to {moved_path}.'))
+            return JobState.NO_ISBN
+
+        except Exception as e:
+            # ワーカー上の例外は握りつぶされるため，ログに出力する
+            with self._in_flight_lock:
+                self._errors[event_src_path] = repr(e)
+            self.queue.put(
+                Message(
+                    LogStatus.ERROR,
+                    f'Failed to process {os.path.basename(event_src_path)}: {e!r}.'
+                )
+            )
+
+    def _can_resume(self, job):
+        """処理の記録から再開できるか
+
+        Args:
+            job (obj: `Job`): 処理の記録
+
+        Returns:
+            bool: 再開できるときはTrue
+        """
+        if job.state == JobState.RENAMED:
+            return bool(job.renamed_path) and os.path.isfile(job.renamed_path)
+        if job.state == JobState.METADATA_RESOLVED:
+            renamed_path = self._renamed_path(BookInfo(job.title, job.author))
+            return os.path.isfile(job.path) or os.path.isfile(renamed_path)
+        if job.state == JobState.ISBN_EXTRACTED:
+            # 同じファイル名で別のファイルが置かれたときは最初からやり直す
+            return os.path.isfile(job.path) and job.fingerprint == pdf_fingerprint(
+                job.path,
+                full_hash=PDF_FINGERPRINT_FULL_HASH
+            )
+        return os.path.isfile(job.path)
+
+    def _extract_isbn(self, job):
+        """ISBNコードを取得する段階
+
+        Args:
+            job (obj: `Job`): 処理の記録
+
+        Raises:
+            NoSuchISBNException: ISBNコードが見つからなかったときに発生
+
+        Returns:
+            :obj:`Job`: 更新後の処理の記録
+        """
+        event_src_path = job.path
+        with span('fingerprint'):
+            fingerprint = pdf_fingerprint(event_src_path, full_hash=PDF_FINGERPRINT_FULL_HASH)
+        cached = self.isbn_result_cache.get(fingerprint)
+        if cached is not None:
+            # 以前に処理したことのあるファイルは，ISBNコードの取得を省略する
+            self.queue.put(
+                Message(
+                    LogStatus.INFO,
+                    f'ISBN was found from cache ({cached.strategy}): {cached.isbn}.'
+                )
+            )
+            return self.journal.advance(
+                event_src_path,
+                JobState.ISBN_EXTRACTED,
+                fingerprint=fingerprint,
+                isbn=cached.isbn,
+                candidates=cached.isbn,
+                strategy=cached.strategy
+            )
+
+        # 入力ディレクトリと文書の特徴に合わせて，手法を試す順番を決める
+        with span('plan'):
+            # サブディレクトリのファイルも，監視する入力ディレクトリの記録と固定を使う
+            features = document_features(event_src_path, source_dir=self.input_path)
+            plan = self.planner.plan(features)
+        if plan.pinned or plan.skipped or plan.strategies != list(DEFAULT_STRATEGIES):
+            self.queue.put(
+                Message(
+                    LogStatus.INFO,
+                    f'Plan: {", ".join(plan.strategies)}'
+                    + (' (pinned)' if plan.pinned else '')
+                    + (f', skipped: {", ".join(plan.skipped)}' if plan.skipped else '')
+                    + '.'
+                )
+            )
+
+        result = self.pool.extract_isbn(event_src_path, plan.strategies, total_pages=features.page_count)
+        self.extraction_stats.record(result.stages)
+        self.planner.record(features, result.stages)
+        # プロセスワーカーで記録したスパンを合わせて集計する
+        add_spans(result.spans)
+        collector = current_collector()
+        if collector is not None:
+            collector.page_count = result.page_count
+        self.queue.put(
+            Message(
+                LogStatus.INFO,
+                'Stages: ' + ', '.join(
+                    f'{stage.stage} {stage.seconds:.2f}s{" (hit)" if stage.hit else ""}'
+                    for stage in result.stages
+                )
+            )
+        )
+        if result.isbn is None:
+            raise NoSuchISBNException(
+                f'Cannot get ISBN from {os.path.basename(event_src_path)}.'
+            )
+        self.isbn_result_cache.put(fingerprint, result.isbn, result.strategy)
+        self.queue.put(
+            Message(
+                LogStatus.INFO,
+                f'ISBN was found from {result.strategy}: {result.isbn}.'
+            )
+        )
+        candidates = [candidate.isbn for candidate in result.candidates[:ISBN_CANDIDATE_LIMIT]]
+        if len(candidates) > 1:
+            self.queue.put(
+                Message(
+                    LogStatus.INFO,
+                    'ISBN candidates: ' + ', '.join(
+                        f'{candidate.isbn} ({candidate.score:.1f})'
+                        for candidate in result.candidates[:ISBN_CANDIDATE_LIMIT]
+                    )
+                )
+            )
+        return self.journal.advance(
+            event_src_path,
+            JobState.ISBN_EXTRACTED,
+            fingerprint=fingerprint,
+            isbn=result.isbn,
+            candidates=','.join(candidates),
+            strategy=result.strategy
+        )
+
+    def _resolve_book_info(self, job):
+        """本の情報を取得する段階
+
+        ISBNコードの候補が複数あるときは，順位の高い順に本の情報が見つかるまで問い合わせる．
+
+        Args:
+            job (obj: `Job`): 処理の記録
+
+        Returns:
+            :obj:`Job`: 更新後の処理の記録
+        """
+        # 候補を記録する前の処理の記録は，ISBNコードだけを使う
+        candidates = job.candidates.split(',') if job.candidates else [job.isbn]
+        for isbn in candidates:
+            book_info, source = self._book_info_from_each_api(isbn)
+            if book_info is None:
+                continue
+            if isbn != job.isbn:
+                self.queue.put(
+                    Message(
+                        LogStatus.INFO,
+                        f'Book info was found for the ISBN candidate {isbn} instead of {job.isbn}.'
+                    )
+                )
+                # 次に同じファイルを処理するときは，本の情報が見つかったISBNコードを使う
+                if job.fingerprint:
+                    self.isbn_result_cache.put(job.fingerprint, isbn, job.strategy)
+            return self.journal.advance(
+                job.path,
+                JobState.METADATA_RESOLVED,
+                isbn=isbn,
+                title=book_info.title,
+                author=book_info.author,
+                source=source
+            )
+        return self.journal.advance(job.path, JobState.NO_BOOK_INFO)
+
+    def _rename_pdf(self, job):
+        """本の情報を使ったファイル名で，出力ディレクトリに移動する段階
+
+        入力ディレクトリでファイル名を変更すると，同じ本の情報になるファイルを同時に処理したときに上書きするため，
+        変更後のファイル名で出力ディレクトリに直接移動する．
+
+        Args:
+            job (obj: `Job`): 処理の記録
+
+        Returns:
+            :obj:`Job`: 更新後の処理の記録
+        """
+        pdf_rename_path = self._renamed_path(BookInfo(job.title, job.author))
+        # 移動した直後に中断されたときは，移動後のファイルがすでにある
+        if not os.path.isfile(job.path):
+            return self.journal.advance(job.path, JobState.MOVED, renamed_path=pdf_rename_path)
+        with span('move'):
+            moved_path = self._move_pdf(job.path, os.path.basename(pdf_rename_path))
+        return self.journal.advance(job.path, JobState.MOVED, renamed_path=moved_path)
+
+    def resume_pending_jobs(self):
+        """中断された処理の記録を取得
+
+        ファイルがなくなっている記録は，再開しないように終わったものとする．
+        ファイル名を変更した後に中断された処理は，変更後のファイルがあれば再開する．
+
+        Returns:
+            list[:obj:`Job`]: 再開できる処理の記録のリスト
+        """
+        jobs = []
+        for job in self.journal.pending(self.input_path, recursive=self.recursive):
+            # 再開できない記録でも，ファイルがあるときは最初からやり直す
+            if self._can_resume(job) or os.path.isfile(job.path):
+                jobs.append(job)
+            else:
+                self.journal.advance(job.path, JobState.GONE)
+        return jobs
 
 
 class Watcher(threading.Thread):
@@ -217,54 +1202,355 @@ class Watcher(threading.Thread):
         input_path (str): 入力ディレクトリ
         output_path (str): 出力ディレクトリ
         extensions (list[str]): 拡張子パターン
+        process_workers (int): プロセスワーカー数
+        io_workers (int): I/Oスレッド数
+        backlog_concurrency (int): 起動時にすでにあるファイルを同時に処理する数
+        watch (bool): Falseのときは監視せず，すでにあるファイルを処理し終えたらスレッドを終える
+        on_job_done (callable): ファイルの処理が終わるたびに`JobOutcome`を受け取る関数
+        strategy_pins (dict): 設定値に加えて，入力ディレクトリごとに固定するISBNコードを取得する手法のリスト
+        roots (list[:obj:`WatchRoot`]): 入力ディレクトリに加えて監視するディレクトリのリスト．
+            ワーカープールやキャッシュ，流量制限は全てのディレクトリで共有し，ディレクトリごとに公平に処理する．
+        recursive (bool): 入力ディレクトリのサブディレクトリも対象とするか
     """
 
-    def __init__(self, queue, input_path, output_path, extensions):
+    def __init__(self, queue, input_path, output_path, extensions,
+                 process_workers=PROCESS_WORKERS, io_workers=IO_WORKERS,
+                 backlog_concurrency=BACKLOG_CONCURRENCY, watch=True, on_job_done=None,
+                 strategy_pins=None, roots=None, recursive=False):
         self.input_path = input_path
+        self.watch = watch
+        self.on_job_done = on_job_done
+        self.backlog_concurrency = backlog_concurrency
         self.output_path = output_path
         self.extensions = extensions
+        self.roots = [
+            root if root.extensions is not None else root._replace(extensions=extensions)
+            for root in [WatchRoot(input_path, output_path, extensions, recursive), *(roots or [])]
+        ]
+        input_paths = [os.path.normcase(os.path.abspath(root.input_path)) for root in self.roots]
+        if len(set(input_paths)) != len(input_paths):
+            raise ValueError('The same input directory is given more than once.')
         super().__init__()
         self.queue = queue
-        self.observer = Observer()
-        self._stop_thread = False
+        self.observers = []
+        self.pool = WorkerPool(
+            process_workers=process_workers,
+            io_workers=io_workers
+        )
+        self.book_info_cache = _create_book_info_cache()
+        self.local_index = _create_local_index()
+        self.openbd_batcher = _create_openbd_batcher()
+        self.resolver = _create_resolver(self.openbd_batcher)
+        self.isbn_result_cache = _create_isbn_result_cache()
+        self.extraction_stats = ExtractionStats(EXTRACTION_STATS_PATH)
+        self.planner = _create_strategy_planner(strategy_pins)
+        self.journal = JobJournal(JOB_JOURNAL_PATH)
+        self.journal.purge(older_than=JOB_JOURNAL_RETENTION)
+        self.metrics = MetricsRegistry()
+        self.metrics_snapshot_writer = MetricsSnapshotWriter(
+            self.metrics,
+            METRICS_SNAPSHOT_PATH,
+            interval=METRICS_SNAPSHOT_INTERVAL
+        )
+        self.metrics_server = None
+        if METRICS_PORT is not None:
+            self.metrics_server = MetricsServer(self.metrics, host=METRICS_HOST, port=METRICS_PORT)
+        configure_rate_limiter(
+            GOOGLE_RATE_LIMITER,
+            rate=GOOGLE_RATE_LIMIT,
+            burst=GOOGLE_RATE_BURST,
+            min_rate=GOOGLE_MIN_RATE,
+            daily_quota=GOOGLE_DAILY_QUOTA,
+            max_wait=GOOGLE_RATE_LIMIT_MAX_WAIT,
+            db_path=RATE_LIMIT_DB_PATH
+        )
+        configure_http_client(
+            connect_timeout=HTTP_CONNECT_TIMEOUT,
+            read_timeout=HTTP_READ_TIMEOUT,
+            max_retries=HTTP_MAX_RETRIES,
+            backoff=HTTP_BACKOFF,
+            max_backoff=HTTP_MAX_BACKOFF,
+            pool_connections=HTTP_POOL_CONNECTIONS,
+            pool_maxsize=max(HTTP_POOL_MAXSIZE, io_workers)
+        )
+        self.event_handlers = []
+        self._stop_requested = threading.Event()
 
     def run(self, *args, **kwargs):
         """監視スレッド開始
 
         ディレクトリを監視するスレッドをたてる．
+        監視しないときは，すでにあるファイルを処理し終えたら終わる．
 
         """
+        for root in self.roots:
+            self.queue.put(
+                Message(
+                    LogStatus.INFO,
+                    ('Watching %s files in %s%s.' if self.watch else 'Processing %s files in %s%s.') %
+                    (', '.join(
+                        root.extensions),
+                        root.input_path,
+                        ' and its subdirectories' if root.recursive else '')))
+        self.event_handlers = [self._create_handler(root) for root in self.roots]
+
+        if not self.watch:
+            catch_up_threads = self._start_catch_up()
+            for catch_up_thread in catch_up_threads:
+                catch_up_thread.join()
+            # 書き込みの完了を待っているファイルと，流量制限で後回しにしたファイルも処理し終えるまで待つ
+            for event_handler in self.event_handlers:
+                event_handler.gate.wait_until_empty()
+                event_handler.wait_until_idle()
+            return
+
+        for root, event_handler in zip(self.roots, self.event_handlers):
+            self.observers.append(self._start_observer(root, event_handler))
+        self.queue.put(Message(LogStatus.INFO, 'Start Observer.'))
+        if self.metrics_server is not None:
+            self.queue.put(
+                Message(
+                    LogStatus.INFO,
+                    f'Metrics: http://{self.metrics_server.host}:{self.metrics_server.port}/metrics'
+                )
+            )
+
+        # 監視していない間に置かれたファイルは，監視と並行して処理する
+        self._start_catch_up()
+
+        # 終了が要求されるまで待つ
+        self._stop_requested.wait()
+
+    def _create_handler(self, root):
+        """監視するディレクトリのハンドラーを作成
+
+        ワーカープールやキャッシュなどは全てのハンドラーで共有する．
+        他の入力ディレクトリと出力ディレクトリは，サブディレクトリであっても対象としない．
+
+        Args:
+            root (:obj:`WatchRoot`): 監視するディレクトリ
+
+        Returns:
+            :obj:`Handler`: ハンドラー
+        """
+        exclude_dirs = [other.input_path for other in self.roots if other is not root]
+        exclude_dirs += [other.output_path for other in self.roots]
+        return Handler(
+            queue=self.queue,
+            input_path=root.input_path,
+            output_path=root.output_path,
+            patterns=[f'*.{extension}' for extension in root.extensions],
+            pool=self.pool,
+            book_info_cache=self.book_info_cache,
+            local_index=self.local_index,
+            resolver=self.resolver,
+            isbn_result_cache=self.isbn_result_cache,
+            extraction_stats=self.extraction_stats,
+            planner=self.planner,
+            journal=self.journal,
+            metrics=self.metrics,
+            on_job_done=self.on_job_done,
+            recursive=root.recursive,
+            exclude_dirs=exclude_dirs,
+        )
+
+    def _start_observer(self, root, event_handler):
+        """監視するディレクトリのオブザーバーを開始
+
+        inotifyの監視数の上限などで監視を始められないときは，
+        ディレクトリを定期的に走査するオブザーバーに切り替える．
+
+        Args:
+            root (:obj:`WatchRoot`): 監視するディレクトリ
+            event_handler (obj: `Handler`): ハンドラー
+
+        Returns:
+            obj: 開始したオブザーバー
+        """
+        observer = Observer()
+        observer.schedule(event_handler, root.input_path, recursive=root.recursive)
+        try:
+            observer.start()
+            return observer
+        except OSError as e:
+            if e.errno not in (errno.ENOSPC, errno.EMFILE):
+                raise
+            self.queue.put(
+                Message(
+                    LogStatus.WARNING,
+                    f'Could not watch {root.input_path} ({e.strerror}). '
+                    f'Polling every {WATCH_POLL_INTERVAL:.0f}s instead. '
+                    'Raise fs.inotify.max_user_watches or fs.inotify.max_user_instances to watch it.'
+                )
+            )
+        # 途中まで登録した監視を解除する
+        try:
+            observer.stop()
+        except Exception:
+            pass
+        observer = PollingObserver(timeout=WATCH_POLL_INTERVAL)
+        observer.schedule(event_handler, root.input_path, recursive=root.recursive)
+        observer.start()
+        return observer
+
+    def _start_catch_up(self) -> list:
+        """監視するディレクトリごとに，すでにあるファイルを処理するスレッドを開始
+
+        Returns:
+            list[:obj:`threading.Thread`]: 開始したスレッドのリスト
+        """
+        catch_up_threads = []
+        for event_handler in self.event_handlers:
+            catch_up_thread = threading.Thread(
+                target=self._catch_up,
+                args=(event_handler,),
+                name='book_maker_catch_up',
+                daemon=True
+            )
+            catch_up_thread.start()
+            catch_up_threads.append(catch_up_thread)
+        return catch_up_threads
+
+    def _catch_up(self, event_handler):
+        """すでにあるファイルを処理
+
+        中断された処理を再開してから，
+        入力ディレクトリにすでにあるファイルを，同時に処理する数を制限しながら投入する．
+
+        Args:
+            event_handler (obj: `Handler`): ハンドラー
+
+        Returns:
+            list[:obj:`concurrent.futures.Future`]: 投入した処理の結果のリスト
+        """
+        futures = []
+        pending_jobs = event_handler.resume_pending_jobs()
+        # 中断された処理のファイルは，変更後のファイル名のものも含めて二重に投入しない
+        pending_paths = set()
+        for job in pending_jobs:
+            pending_paths.add(os.path.abspath(job.path))
+            if job.renamed_path:
+                pending_paths.add(os.path.abspath(job.renamed_path))
+        existing_files = [
+            existing_file for existing_file in event_handler.existing_files()
+            if os.path.abspath(existing_file) not in pending_paths
+        ]
+        if not pending_jobs and not existing_files:
+            return futures
         self.queue.put(
             Message(
                 LogStatus.INFO,
-                'Watching %s files in %s.' %
-                (', '.join(
-                    self.extensions),
-                    self.input_path)))
-        event_handler = Handler(
-            queue=self.queue,
-            input_path=self.input_path,
-            output_path=self.output_path,
-            patterns=[f'*.{extension}' for extension in self.extensions],
+                f'Found {len(pending_jobs)} interrupted jobs and '
+                f'{len(existing_files)} existing files in {event_handler.input_path}.'
+            )
         )
 
-        self.observer.schedule(event_handler, self.input_path, recursive=False)
-        self.observer.start()
-        self.queue.put(Message(LogStatus.INFO, 'Start Observer.'))
-
-        while True:
-            if self._stop_thread:
+        # 同時に処理する数はディレクトリごとに制限し，ディレクトリの間はワーカープールが公平に処理する
+        semaphore = threading.BoundedSemaphore(self.backlog_concurrency)
+        for existing_file in [job.path for job in pending_jobs] + existing_files:
+            # 起動時に書き込み中のファイルは，書き込みが終わるのを待ってから投入する
+            # ファイル名を変更した後に中断された処理は，元のファイルがないためそのまま再開する
+            if os.path.exists(existing_file) and not event_handler.gate.is_stable(existing_file):
+                if event_handler.gate.notify(os.path.abspath(existing_file)):
+                    self.queue.put(
+                        Message(
+                            LogStatus.INFO,
+                            f'Waiting for {existing_file} to finish writing.'))
+                continue
+            semaphore.acquire()
+            if self._stop_requested.is_set():
+                break
+            try:
+                future = event_handler.submit(existing_file)
+            except RuntimeError:
+                # ワーカープールが終了しているとき
                 break
-            time.sleep(1)
+            if future is None:
+                semaphore.release()
+                continue
+            future.add_done_callback(lambda _: semaphore.release())
+            futures.append(future)
+        return futures
 
-    def stop_event(self):
+    def stop_event(self, mode=StopMode.DRAIN, timeout=STOP_DRAIN_TIMEOUT):
         """イベント終了
 
         イベントを終了させることで，監視スレッドを終了させる．
+        `StopMode.DRAIN`のときは処理中のファイルを`timeout`秒まで待ち，
+        終わらないものは次の段階の前で止める．
+        `StopMode.IMMEDIATE`のときは待たずに止める．
+        止めた処理は処理の記録に残り，次に監視を始めたときに再開する．
 
+        Args:
+            mode (str): 終了方法
+            timeout (float): `StopMode.DRAIN`のときに処理中のファイルを待つ秒数
+
+        Returns:
+            :obj:`StopReport`: 処理の件数
         """
-        self._stop_thread = True
-        self.observer.on_thread_stop()
-        self.observer.stop()
-        self.observer.join()
+        if mode not in (StopMode.DRAIN, StopMode.IMMEDIATE):
+            raise ValueError(f'Unknown stop mode: {mode}.')
+
+        self._stop_requested.set()
+        for observer in self.observers:
+            if observer.is_alive():
+                observer.on_thread_stop()
+                observer.stop()
+                observer.join()
+
+        event_handlers = self.event_handlers
+        futures = []
+        waiting = 0
+        # 書き込みの完了を待っていたファイルは，次に監視を始めたときに処理する
+        for event_handler in event_handlers:
+            waiting += event_handler.gate.pending_count()
+            event_handler.gate.close()
+            futures += event_handler.in_flight_futures()
+        if mode == StopMode.DRAIN and futures:
+            self.queue.put(
+                Message(
+                    LogStatus.INFO,
+                    f'Waiting up to {timeout:.0f}s for {len(futures)} files in progress.'
+                )
+            )
+            wait_futures(futures, timeout=timeout)
+        # 終わらなかった処理は次の段階の前で止め，始まっていない処理は取り消す
+        for event_handler in event_handlers:
+            event_handler.cancel()
+        for future in futures:
+            future.cancel()
+
+        completed = cancelled = pending = 0
+        for future in futures:
+            if future.cancelled():
+                cancelled += 1
+            elif not future.done():
+                pending += 1
+            elif future.exception() is None and future.result() == CANCELLED:
+                cancelled += 1
+            else:
+                completed += 1
+        report = StopReport(completed=completed, cancelled=cancelled + waiting, pending=pending)
+
+        # 実行中のまま残った処理は待たない
+        self.pool.shutdown(wait=pending == 0, cancel_futures=True)
+        self.resolver.close()
+        self.openbd_batcher.close()
+        for event_handler in event_handlers:
+            event_handler.close()
+        self.extraction_stats.save()
+        self.metrics_snapshot_writer.close()
+        if self.metrics_server is not None:
+            self.metrics_server.close()
+        summary = self.extraction_stats.summary()
+        if summary:
+            self.queue.put(Message(LogStatus.INFO, f'ISBN extraction stats:\n{summary}'))
+        self.queue.put(
+            Message(
+                LogStatus.INFO if report.pending == 0 else LogStatus.WARNING,
+                f'{report.completed} completed, {report.cancelled} cancelled, '
+                f'{report.pending} left pending. Interrupted files resume on the next start.'
+            )
+        )
         self.queue.put(Message(LogStatus.COMPLETED, 'End Observer.'))
+        return report
@@ -0,0 +1,376 @@
+"""ワーカープール
+
+監視スレッドからPDFの処理を切り離して実行するためのワーカープール．
+CPUを使う処理はプロセスプールで，I/O待ちの処理はスレッドプールで行う．
+
+"""
+
+
+import os
+import signal
+import threading
+import subprocess
+from collections import namedtuple, deque, OrderedDict
+from concurrent.futures import Future, ProcessPoolExecutor, ThreadPoolExecutor
+from logic.isbn_from_pdf import (
+    run_strategy,
+    get_isbn_from_embedded_images,
+    get_total_pages,
+    configure_ocr_workers
+)
+from logic.pdf_reader import PdfReadError
+from logic.isbn_candidates import Sighting, normalize_isbn, rank_candidates
+from logic.render_ladder import DEFAULT_LADDER
+from logic.strategy_planner import DEFAULT_STRATEGIES
+from logic.extraction_stats import StageTimer
+from logic.metrics import span, collect_spans
+from app_constants import PROCESS_WORKERS, IO_WORKERS, SHELL_TIMEOUT
+
+
+SHELL_PATH = os.path.join(os.path.dirname(__file__), 'shell', 'getISBN.sh')
+
+"""ISBNコードの取得結果
+
+Attributes:
+    isbn (str): ISBNコード．見つからなかったときはNone
+    strategy (str): ISBNコードを取得した手法
+    stages (list[:obj:`StageRecord`]): 段階ごとの実行記録
+    page_count (int): 総ページ数
+    spans (list[:obj:`Span`]): 描画やバーコードの読み取りなど，細かい段階ごとの実行時間
+    candidates (list[:obj:`Candidate`]): 順位を付けたISBNコードの候補．先頭は`isbn`と同じ
+"""
+ExtractionResult = namedtuple('ExtractionResult', [
+    'isbn',
+    'strategy',
+    'stages',
+    'page_count',
+    'spans',
+    'candidates'
+])
+
+
+def parse_shell_output(stdout: str) -> list:
+    """シェルの出力からISBNコードを取り出す
+
+    シェルは読み取ったバーコードを，一行に一つずつ`ページ番号<TAB>コード`の形式で出力する．
+    チェックディジットが正しくないものや，ISBNコードでないものは除く．
+
+    Args:
+        stdout (str): シェルの標準出力
+
+    Returns:
+        list[:obj:`Sighting`]: 読み取ったISBNコードのリスト
+    """
+    sightings = []
+    for line in stdout.splitlines():
+        page_number, _, code = line.strip().rpartition('\t')
+        isbn = normalize_isbn(code)
+        if isbn:
+            sightings.append(Sighting(isbn, 'barcode', int(page_number) if page_number.isdigit() else None))
+    return sightings
+
+
+def _run_shell(input_path: str, timeout=SHELL_TIMEOUT) -> list:
+    """シェルを使ってバーコードからISBNコードを取得
+
+    Args:
+        input_path (str): ファイルパス
+        timeout (float): シェルを打ち切るまでの秒数
+
+    Returns:
+        list[:obj:`Sighting`]: 読み取ったISBNコードのリスト．
+            見つからないとき，またはタイムアウトしたときは空のリストを返す．
+    """
+    # 打ち切るときにシェルが起動したコマンドもまとめて止めるため，別のプロセスグループで起動する
+    process = subprocess.Popen(
+        [SHELL_PATH, input_path],
+        stdout=subprocess.PIPE,
+        stderr=subprocess.PIPE,
+        text=True,
+        start_new_session=True
+    )
+    try:
+        stdout, _ = process.communicate(timeout=timeout)
+    except subprocess.TimeoutExpired:
+        # SIGTERMで止め，シェルに一時ディレクトリを削除させる
+        os.killpg(process.pid, signal.SIGTERM)
+        process.communicate()
+        # 打ち切ったときはPythonで取得する
+        return []
+    if process.returncode != 0:
+        return []
+    return parse_shell_output(stdout)
+
+
+def extract_isbn(input_path: str, ladder=DEFAULT_LADDER, strategies=DEFAULT_STRATEGIES,
+                 total_pages=None) -> ExtractionResult:
+    """PDFからISBNコードを取得
+
+    指定した手法の順番に，ISBNコードが見つかるまで試す．
+    既定では，PDFに埋め込まれた画像のバーコードからISBNコードを取得し，
+    取得できないときはPythonでバーコードまたは文字列から取得する．
+    PDFを直接解析できないときは，埋め込まれた画像の代わりにシェルを使ってバーコードから取得する．
+    読み取ったISBNコードはチェックディジットで検証し，複数あるときは順位を付けて返す．
+
+    Note:
+        プロセスワーカー上で実行されるため，引数と戻り値はpickle可能である必要がある．
+        例外を投げると段階ごとの実行記録が失われるため，見つからなかったときもNoneを返す．
+
+    Args:
+        input_path (str): ファイルパス
+        ladder (list[:obj:`RenderLevel`]): バーコードを読み取る際の描画の段階
+        strategies (list[str]): 試す手法の順番．`STRATEGIES`のいずれか
+        total_pages (int): 総ページ数．Noneのときは取得する
+
+    Returns:
+        :obj:`ExtractionResult`: ISBNコードと取得した手法
+    """
+    stages = []
+    sightings = []
+
+    def _result(strategy):
+        candidates = rank_candidates(sightings, page_count)
+        isbn = candidates[0].isbn if candidates else None
+        return ExtractionResult(isbn, strategy, stages, page_count, collector.spans, candidates)
+
+    def _shell():
+        with StageTimer('shell', stages) as timer, span('shell'):
+            shell_sightings = _run_shell(input_path)
+            timer.hit = bool(shell_sightings)
+        sightings.extend(shell_sightings)
+        return bool(shell_sightings)
+
+    with collect_spans() as collector:
+        page_count = total_pages if total_pages is not None else get_total_pages(input_path)
+        for strategy in strategies:
+            if strategy == 'embedded':
+                try:
+                    with StageTimer('embedded', stages) as timer:
+                        timer.hit = bool(get_isbn_from_embedded_images(input_path, sightings=sightings))
+                    found = timer.hit
+                except PdfReadError:
+                    # PDFを直接解析できないときはシェルを使う．シェルを別に試すときはそちらに任せる
+                    found = 'shell' not in strategies and _shell()
+                    if found:
+                        strategy = 'shell'
+            elif strategy == 'shell':
+                found = _shell()
+            elif page_count:
+                found = bool(run_strategy(
+                    strategy,
+                    input_path,
+                    page_count,
+                    ladder=ladder,
+                    records=stages,
+                    sightings=sightings
+                ))
+            else:
+                found = False
+            if found:
+                return _result(strategy)
+
+        return _result(None)
+
+
+class FairScheduler:
+    """キーごとに公平に処理を投入するクラス
+
+    キーごとに待ち行列を持ち，キーを順番に巡って一つずつスレッドプールに投入する．
+    一つのキーに大量の処理が溜まっても，他のキーの処理が後回しにならないようにする．
+
+    Attributes:
+        executor (:obj:`concurrent.futures.Executor`): 処理を実行するスレッドプール
+        max_running (int): 同時に実行する処理の数．スレッドプールのスレッド数に合わせる
+    """
+
+    def __init__(self, executor, max_running):
+        self.executor = executor
+        self.max_running = max_running
+        # キーと，そのキーの待ち行列．先頭のキーから順に投入する
+        self._queues = OrderedDict()
+        self._running = 0
+        self._shutdown = False
+        self._lock = threading.Lock()
+        self._idle = threading.Condition(self._lock)
+
+    def submit(self, key, fn, *args, **kwargs) -> Future:
+        """処理を待ち行列に追加
+
+        Args:
+            key: 公平に扱う単位のキー
+            fn (callable): 実行する関数
+
+        Raises:
+            RuntimeError: 終了した後に呼び出したときに発生
+
+        Returns:
+            :obj:`concurrent.futures.Future`: 実行結果
+        """
+        future = Future()
+        with self._lock:
+            if self._shutdown:
+                raise RuntimeError('cannot schedule new futures after shutdown')
+            self._queues.setdefault(key, deque()).append((future, fn, args, kwargs))
+        self._dispatch()
+        return future
+
+    def _next(self):
+        """次に投入する処理を取り出す
+
+        取り出したキーは，まだ処理が残っていれば末尾に回す．
+
+        Returns:
+            tuple: 実行結果，関数，引数．待ち行列が空のときはNoneを返す．
+        """
+        while self._queues:
+            key, queue = self._queues.popitem(last=False)
+            if not queue:
+                continue
+            item = queue.popleft()
+            if queue:
+                self._queues[key] = queue
+            return item
+        return None
+
+    def _dispatch(self):
+        """同時に実行する数に空きがある限り，待ち行列から投入"""
+        while True:
+            with self._lock:
+                if self._running >= self.max_running:
+                    return
+                item = self._next()
+                if item is None:
+                    self._idle.notify_all()
+                    return
+                self._running += 1
+
+            future, fn, args, kwargs = item
+            # 待っている間に取り消されたときは投入しない
+            if not future.set_running_or_notify_cancel():
+                self._finish()
+                continue
+            try:
+                self.executor.submit(self._run, future, fn, args, kwargs)
+            except RuntimeError as e:
+                # スレッドプールが終了しているとき
+                future.set_exception(e)
+                self._finish()
+
+    def _run(self, future, fn, args, kwargs):
+        try:
+            result = fn(*args, **kwargs)
+        except BaseException as e:
+            future.set_exception(e)
+        else:
+            future.set_result(result)
+        finally:
+            self._finish()
+            self._dispatch()
+
+    def _finish(self):
+        with self._lock:
+            self._running -= 1
+            self._idle.notify_all()
+
+    def shutdown(self, wait=True, cancel_futures=False) -> None:
+        """処理の受け付けを終了
+
+        Args:
+            wait (bool): 待ち行列と実行中の処理が終わるまで待つか
+            cancel_futures (bool): 待ち行列の処理を取り消すか
+        """
+        with self._lock:
+            self._shutdown = True
+            if cancel_futures:
+                for queue in self._queues.values():
+                    for future, *_ in queue:
+                        future.cancel()
+                self._queues.clear()
+            if wait:
+                self._idle.wait_for(lambda: not self._running and not self._queues)
+
+
+class WorkerPool:
+    """ワーカープールクラス
+
+    プロセスプールとスレッドプールをまとめて管理する．
+
+    Attributes:
+        process_workers (int): プロセスワーカー数
+        io_workers (int): I/Oスレッド数
+        ladder (list[:obj:`RenderLevel`]): バーコードを読み取る際の描画の段階
+    """
+
+    def __init__(self, process_workers=PROCESS_WORKERS, io_workers=IO_WORKERS, ladder=DEFAULT_LADDER):
+        self.process_workers = process_workers
+        self.io_workers = io_workers
+        self.ladder = ladder
+        # プロセスワーカーごとのOCRのスレッド数を，全体でCPU数を超えないように絞る
+        self._process_executor = ProcessPoolExecutor(
+            max_workers=process_workers,
+            initializer=configure_ocr_workers,
+            initargs=(process_workers,)
+        )
+        self._io_executor = ThreadPoolExecutor(
+            max_workers=io_workers,
+            thread_name_prefix='book_maker_io'
+        )
+        self._scheduler = FairScheduler(self._io_executor, io_workers)
+
+    def submit(self, fn, *args, **kwargs):
+        """I/Oスレッドに処理を投入
+
+        Args:
+            fn (callable): 実行する関数
+
+        Returns:
+            :obj:`concurrent.futures.Future`: 実行結果
+        """
+        return self._io_executor.submit(fn, *args, **kwargs)
+
+    def submit_fair(self, key, fn, *args, **kwargs):
+        """キーごとに公平にI/Oスレッドに処理を投入
+
+        複数の入力ディレクトリで一つのワーカープールを共有するときに，
+        ディレクトリをキーとして順番に処理する．
+
+        Args:
+            key: 公平に扱う単位のキー
+            fn (callable): 実行する関数
+
+        Returns:
+            :obj:`concurrent.futures.Future`: 実行結果
+        """
+        return self._scheduler.submit(key, fn, *args, **kwargs)
+
+    def extract_isbn(self, input_path: str, strategies=DEFAULT_STRATEGIES, total_pages=None) -> ExtractionResult:
+        """プロセスワーカーでISBNコードを取得
+
+        I/Oスレッドから呼び出し，プロセスワーカーの処理が終わるまで待つ．
+
+        Args:
+            input_path (str): ファイルパス
+            strategies (list[str]): 試す手法の順番
+            total_pages (int): 総ページ数．Noneのときはプロセスワーカーで取得する
+
+        Returns:
+            :obj:`ExtractionResult`: ISBNコードと取得した手法
+        """
+        return self._process_executor.submit(
+            extract_isbn,
+            input_path,
+            self.ladder,
+            list(strategies),
+            total_pages
+        ).result()
+
+    def shutdown(self, wait=True, cancel_futures=False):
+        """ワーカープールを終了
+
+        Args:
+            wait (bool): 実行中の処理が終わるまで待つか
+            cancel_futures (bool): 始まっていない処理を取り消すか
+        """
+        self._scheduler.shutdown(wait=wait, cancel_futures=cancel_futures)
+        self._io_executor.shutdown(wait=wait, cancel_futures=cancel_futures)
+        self._process_executor.shutdown(wait=wait, cancel_futures=cancel_futures)